@@ -0,0 +1,133 @@
+import calendar
+import logging
+import tempfile
+import time
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from course_discovery.apps.api.cache import get_catalog_generation
+from course_discovery.apps.api.renderers import AffiliateWindowXMLRenderer
+from course_discovery.apps.api.serializers import AffiliateWindowSerializer
+from course_discovery.apps.catalogs.models import Catalog
+from course_discovery.apps.course_metadata.models import CourseRun, Seat
+
+logger = logging.getLogger(__name__)
+
+# Feeds are prebuilt after each refresh while this switch is active, and removed once it is deactivated.
+PREBUILT_FEEDS_SWITCH = 'prebuild_affiliate_window_feeds'
+
+FEEDS_DIRECTORY = 'affiliate_window'
+
+
+def get_seats(catalog):
+    """ Returns the verified and professional seats of the active, marketable course runs in a catalog. """
+    courses = catalog.courses()
+    course_runs = CourseRun.objects.filter(course__in=courses).active().marketable()
+    seats = Seat.objects.filter(type__in=[Seat.VERIFIED, Seat.PROFESSIONAL]).filter(course_run__in=course_runs)
+    return seats.select_related('course_run__course__partner').order_by('pk')
+
+
+def generate_feed(seats):
+    """
+    Generates the Affiliate Window product feed of seats, one product at a time.
+
+    Seats are read with a database iterator, and each is serialized and written as it is read, so that the
+    feed is never held in memory.
+    """
+    serializer = AffiliateWindowSerializer()
+    data = (serializer.to_representation(seat) for seat in seats.iterator())
+    return AffiliateWindowXMLRenderer().render_stream(data)
+
+
+def get_feed_path(catalog, generation):
+    """
+    Returns the path of the feed of a catalog built at the given catalog generation.
+
+    The generation is bumped whenever a catalog, or the course metadata, changes (see api.cache). A feed is only
+    served while the generation it was built at is current, so that edits made after it was built are never
+    hidden behind it.
+    """
+    return '{directory}/catalog_{id}_{generation}.xml'.format(
+        directory=FEEDS_DIRECTORY, id=catalog.id, generation=generation
+    )
+
+
+def get_feed_paths():
+    """ Returns the paths of all prebuilt feeds, with a single listing of the feeds directory. """
+    try:
+        __, files = default_storage.listdir(FEEDS_DIRECTORY)
+    except FileNotFoundError:
+        # FileSystemStorage raises if no feed has ever been built. Other storages return empty listings.
+        return []
+
+    return ['{directory}/{name}'.format(directory=FEEDS_DIRECTORY, name=name) for name in files]
+
+
+def delete_feeds(paths):
+    for path in paths:
+        default_storage.delete(path)
+
+
+def build_feed(catalog, generation):
+    """
+    Builds the product feed of a catalog, and saves it to the default storage, replacing any previous feed built
+    at the same generation.
+
+    Returns:
+        str: Path of the feed.
+    """
+    path = get_feed_path(catalog, generation)
+
+    with tempfile.TemporaryFile() as feed:
+        for chunk in generate_feed(get_seats(catalog)):
+            feed.write(chunk.encode(AffiliateWindowXMLRenderer.charset))
+
+        feed.seek(0)
+
+        # Storages save files under a new name, rather than overwriting them.
+        if default_storage.exists(path):
+            default_storage.delete(path)
+        default_storage.save(path, File(feed))
+
+    return path
+
+
+def build_feeds():
+    """
+    Builds the product feeds of all catalogs at the current catalog generation, and removes all other feeds,
+    including those of deleted catalogs. A failure to build one feed does not prevent the others.
+    """
+    generation = get_catalog_generation()
+    paths = set()
+
+    for catalog in Catalog.objects.all():
+        try:
+            paths.add(build_feed(catalog, generation))
+        except Exception:  # pylint: disable=broad-except
+            logger.exception('Failed to build the Affiliate Window feed of catalog [%d].', catalog.id)
+
+    delete_feeds(set(get_feed_paths()) - paths)
+
+
+def remove_feeds():
+    """ Removes all prebuilt product feeds, so that feeds are generated for each request instead. """
+    delete_feeds(get_feed_paths())
+
+
+def get_feed_validators(path):
+    """
+    Returns the ETag and last modified timestamp of a prebuilt feed, which are derived from the file's size and
+    modification time, so that the feed does not have to be read to answer conditional requests.
+    """
+    modified_time = default_storage.modified_time(path)
+
+    # FileSystemStorage returns local, naive times. Other storages may return aware times.
+    if timezone.is_aware(modified_time):
+        last_modified = calendar.timegm(modified_time.utctimetuple())
+    else:
+        last_modified = int(time.mktime(modified_time.timetuple()))
+
+    etag = '{size:x}-{last_modified:x}'.format(size=default_storage.size(path), last_modified=last_modified)
+    return etag, last_modified
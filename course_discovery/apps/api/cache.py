@@ -0,0 +1,100 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework_extensions.cache.decorators import cache_response
+from rest_framework_extensions.key_constructor import bits
+from rest_framework_extensions.key_constructor.bits import KeyBitBase
+from rest_framework_extensions.key_constructor.constructors import DefaultKeyConstructor
+
+CATALOG_GENERATION_CACHE_KEY = 'api.catalog_generation'
+
+# Changes to models in these apps, or to these models, change the catalog.
+CATALOG_APP_LABELS = ('catalogs', 'course_metadata', 'guardian', 'ietf_language_tags', 'taggit')
+CATALOG_MODEL_LABELS = ('core.Currency', 'core.Partner')
+
+# Bookkeeping models of the data loaders, which are written throughout refreshes, but are not part of the catalog.
+NON_CATALOG_MODEL_LABELS = (
+    'course_metadata.DataLoaderConfig',
+    'course_metadata.DataLoaderFingerprint',
+    'course_metadata.DataLoaderRun',
+    'course_metadata.DataLoaderWatermark',
+)
+
+
+def get_catalog_generation():
+    """
+    Returns the catalog generation, a counter which is incremented whenever the catalog changes.
+
+    If the counter is missing (e.g. it was evicted), it is restarted from the current time, rather than from zero,
+    so that the generations of responses cached before it went missing are not reused.
+    """
+    generation = cache.get(CATALOG_GENERATION_CACHE_KEY)
+
+    if generation is None:
+        cache.add(CATALOG_GENERATION_CACHE_KEY, int(time.time() * 1000), None)
+        generation = cache.get(CATALOG_GENERATION_CACHE_KEY)
+
+    return generation
+
+
+def bump_catalog_generation():
+    """ Increments the catalog generation, invalidating all cached responses. """
+    try:
+        cache.incr(CATALOG_GENERATION_CACHE_KEY)
+    except ValueError:
+        # The counter is missing, and is restarted with a new generation.
+        get_catalog_generation()
+
+
+def is_catalog_model(model):
+    if model._meta.label in NON_CATALOG_MODEL_LABELS:
+        return False
+
+    return model._meta.app_label in CATALOG_APP_LABELS or model._meta.label in CATALOG_MODEL_LABELS
+
+
+class CatalogGenerationKeyBit(KeyBitBase):
+    def get_data(self, params, view_instance, view_method, request, args, kwargs):
+        return get_catalog_generation()
+
+
+class QueryParamsKeyBit(KeyBitBase):
+    """
+    Identifies a request by all of its query parameters.
+
+    Unlike bits.QueryParamsKeyBit, every value of parameters given more than once (e.g. status) is included.
+    """
+
+    def get_data(self, params, view_instance, view_method, request, args, kwargs):
+        return sorted((key, sorted(values)) for key, values in request.query_params.lists())
+
+
+class CatalogKeyConstructor(DefaultKeyConstructor):
+    """
+    Identifies a response by the view, its arguments and query parameters, the user, and the catalog generation.
+
+    Unlike the default key constructors, the query parameters which only affect serialization (e.g. exclude_utm)
+    are included, and the SQL of the view's queryset is not. The user is included since responses may be filtered
+    by the user's permissions, and marketing URLs include the user's UTM parameters.
+    """
+    catalog_generation = CatalogGenerationKeyBit()
+    kwargs = bits.KwargsKeyBit()
+    query_params = QueryParamsKeyBit()
+    user = bits.UserKeyBit()
+
+
+class CatalogCacheResponseMixin(object):
+    """
+    Caches the responses of list and retrieve requests until the catalog changes, or API_RESPONSE_CACHE_TIMEOUT
+    expires.
+    """
+    cache_key_func = CatalogKeyConstructor()
+
+    @cache_response(timeout=settings.API_RESPONSE_CACHE_TIMEOUT, key_func='cache_key_func')
+    def list(self, request, *args, **kwargs):
+        return super(CatalogCacheResponseMixin, self).list(request, *args, **kwargs)
+
+    @cache_response(timeout=settings.API_RESPONSE_CACHE_TIMEOUT, key_func='cache_key_func')
+    def retrieve(self, request, *args, **kwargs):
+        return super(CatalogCacheResponseMixin, self).retrieve(request, *args, **kwargs)
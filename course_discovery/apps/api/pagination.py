@@ -1,3 +1,5 @@
+from django.db.models.query import QuerySet
+from rest_framework.pagination import CursorPagination as BaseCursorPagination
 from rest_framework.pagination import PageNumberPagination as BasePageNumberPagination
 from rest_framework.pagination import LimitOffsetPagination
 
@@ -6,6 +8,34 @@ class PageNumberPagination(BasePageNumberPagination):
     page_size_query_param = 'page_size'
 
 
+class CursorPagination(BaseCursorPagination):
+    """
+    Paginates by primary key, rather than by offset, so that deep pages are as fast to retrieve as the first, and
+    no count query is made.
+
+    The primary key is always used as the ordering, even if the view allows ordering by other fields, since it is
+    unique, indexed, and does not change. The first page is retrieved by passing an empty cursor (e.g. `?cursor=`).
+    Only querysets (i.e. not search results) can be paginated by cursor.
+    """
+    ordering = ('id',)
+    page_size_query_param = 'page_size'
+    max_page_size = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        # Unlike the other paginators, DRF's CursorPagination does not store the request, which ProxiedCall uses
+        # to route get_paginated_response() to the paginator which paginated the queryset. The attribute must not
+        # be defined before then, since ProxiedCall checks for its presence.
+        self.request = request  # pylint: disable=attribute-defined-outside-init
+        return super(CursorPagination, self).paginate_queryset(queryset, request, view=view)
+
+    def get_page_size(self, request):
+        # DRF's CursorPagination ignores page_size_query_param, which is honoured here as PageNumberPagination does.
+        return PageNumberPagination.get_page_size(self, request)
+
+    def get_ordering(self, request, queryset, view):
+        return self.ordering
+
+
 class ProxiedCall:
     """
     Utility class used in conjunction with ProxiedPagination to route method
@@ -27,12 +57,16 @@ class ProxiedCall:
         except IndexError:
             request = None
 
-        paginator = self._get_paginator(request=request if request else False)
+        # paginate_queryset() receives the queryset as its first positional argument. Only querysets (i.e. not
+        # search results) can be paginated by cursor.
+        queryset = args[0] if args else None
+
+        paginator = self._get_paginator(request=request if request else False, queryset=queryset)
 
         # Look up the method and call it.
         return getattr(paginator, self.method_name)(*args, **kwargs)
 
-    def _get_paginator(self, request=False):
+    def _get_paginator(self, request=False, queryset=None):
         for paginator, query_param in self.proxy.paginators:
             # DRF's ListModelMixin calls paginate_queryset() prior to get_paginated_response(),
             # storing the original request on the paginator's `request` attribute. If the paginator
@@ -42,7 +76,16 @@ class ProxiedCall:
 
             # If a request is available, look for the presence of a query parameter
             # indicating that we should use this paginator.
-            is_query_param_present = request and request.query_params.get(query_param)  # pylint: disable=no-member
+            if isinstance(paginator, CursorPagination):
+                # The first page is requested with an empty cursor (e.g. `?cursor=`). Anything other than a
+                # queryset is paginated by one of the other paginators instead.
+                is_query_param_present = (
+                    request and
+                    query_param in request.query_params and  # pylint: disable=no-member
+                    isinstance(queryset, QuerySet)
+                )
+            else:
+                is_query_param_present = request and request.query_params.get(query_param)  # pylint: disable=no-member
 
             if is_request_stored or is_query_param_present:
                 return paginator
@@ -55,33 +98,37 @@ class ProxiedCall:
 
 class ProxiedPagination:
     """
-    Pagination class which proxies to either DRF's PageNumberPagination or
-    LimitOffsetPagination.
+    Pagination class which proxies to either DRF's PageNumberPagination,
+    CursorPagination or LimitOffsetPagination.
 
     The following are all valid:
 
         http://api.example.org/accounts/?page=4
         http://api.example.org/accounts/?page=4&page_size=100
+        http://api.example.org/accounts/?cursor=&page_size=100
+        http://api.example.org/accounts/?cursor=cD0xMDA%3D&page_size=100
         http://api.example.org/accounts/?limit=100
         http://api.example.org/accounts/?offset=400&limit=100
 
-    If no query parameters are passed, proxies to LimitOffsetPagination by default.
+    If no query parameters are passed, proxies to LimitOffsetPagination by default. Search results requested with
+    a cursor are also paginated by LimitOffsetPagination, since only querysets can be paginated by cursor.
     """
 
     def __init__(self):
         page_number_paginator = PageNumberPagination()
+        cursor_paginator = CursorPagination()
         limit_offset_paginator = LimitOffsetPagination()
 
         self.paginators = [
             (page_number_paginator, page_number_paginator.page_query_param),
+            (cursor_paginator, cursor_paginator.cursor_query_param),
             (limit_offset_paginator, limit_offset_paginator.limit_query_param),
         ]
 
     def __getattr__(self, name):
         # For each paginator, check if the requested attribute is defined.
-        # If the attr is defined on both paginators, we take the one defined for
-        # LimitOffsetPagination. As of this writing, `display_page_controls` is
-        # the only attr shared by the two pagination classes.
+        # If the attr is defined on several paginators, we take the one defined
+        # for the last of them, LimitOffsetPagination (e.g. `display_page_controls`).
         for paginator, __ in self.paginators:
             try:
                 attr = getattr(paginator, name)
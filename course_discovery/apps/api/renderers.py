@@ -1,3 +1,8 @@
+import csv
+from io import StringIO
+
+from django.utils.xmlutils import SimplerXMLGenerator
+from rest_framework_csv.misc import Echo
 from rest_framework_csv.renderers import CSVRenderer
 from rest_framework_xml.renderers import XMLRenderer
 
@@ -11,6 +16,35 @@ class AffiliateWindowXMLRenderer(XMLRenderer):
     item_tag_name = 'product'
     root_tag_name = 'merchant'
 
+    def render_stream(self, data):
+        """ Renders products as XML, one product at a time, for use with StreamingHttpResponse.
+
+        The output is identical to that of render(), but each product is written as it is read from data,
+        which may be a generator, rather than building the whole document in memory.
+        """
+        stream = StringIO()
+        xml = SimplerXMLGenerator(stream, self.charset)
+
+        def flush():
+            value = stream.getvalue()
+            stream.seek(0)
+            stream.truncate()
+            return value
+
+        xml.startDocument()
+        xml.startElement(self.root_tag_name, {})
+        yield flush()
+
+        for item in data:
+            xml.startElement(self.item_tag_name, {})
+            self._to_xml(xml, item)
+            xml.endElement(self.item_tag_name)
+            yield flush()
+
+        xml.endElement(self.root_tag_name)
+        xml.endDocument()
+        yield flush()
+
 
 class CourseRunCSVRenderer(CSVRenderer):
     """ CSV renderer for course runs. """
@@ -63,3 +97,16 @@ class CourseRunCSVRenderer(CSVRenderer):
         'seats.credit.credit_hours',
         'modified',
     ]
+
+    def render_stream(self, data):
+        """ Renders serialized course runs as CSV, one line at a time, for use with StreamingHttpResponse.
+
+        Unlike render(), which builds a table of all of the course runs before writing any of them, each course
+        run is flattened and written as it is read from data, which may be a generator.
+        """
+        csv_writer = csv.writer(Echo())
+        yield csv_writer.writerow(self.header)
+
+        for item in data:
+            flat_item = self.flatten_item(item)
+            yield csv_writer.writerow([flat_item.get(key) for key in self.header])
@@ -717,6 +717,11 @@ class MinimalProgramSerializer(serializers.ModelSerializer):
         )
         read_only_fields = ('uuid', 'marketing_url', 'banner_image')
 
+    def to_representation(self, instance):
+        # Fields derived from the program's course runs and seats are computed once, rather than once per field.
+        with instance.snapshot():
+            return super(MinimalProgramSerializer, self).to_representation(instance)
+
     def get_courses(self, program):
         course_runs = list(program.course_runs)
 
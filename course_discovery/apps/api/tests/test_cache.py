@@ -0,0 +1,145 @@
+import mock
+from django.apps import apps
+from django.core.cache import cache
+from django.db.models.deletion import Collector
+from django.db.models.signals import m2m_changed, post_delete
+from django.test import TestCase
+from rest_framework.reverse import reverse
+from rest_framework.test import APITestCase
+
+from course_discovery.apps.api.cache import (
+    CATALOG_GENERATION_CACHE_KEY, bump_catalog_generation, get_catalog_generation, is_catalog_model
+)
+from course_discovery.apps.catalogs.models import Catalog
+from course_discovery.apps.core.models import Partner, User
+from course_discovery.apps.core.tests.factories import USER_PASSWORD, UserFactory
+from course_discovery.apps.course_metadata.choices import ProgramStatus
+from course_discovery.apps.course_metadata.models import (
+    Course, DataLoaderFingerprint, DataLoaderRun, DataLoaderWatermark, Program, Video
+)
+from course_discovery.apps.course_metadata.tests.factories import CourseFactory, CourseRunFactory, ProgramFactory
+
+
+class CatalogGenerationTests(TestCase):
+    def setUp(self):
+        super(CatalogGenerationTests, self).setUp()
+        cache.clear()
+
+    def test_bump_catalog_generation(self):
+        """ Verify bumping the generation increments it. """
+        generation = get_catalog_generation()
+        self.assertEqual(get_catalog_generation(), generation)
+
+        bump_catalog_generation()
+        self.assertEqual(get_catalog_generation(), generation + 1)
+
+    def test_missing_generation(self):
+        """ Verify a missing generation is restarted from the current time, rather than reusing old generations. """
+        with mock.patch('time.time', return_value=100):
+            self.assertEqual(get_catalog_generation(), 100000)
+
+        cache.delete(CATALOG_GENERATION_CACHE_KEY)
+
+        with mock.patch('time.time', return_value=200):
+            bump_catalog_generation()
+
+        self.assertEqual(get_catalog_generation(), 200000)
+
+    def test_is_catalog_model(self):
+        """ Verify changes to catalog models, but not to other models (e.g. users), change the catalog. """
+        for model in (Catalog, Course, Partner, Program.courses.through):
+            self.assertTrue(is_catalog_model(model))
+
+        for model in (User, DataLoaderFingerprint, DataLoaderRun, DataLoaderWatermark):
+            self.assertFalse(is_catalog_model(model))
+
+    def test_model_changes_bump_generation(self):
+        """ Verify saving or deleting catalog models, or changing their relations, bumps the generation. """
+        generation = get_catalog_generation()
+        course = CourseFactory()
+        self.assertGreater(get_catalog_generation(), generation)
+
+        generation = get_catalog_generation()
+        program = ProgramFactory()
+        program.courses.add(course)  # pylint: disable=no-member
+        course.delete()
+        self.assertGreater(get_catalog_generation(), generation)
+
+        generation = get_catalog_generation()
+        UserFactory()
+        DataLoaderRun.objects.create(
+            partner=program.partner, loader='CoursesApiDataLoader', started=program.created, finished=program.created
+        )
+        self.assertEqual(get_catalog_generation(), generation)
+
+    def test_fast_delete(self):
+        """ Verify the receivers which bump the generation do not prevent models from being fast deleted. """
+        # The search index signal processor used by tests listens to all models.
+        signal_processor = apps.get_app_config('haystack').signal_processor
+        signal_processor.teardown()
+        self.addCleanup(signal_processor.setup)
+
+        collector = Collector(using='default')
+        self.assertTrue(collector.can_fast_delete(DataLoaderFingerprint.objects.all()))
+        self.assertTrue(collector.can_fast_delete(DataLoaderRun.objects.all()))
+
+        # Media are referenced by other models, and are not fast deleted, but are deleted without sending signals.
+        self.assertFalse(post_delete.has_listeners(Video))
+        self.assertFalse(m2m_changed.has_listeners(Video))
+
+
+class CatalogCacheResponseMixinTests(APITestCase):
+    def setUp(self):
+        super(CatalogCacheResponseMixinTests, self).setUp()
+        self.user = UserFactory(is_staff=True, is_superuser=True)
+        self.client.login(username=self.user.username, password=USER_PASSWORD)
+        self.course_run = CourseRunFactory()
+        cache.clear()
+
+    def get_keys(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return [result['key'] for result in response.data['results']]
+
+    def test_cached_until_catalog_changes(self):
+        """ Verify responses are cached until the catalog changes. """
+        path = reverse('api:v1:course-list')
+        self.assertEqual(self.get_keys(path), [self.course_run.course.key])
+
+        with self.assertNumQueries(2):
+            self.get_keys(path)
+
+        course = CourseFactory()
+        self.assertCountEqual(self.get_keys(path), [self.course_run.course.key, course.key])
+
+    def test_query_params_are_part_of_key(self):
+        """ Verify query parameters which only affect serialization do not share cached responses. """
+        path = reverse('api:v1:course_run-detail', kwargs={'key': self.course_run.key})
+        marketing_url = self.client.get(path).data['marketing_url']
+        self.assertEqual(self.client.get(path + '?exclude_utm=1').data['marketing_url'], marketing_url.split('?')[0])
+
+    def test_user_is_part_of_key(self):
+        """ Verify users do not share cached responses, since marketing URLs include the user's UTM parameters. """
+        path = reverse('api:v1:course_run-detail', kwargs={'key': self.course_run.key})
+        self.assertIn('utm_source={}'.format(self.user.username), self.client.get(path).data['marketing_url'])
+
+        other_user = UserFactory(is_staff=True, is_superuser=True)
+        self.client.logout()
+        self.client.login(username=other_user.username, password=USER_PASSWORD)
+        marketing_url = self.client.get(path).data['marketing_url']
+        self.assertIn('utm_source={}'.format(other_user.username), marketing_url)
+        self.assertNotIn('utm_source={}'.format(self.user.username), marketing_url)
+
+    def test_repeated_query_params_are_part_of_key(self):
+        """ Verify every value of a repeated query parameter is part of the key. """
+        active = ProgramFactory(status=ProgramStatus.Active)
+        retired = ProgramFactory(status=ProgramStatus.Retired)
+        path = reverse('api:v1:program-list')
+
+        self.assertEqual(self.get_uuids(path + '?status=retired'), [str(retired.uuid)])
+        self.assertCountEqual(
+            self.get_uuids(path + '?status=active&status=retired'), [str(active.uuid), str(retired.uuid)]
+        )
+
+    def get_uuids(self, path):
+        return [result['uuid'] for result in self.client.get(path).data['results']]
@@ -1,9 +1,14 @@
+from django.db import connection
+from django.http import QueryDict
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.request import Request
 from rest_framework.test import APIRequestFactory
 
-from course_discovery.apps.api.pagination import PageNumberPagination, ProxiedPagination
+from course_discovery.apps.api.pagination import CursorPagination, PageNumberPagination, ProxiedPagination
+from course_discovery.apps.course_metadata.models import Course
+from course_discovery.apps.course_metadata.tests.factories import CourseFactory
 
 
 class ProxiedPaginationTests(TestCase):
@@ -56,6 +61,14 @@ class ProxiedPaginationTests(TestCase):
         request = self.get_request(page=2)
         self.assert_proxied(self.page_number_paginator, request)
 
+    def test_empty_page_number(self):
+        """
+        Verify that ProxiedPagination falls back to LimitOffsetPagination when
+        the `page` query parameter is empty.
+        """
+        request = self.get_request(page='')
+        self.assert_proxied(self.limit_offset_paginator, request)
+
     def test_limit_offset_pagination(self):
         """
         Verify that ProxiedPagination proxies to LimitOffsetPagination when a
@@ -64,6 +77,46 @@ class ProxiedPaginationTests(TestCase):
         request = self.get_request(limit=2)
         self.assert_proxied(self.limit_offset_paginator, request)
 
+    def test_cursor_pagination(self):
+        """
+        Verify that ProxiedPagination proxies to CursorPagination when a
+        `cursor` query parameter is present, even if it is empty.
+        """
+        self.queryset = Course.objects.all()
+        CourseFactory.create_batch(3)
+        request = self.get_request(cursor='')
+        self.assert_proxied(CursorPagination(), request)
+
+    def test_cursor_pagination_without_queryset(self):
+        """
+        Verify that ProxiedPagination falls back to LimitOffsetPagination when
+        a `cursor` query parameter is present, but the results being paginated
+        are not a queryset (e.g. search results).
+        """
+        request = self.get_request(cursor='', limit=2)
+        self.assert_proxied(self.limit_offset_paginator, request)
+
+    def test_cursor_pagination_walk(self):
+        """
+        Verify that CursorPagination walks the queryset by primary key,
+        honoring the `page_size` query parameter, without counting it.
+        """
+        courses = CourseFactory.create_batch(5)
+        paginator = CursorPagination()
+        request = self.get_request(cursor='', page_size=2)
+        pages = []
+
+        while request:
+            with CaptureQueriesContext(connection) as context:
+                pages.append(list(paginator.paginate_queryset(Course.objects.order_by('-key'), request)))
+            self.assertFalse(any('COUNT' in query['sql'] for query in context.captured_queries))
+
+            next_link = paginator.get_next_link()
+            request = self.get_request(**dict(QueryDict(next_link.split('?')[1]).items())) if next_link else None
+
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual(sum(pages, []), sorted(courses, key=lambda course: course.id))
+
     def test_noncallable_attribute_access(self):
         """
         Verify that attempts to access noncallable attributes are proxied to
@@ -0,0 +1,36 @@
+from django.test import TestCase
+
+from course_discovery.apps.api.renderers import AffiliateWindowXMLRenderer, CourseRunCSVRenderer
+
+
+class CourseRunCSVRendererTests(TestCase):
+    def test_render_stream(self):
+        """ Verify the streamed CSV matches the CSV rendered at once. """
+        data = [
+            {'key': 'course-v1:a+b+c', 'title': 'Title, with a comma', 'seats': {'verified': {'price': '100.00'}}},
+            {'key': 'course-v1:d+e+f', 'image': {'src': 'https://example.com/image.jpg'}, 'subjects': None},
+        ]
+        renderer = CourseRunCSVRenderer()
+
+        lines = list(renderer.render_stream(iter(data)))
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(''.join(lines), renderer.render(data))
+
+
+class AffiliateWindowXMLRendererTests(TestCase):
+    def test_render_stream(self):
+        """ Verify the streamed XML matches the XML rendered at once. """
+        data = [
+            {'name': 'Title & <more>', 'pid': 'course-v1:a+b+c-verified', 'price': {'actualp': '100.00'}},
+            {'name': 'Another title', 'pid': 'course-v1:d+e+f-professional', 'desc': None},
+        ]
+        renderer = AffiliateWindowXMLRenderer()
+
+        chunks = list(renderer.render_stream(iter(data)))
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(''.join(chunks), renderer.render(data))
+
+    def test_render_stream_without_products(self):
+        """ Verify a feed without products is rendered as an empty root element. """
+        renderer = AffiliateWindowXMLRenderer()
+        self.assertEqual(''.join(renderer.render_stream([])), renderer.render([]))
@@ -1,21 +1,32 @@
 # pylint: disable=redefined-builtin,no-member
 import datetime
+import shutil
+import tempfile
 import xml.etree.ElementTree as ET
 from os.path import abspath, dirname, join
 
 import ddt
+import mock
 import pytz
+from django.core.files.storage import default_storage
+from django.test import override_settings
 from lxml import etree
 from rest_framework.reverse import reverse
 from rest_framework.test import APITestCase
 
+from course_discovery.apps.api import affiliate_window
+from course_discovery.apps.api.affiliate_window import (
+    build_feed, build_feeds, get_feed_path, get_feed_paths, remove_feeds
+)
+from course_discovery.apps.api.cache import get_catalog_generation
 from course_discovery.apps.api.serializers import AffiliateWindowSerializer
 from course_discovery.apps.api.v1.tests.test_views.mixins import SerializationMixin
+from course_discovery.apps.catalogs.models import Catalog
 from course_discovery.apps.catalogs.tests.factories import CatalogFactory
 from course_discovery.apps.core.tests.factories import UserFactory
 from course_discovery.apps.core.tests.mixins import ElasticsearchTestMixin
 from course_discovery.apps.course_metadata.choices import CourseRunStatus
-from course_discovery.apps.course_metadata.models import Seat
+from course_discovery.apps.course_metadata.models import Course, Seat
 from course_discovery.apps.course_metadata.tests.factories import CourseRunFactory, SeatFactory
 
 
@@ -38,6 +49,9 @@ class AffiliateWindowViewSetTests(ElasticsearchTestMixin, SerializationMixin, AP
         self.affiliate_url = reverse('api:v1:partners:affiliate_window-detail', kwargs={'pk': self.catalog.id})
         self.refresh_index()
 
+    def get_content(self, response):
+        return b''.join(response.streaming_content)
+
     def test_without_authentication(self):
         """ Verify authentication is required when accessing the endpoint. """
         self.client.logout()
@@ -46,11 +60,12 @@ class AffiliateWindowViewSetTests(ElasticsearchTestMixin, SerializationMixin, AP
 
     def test_affiliate_with_supported_seats(self):
         """ Verify that endpoint returns course runs for verified and professional seats only. """
-        with self.assertNumQueries(7):
+        with self.assertNumQueries(5):
             response = self.client.get(self.affiliate_url)
+            content = self.get_content(response)
 
         self.assertEqual(response.status_code, 200)
-        root = ET.fromstring(response.content)
+        root = ET.fromstring(content)
         self.assertEqual(1, len(root.findall('product')))
         self.assert_product_xml(
             root.findall('product/[pid="{}-{}"]'.format(self.course_run.key, self.seat_verified.type))[0],
@@ -61,7 +76,7 @@ class AffiliateWindowViewSetTests(ElasticsearchTestMixin, SerializationMixin, AP
         seat_professional = SeatFactory(course_run=self.course_run, type=Seat.PROFESSIONAL)
 
         response = self.client.get(self.affiliate_url)
-        root = ET.fromstring(response.content)
+        root = ET.fromstring(self.get_content(response))
         self.assertEqual(2, len(root.findall('product')))
 
         self.assert_product_xml(
@@ -82,7 +97,7 @@ class AffiliateWindowViewSetTests(ElasticsearchTestMixin, SerializationMixin, AP
 
         response = self.client.get(self.affiliate_url)
         self.assertEqual(response.status_code, 200)
-        root = ET.fromstring(response.content)
+        root = ET.fromstring(self.get_content(response))
         self.assertEqual(0, len(root.findall('product')))
 
     def test_with_closed_enrollment(self):
@@ -97,7 +112,7 @@ class AffiliateWindowViewSetTests(ElasticsearchTestMixin, SerializationMixin, AP
         response = self.client.get(self.affiliate_url)
 
         self.assertEqual(response.status_code, 200)
-        root = ET.fromstring(response.content)
+        root = ET.fromstring(self.get_content(response))
         self.assertEqual(0, len(root.findall('product')))
 
     def assert_product_xml(self, content, seat):
@@ -118,7 +133,7 @@ class AffiliateWindowViewSetTests(ElasticsearchTestMixin, SerializationMixin, AP
         filename = abspath(join(dirname(dirname(__file__)), 'affiliate_window_product_feed.1.4.dtd'))
         dtd = etree.DTD(open(filename))
 
-        root = etree.XML(response.content)
+        root = etree.XML(self.get_content(response))
         self.assertTrue(dtd.validate(root))
 
     def test_permissions(self):
@@ -130,9 +145,10 @@ class AffiliateWindowViewSetTests(ElasticsearchTestMixin, SerializationMixin, AP
         # Superusers can view all catalogs
         self.client.force_authenticate(superuser)
 
-        with self.assertNumQueries(4):
+        with self.assertNumQueries(2):
             response = self.client.get(url)
             self.assertEqual(response.status_code, 200)
+            self.get_content(response)
 
         # Regular users can only view catalogs belonging to them
         self.client.force_authenticate(self.user)
@@ -140,9 +156,10 @@ class AffiliateWindowViewSetTests(ElasticsearchTestMixin, SerializationMixin, AP
         self.assertEqual(response.status_code, 403)
 
         catalog.viewers = [self.user]
-        with self.assertNumQueries(7):
+        with self.assertNumQueries(5):
             response = self.client.get(url)
             self.assertEqual(response.status_code, 200)
+            self.get_content(response)
 
     def test_unpublished_status(self):
         """ Verify the endpoint does not return CourseRuns in a non-published state. """
@@ -154,5 +171,135 @@ class AffiliateWindowViewSetTests(ElasticsearchTestMixin, SerializationMixin, AP
         response = self.client.get(self.affiliate_url)
 
         self.assertEqual(response.status_code, 200)
-        root = ET.fromstring(response.content)
+        root = ET.fromstring(self.get_content(response))
         self.assertEqual(0, len(root.findall('product')))
+
+
+class AffiliateWindowFeedTests(APITestCase):
+    """ Tests for prebuilt Affiliate Window feeds. """
+
+    def setUp(self):
+        super(AffiliateWindowFeedTests, self).setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        override = override_settings(MEDIA_ROOT=media_root)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        # Catalog queries are not under test, and are answered by the database rather than Elasticsearch.
+        patcher = mock.patch.object(Catalog, 'courses', return_value=Course.objects.all())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.user = UserFactory()
+        self.client.force_authenticate(self.user)
+        self.catalog = CatalogFactory(query='*:*', viewers=[self.user])
+
+        end = datetime.datetime.now(pytz.UTC) + datetime.timedelta(days=60)
+        self.course_run = CourseRunFactory(enrollment_end=end, end=end)
+        SeatFactory(course_run=self.course_run, type=Seat.VERIFIED)
+        self.affiliate_url = reverse('api:v1:partners:affiliate_window-detail', kwargs={'pk': self.catalog.id})
+
+    def get_streamed_feed(self):
+        response = self.client.get(self.affiliate_url)
+        self.assertTrue(response.streaming)
+        # Only prebuilt feeds are served with validators.
+        self.assertNotIn('ETag', response)
+        return b''.join(response.streaming_content)
+
+    def build_feed(self):
+        return build_feed(self.catalog, get_catalog_generation())
+
+    def test_build_feed(self):
+        """ Verify the prebuilt feed is identical to the generated feed, and is served instead of it. """
+        expected = self.get_streamed_feed()
+        path = self.build_feed()
+
+        with default_storage.open(path) as feed:
+            self.assertEqual(feed.read(), expected)
+
+        response = self.client.get(self.affiliate_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), expected)
+        self.assertEqual(response['Content-Type'], 'application/xml; charset=utf-8')
+
+        # Rebuilding the feed at the same generation replaces it.
+        self.assertEqual(self.build_feed(), path)
+        self.assertEqual(get_feed_paths(), [path])
+
+    def test_stale_feed(self):
+        """ Verify feeds built before the catalog changed are not served, and feeds are generated instead. """
+        self.build_feed()
+        SeatFactory(course_run=self.course_run, type=Seat.PROFESSIONAL)
+
+        root = ET.fromstring(self.get_streamed_feed())
+        self.assertEqual(2, len(root.findall('product')))
+
+        self.build_feed()
+        self.catalog.query = 'title:foo'
+        self.catalog.save()
+        self.get_streamed_feed()
+
+    def test_conditional_requests(self):
+        """ Verify prebuilt feeds are served with validators, and are not sent again if they are unchanged. """
+        self.build_feed()
+        response = self.client.get(self.affiliate_url)
+        etag = response['ETag']
+        last_modified = response['Last-Modified']
+
+        response = self.client.get(self.affiliate_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(self.affiliate_url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(self.affiliate_url, HTTP_IF_NONE_MATCH='"other"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_permissions(self):
+        """ Verify prebuilt feeds are only served to users with the appropriate permissions. """
+        self.build_feed()
+        self.client.force_authenticate(UserFactory())
+
+        response = self.client.get(self.affiliate_url)
+        self.assertEqual(response.status_code, 403)
+
+    def test_build_feeds(self):
+        """ Verify a failure to build one catalog's feed does not prevent the others from being built. """
+        other_catalog = CatalogFactory()
+
+        get_seats = affiliate_window.get_seats
+
+        def side_effect(catalog):
+            if catalog == self.catalog:
+                raise Exception
+            return get_seats(catalog)
+
+        with mock.patch.object(affiliate_window, 'get_seats', side_effect=side_effect):
+            build_feeds()
+
+        generation = get_catalog_generation()
+        self.assertEqual(get_feed_paths(), [get_feed_path(other_catalog, generation)])
+
+    def test_build_feeds_removes_other_feeds(self):
+        """ Verify feeds built at previous generations, and the feeds of deleted catalogs, are removed. """
+        deleted_catalog = CatalogFactory()
+        build_feed(deleted_catalog, get_catalog_generation())
+        stale_path = self.build_feed()
+        deleted_catalog.delete()
+
+        build_feeds()
+
+        self.assertEqual(get_feed_paths(), [get_feed_path(self.catalog, get_catalog_generation())])
+        self.assertFalse(default_storage.exists(stale_path))
+
+    def test_remove_feeds(self):
+        """ Verify prebuilt feeds are removed, so that feeds are generated for each request instead. """
+        # No feed has been built yet.
+        remove_feeds()
+
+        self.build_feed()
+        remove_feeds()
+
+        self.assertEqual(get_feed_paths(), [])
+        self.get_streamed_feed()
@@ -3,6 +3,7 @@ import datetime
 import urllib
 
 import ddt
+import mock
 import pytest
 import pytz
 import responses
@@ -10,6 +11,7 @@ from django.contrib.auth import get_user_model
 from rest_framework.reverse import reverse
 from rest_framework.test import APITestCase
 
+from course_discovery.apps.api.renderers import CourseRunCSVRenderer
 from course_discovery.apps.api.tests.jwt_utils import generate_jwt_header_for_user
 from course_discovery.apps.api.v1.tests.test_views.mixins import OAuth2Mixin, SerializationMixin
 from course_discovery.apps.catalogs.models import Catalog
@@ -218,8 +220,9 @@ class CatalogViewSetTests(ElasticsearchTestMixin, SerializationMixin, OAuth2Mixi
 
         url = reverse('api:v1:catalog-csv', kwargs={'id': self.catalog.id})
 
-        with self.assertNumQueries(17):
+        with self.assertNumQueries(18):
             response = self.client.get(url)
+            content = b''.join(response.streaming_content).decode('utf-8')
 
         course_run = self.serialize_catalog_flat_course_run(self.course_run)
         expected = ','.join([
@@ -273,7 +276,22 @@ class CatalogViewSetTests(ElasticsearchTestMixin, SerializationMixin, OAuth2Mixi
         ])
 
         self.assertEqual(response.status_code, 200)
-        self.assertIn(expected, response.content.decode('utf-8'))
+        self.assertIn(expected, content)
+
+    def test_csv_chunks(self):
+        """ Verify the CSV is serialized in chunks, which contain all of the course runs. """
+        course_runs = [self.course_run, CourseRunFactory(course=self.course, end=self.course_run.end)]
+        for course_run in course_runs:
+            SeatFactory(type='verified', course_run=course_run)
+
+        url = reverse('api:v1:catalog-csv', kwargs={'id': self.catalog.id})
+
+        with mock.patch('course_discovery.apps.api.v1.views.catalogs.CSV_CHUNK_SIZE', 1):
+            response = self.client.get(url)
+            lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+
+        self.assertEqual(lines[0], ','.join(CourseRunCSVRenderer.header))
+        self.assertEqual([line.split(',')[0] for line in lines[1:]], [course_run.key for course_run in course_runs])
 
     def test_get(self):
         """ Verify the endpoint returns the details for a single catalog. """
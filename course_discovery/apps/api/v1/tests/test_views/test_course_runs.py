@@ -170,6 +170,16 @@ class CourseRunViewSetTests(SerializationMixin, ElasticsearchTestMixin, APITestC
                                  key=lambda course_run: course_run['key'])
         self.assertListEqual(actual_sorted, expected_sorted)
 
+    def test_list_query_with_cursor(self):
+        """ Verify search results requested with a cursor are paginated by limit and offset. """
+        course_runs = CourseRunFactory.create_batch(3, title='Some random title', course__partner=self.partner)
+        query = 'title:Some random title'
+        url = '{root}?q={query}&cursor='.format(root=reverse('api:v1:course_run-list'), query=query)
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], len(course_runs))
+
     def test_list_query_invalid_partner(self):
         """ Verify the endpoint returns an 400 BAD_REQUEST if an invalid partner is sent """
         query = 'title:Some random title'
@@ -195,6 +195,19 @@ class CourseViewSetTests(SerializationMixin, APITestCase):
             response = self.client.get(url)
             self.assertListEqual(response.data['results'], self.serialize_course(courses, many=True))
 
+    def test_list_cursor_pagination(self):
+        """ Verify the endpoint returns courses ordered by primary key, without a count, when paginated by cursor. """
+        courses = [self.course] + CourseFactory.create_batch(2)
+        url = reverse('api:v1:course-list') + '?cursor=&page_size=2'
+
+        response = self.client.get(url)
+        self.assertNotIn('count', response.data)
+        self.assertListEqual(response.data['results'], self.serialize_course(courses[:2], many=True))
+
+        response = self.client.get(response.data['next'])
+        self.assertIsNone(response.data['next'])
+        self.assertListEqual(response.data['results'], self.serialize_course(courses[2:], many=True))
+
     def test_list_exclude_utm(self):
         """ Verify the endpoint returns marketing URLs without UTM parameters. """
         url = reverse('api:v1:course-list') + '?exclude_utm=1'
@@ -1,14 +1,18 @@
+from django.core.files.storage import default_storage
+from django.http import FileResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from rest_framework import viewsets
 from rest_framework.exceptions import PermissionDenied
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.response import Response
 
 from course_discovery.apps.api import serializers
+from course_discovery.apps.api.affiliate_window import generate_feed, get_feed_path, get_feed_validators, get_seats
+from course_discovery.apps.api.cache import get_catalog_generation
 from course_discovery.apps.api.pagination import ProxiedPagination
 from course_discovery.apps.api.renderers import AffiliateWindowXMLRenderer
 from course_discovery.apps.catalogs.models import Catalog
-from course_discovery.apps.course_metadata.models import CourseRun, Seat
 
 
 class AffiliateWindowViewSet(viewsets.ViewSet):
@@ -21,6 +25,10 @@ class AffiliateWindowViewSet(viewsets.ViewSet):
     # versions of this API should only support the system default, PageNumberPagination.
     pagination_class = ProxiedPagination
 
+    content_type = '{media_type}; charset={charset}'.format(
+        media_type=AffiliateWindowXMLRenderer.media_type, charset=AffiliateWindowXMLRenderer.charset
+    )
+
     def retrieve(self, request, pk=None):  # pylint: disable=redefined-builtin,unused-argument
         """
         Return verified and professional seats of courses against provided catalog id.
@@ -34,10 +42,22 @@ class AffiliateWindowViewSet(viewsets.ViewSet):
         if not catalog.has_object_read_permission(request):
             raise PermissionDenied
 
-        courses = catalog.courses()
-        course_runs = CourseRun.objects.filter(course__in=courses).active().marketable()
-        seats = Seat.objects.filter(type__in=[Seat.VERIFIED, Seat.PROFESSIONAL]).filter(course_run__in=course_runs)
-        seats = seats.select_related('course_run').prefetch_related('course_run__course', 'course_run__course__partner')
+        # Feeds are prebuilt by refresh_course_metadata, if the prebuild_affiliate_window_feeds switch is active.
+        # Feeds built before the catalog last changed are stale, and are not served.
+        path = get_feed_path(catalog, get_catalog_generation())
+        if default_storage.exists(path):
+            return self.get_prebuilt_feed_response(request, path)
+
+        return StreamingHttpResponse(generate_feed(get_seats(catalog)), content_type=self.content_type)
+
+    def get_prebuilt_feed_response(self, request, path):
+        """ Serves a prebuilt feed from storage, answering conditional requests without reading it. """
+        etag, last_modified = get_feed_validators(path)
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = FileResponse(default_storage.open(path), content_type=self.content_type)
 
-        serializer = serializers.AffiliateWindowSerializer(seats, many=True)
-        return Response(serializer.data)
+        response['ETag'] = quote_etag(etag)
+        response['Last-Modified'] = http_date(last_modified)
+        return response
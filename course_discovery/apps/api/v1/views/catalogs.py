@@ -1,24 +1,29 @@
 import datetime
 
+from django.conf import settings
 from django.db import transaction
-from django.http import HttpResponse
+from django.http import StreamingHttpResponse
 from dry_rest_permissions.generics import DRYPermissions
 from rest_framework import status, viewsets
 from rest_framework.decorators import detail_route
 from rest_framework.response import Response
+from rest_framework_extensions.cache.decorators import cache_response
 
 from course_discovery.apps.api import filters, serializers
+from course_discovery.apps.api.cache import CatalogCacheResponseMixin
 from course_discovery.apps.api.pagination import ProxiedPagination
 from course_discovery.apps.api.renderers import CourseRunCSVRenderer
 from course_discovery.apps.api.v1.views import User
 from course_discovery.apps.catalogs.models import Catalog
 from course_discovery.apps.course_metadata.models import CourseRun
 
+# Number of course runs serialized at a time by the CSV export.
+CSV_CHUNK_SIZE = 500
+
 
 # pylint: disable=no-member
-class CatalogViewSet(viewsets.ModelViewSet):
+class CatalogViewSet(CatalogCacheResponseMixin, viewsets.ModelViewSet):
     """ Catalog resource. """
-
     filter_backends = (filters.PermissionsFilter,)
     lookup_field = 'id'
     permission_classes = (DRYPermissions,)
@@ -80,6 +85,7 @@ class CatalogViewSet(viewsets.ModelViewSet):
         return super(CatalogViewSet, self).update(request, *args, **kwargs)
 
     @detail_route()
+    @cache_response(timeout=settings.API_RESPONSE_CACHE_TIMEOUT, key_func='cache_key_func')
     def courses(self, request, id=None):  # pylint: disable=redefined-builtin,unused-argument
         """
         Retrieve the list of courses contained within this catalog.
@@ -155,19 +161,30 @@ class CatalogViewSet(viewsets.ModelViewSet):
         courses = catalog.courses()
         course_runs = CourseRun.objects.filter(course__in=courses).active().marketable()
 
-        # We use select_related and prefetch_related to decrease our database query count
-        course_runs = course_runs.select_related(*serializers.SELECT_RELATED_FIELDS['course_run'])
-        prefetch_fields = ['course__' + field for field in serializers.PREFETCH_FIELDS['course']]
-        prefetch_fields += serializers.PREFETCH_FIELDS['course_run']
-        course_runs = course_runs.prefetch_related(*prefetch_fields)
-
-        serializer = serializers.FlattenedCourseRunWithCourseSerializer(
-            course_runs, many=True, context={'request': request}
-        )
-        data = CourseRunCSVRenderer().render(serializer.data)
-
-        response = HttpResponse(data, content_type='text/csv')
+        data = self.serialize_course_runs_in_chunks(course_runs, request)
+        response = StreamingHttpResponse(CourseRunCSVRenderer().render_stream(data), content_type='text/csv')
         response['Content-Disposition'] = 'attachment; filename="catalog_{id}_{date}.csv"'.format(
             id=id, date=datetime.datetime.utcnow().strftime('%Y-%m-%d-%H-%M')
         )
         return response
+
+    def serialize_course_runs_in_chunks(self, course_runs, request):
+        """
+        Serializes course runs in chunks of CSV_CHUNK_SIZE, so that only one chunk of course runs, and their
+        related objects, is held in memory at a time.
+        """
+        pks = list(course_runs.order_by('pk').values_list('pk', flat=True))
+
+        for start in range(0, len(pks), CSV_CHUNK_SIZE):
+            chunk = CourseRun.objects.filter(pk__in=pks[start:start + CSV_CHUNK_SIZE]).order_by('pk')
+
+            # We use select_related and prefetch_related to decrease our database query count
+            chunk = chunk.select_related(*serializers.SELECT_RELATED_FIELDS['course_run'])
+            prefetch_fields = ['course__' + field for field in serializers.PREFETCH_FIELDS['course']]
+            prefetch_fields += serializers.PREFETCH_FIELDS['course_run']
+            chunk = chunk.prefetch_related(*prefetch_fields)
+
+            serializer = serializers.FlattenedCourseRunWithCourseSerializer(
+                chunk, many=True, context={'request': request}
+            )
+            yield from serializer.data
@@ -6,6 +6,7 @@ from rest_framework.permissions import DjangoModelPermissions, IsAuthenticated
 from rest_framework.response import Response
 
 from course_discovery.apps.api import filters, serializers
+from course_discovery.apps.api.cache import CatalogCacheResponseMixin
 from course_discovery.apps.api.pagination import ProxiedPagination
 from course_discovery.apps.api.v1.views import PartnerMixin, get_query_param
 from course_discovery.apps.core.utils import SearchQuerySetWrapper
@@ -14,7 +15,7 @@ from course_discovery.apps.course_metadata.models import CourseRun
 
 
 # pylint: disable=no-member
-class CourseRunViewSet(PartnerMixin, viewsets.ModelViewSet):
+class CourseRunViewSet(PartnerMixin, CatalogCacheResponseMixin, viewsets.ModelViewSet):
     """ CourseRun resource. """
     filter_backends = (DjangoFilterBackend, OrderingFilter)
     filter_class = filters.CourseRunFilter
@@ -4,6 +4,7 @@ from rest_framework.filters import DjangoFilterBackend
 from rest_framework.permissions import IsAuthenticated
 
 from course_discovery.apps.api import filters, serializers
+from course_discovery.apps.api.cache import CatalogCacheResponseMixin
 from course_discovery.apps.api.pagination import ProxiedPagination
 from course_discovery.apps.api.v1.views import get_query_param
 from course_discovery.apps.course_metadata.choices import CourseRunStatus
@@ -12,7 +13,7 @@ from course_discovery.apps.course_metadata.models import Course, CourseRun
 
 
 # pylint: disable=no-member
-class CourseViewSet(viewsets.ReadOnlyModelViewSet):
+class CourseViewSet(CatalogCacheResponseMixin, viewsets.ReadOnlyModelViewSet):
     """ Course resource. """
     filter_backends = (DjangoFilterBackend,)
     filter_class = filters.CourseFilter
@@ -0,0 +1,47 @@
+import re
+
+import mock
+from django.core.cache import cache
+from django.test import TestCase
+
+from course_discovery.settings import process_synonyms
+
+
+class SynonymsTests(TestCase):
+    synonyms = [['Running', 'jogging'], ['HTML5', 'HTML'], ['the course', 'class']]
+
+    def setUp(self):
+        super(SynonymsTests, self).setUp()
+        cache.clear()
+        self.es = mock.Mock()
+        self.es.info.return_value = {'version': {'number': '1.5.2'}}
+        self.es.indices.analyze.side_effect = self.analyze
+
+    def analyze(self, body, analyzer):  # pylint: disable=unused-argument
+        """ Imitates the snowball analyzer, by removing stop words and lowercasing and stemming tokens. """
+        tokens = [
+            {'token': re.sub('ing$', '', match.group().lower()), 'start_offset': match.start()}
+            for match in re.finditer(r'\w+', body) if match.group() != 'the'
+        ]
+        return {'tokens': tokens}
+
+    def test_process_synonyms(self):
+        """ Verify synonyms are analyzed in batches, and each line joined. """
+        with mock.patch.object(process_synonyms, 'ANALYZE_BATCH_SIZE', 4):
+            processed = process_synonyms.process_synonyms(self.es, self.synonyms)
+
+        self.assertEqual(processed, ['runn,jogg', 'html5,html', 'course,class'])
+        self.assertEqual(self.es.indices.analyze.call_count, 2)
+
+    def test_get_synonyms_is_cached(self):
+        """ Verify the analyzed synonyms are shared between processes, until the synonyms change. """
+        with mock.patch.object(process_synonyms, 'get_synonym_lines_from_file', return_value=self.synonyms):
+            synonyms = process_synonyms.get_synonyms.__wrapped__(self.es)
+            self.assertEqual(process_synonyms.get_synonyms.__wrapped__(self.es), synonyms)
+
+        self.assertEqual(self.es.indices.analyze.call_count, 1)
+
+        with mock.patch.object(process_synonyms, 'get_synonym_lines_from_file', return_value=self.synonyms[:1]):
+            self.assertEqual(process_synonyms.get_synonyms.__wrapped__(self.es), synonyms[:1])
+
+        self.assertEqual(self.es.indices.analyze.call_count, 2)
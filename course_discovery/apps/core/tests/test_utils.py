@@ -1,10 +1,14 @@
-from django.db import models
+import mock
+from django.db import connection, models
+from django.db.models import QuerySet
 from django.test import TestCase
 from haystack.query import SearchQuerySet
 
-from course_discovery.apps.core.utils import SearchQuerySetWrapper, get_all_related_field_names
-from course_discovery.apps.course_metadata.models import CourseRun
-from course_discovery.apps.course_metadata.tests.factories import CourseRunFactory
+from course_discovery.apps.core.utils import SearchQuerySetWrapper, delete_orphans, get_all_related_field_names
+from course_discovery.apps.course_metadata.models import CourseRun, Image, Video
+from course_discovery.apps.course_metadata.tests.factories import (
+    CourseFactory, CourseRunFactory, ImageFactory, VideoFactory
+)
 
 
 class UnrelatedModel(models.Model):
@@ -35,12 +39,70 @@ class M2MRelatedModel(models.Model):
         managed = False
 
 
+class HistoricalVideo(models.Model):
+    """ Imitates the historical records of django-simple-history, which reference media through hidden relations. """
+    video = models.ForeignKey(Video, related_name='+', on_delete=models.DO_NOTHING, db_constraint=False, null=True)
+
+    class Meta:
+        app_label = 'core'
+        managed = False
+
+
 class ModelUtilTests(TestCase):
     def test_get_all_related_field_names(self):
         """ Verify the method returns the names of all relational fields for a model. """
         self.assertEqual(get_all_related_field_names(UnrelatedModel), [])
         self.assertEqual(set(get_all_related_field_names(RelatedModel)), {'foreignrelatedmodel', 'm2mrelatedmodel'})
 
+    def test_delete_orphans(self):
+        """ Verify only instances without relationships are deleted, in batches of the given size. """
+        referenced_video = CourseFactory().video
+        referenced_image = referenced_video.image
+        orphaned_videos = VideoFactory.create_batch(3, image=None)
+        orphaned_image = ImageFactory()
+
+        with mock.patch.object(QuerySet, 'delete', autospec=True, side_effect=QuerySet.delete) as mock_delete:
+            self.assertEqual(delete_orphans(Video, batch_size=2), len(orphaned_videos))
+            self.assertEqual(mock_delete.call_count, 2)
+
+        self.assertEqual(list(Video.objects.all()), [referenced_video])
+        self.assertEqual(delete_orphans(Image), 1)
+        self.assertFalse(Image.objects.filter(pk=orphaned_image.pk).exists())
+        self.assertTrue(Image.objects.filter(pk=referenced_image.pk).exists())
+
+    def test_delete_orphans_with_historical_references(self):
+        """ Verify instances only referenced by historical records, through hidden relations, are deleted. """
+        with connection.schema_editor() as editor:
+            editor.create_model(HistoricalVideo)
+        self.addCleanup(self.delete_model, HistoricalVideo)
+
+        video = VideoFactory(image=None)
+        HistoricalVideo.objects.create(video=video)
+
+        self.assertEqual(delete_orphans(Video), 1)
+        self.assertFalse(Video.objects.filter(pk=video.pk).exists())
+
+    def delete_model(self, model):
+        with connection.schema_editor() as editor:
+            editor.delete_model(model)
+
+    def test_delete_orphans_referenced_while_deleting(self):
+        """ Verify instances which are referenced after the orphans are found are not deleted. """
+        orphaned_videos = VideoFactory.create_batch(2, image=None)
+        original_delete = QuerySet.delete
+
+        def delete(queryset):
+            # Reference the orphans between finding and deleting them.
+            for video in orphaned_videos:
+                CourseRunFactory(video=video)
+            return original_delete(queryset)
+
+        with mock.patch.object(QuerySet, 'delete', autospec=True, side_effect=delete):
+            self.assertEqual(delete_orphans(Video), 0)
+
+        self.assertEqual(Video.objects.filter(pk__in=[video.pk for video in orphaned_videos]).count(), 2)
+        self.assertEqual(CourseRun.objects.filter(video__in=orphaned_videos).count(), 2)
+
 
 class SearchQuerySetWrapperTests(TestCase):
     def setUp(self):
@@ -65,19 +65,42 @@ def get_all_related_field_names(model):
     return list(names)
 
 
-def delete_orphans(model):
+def delete_orphans(model, batch_size=1000):
     """
     Deletes all instances of the given model with no relationships to other models.
 
+    Orphans are found with a single anti-join query which checks the (indexed) foreign key columns of each related
+    model, rather than outer joining every related table. They are then deleted in batches, so that no single
+    transaction holds locks on a large number of rows. Each batch is filtered by the anti-join again, so that
+    instances which are referenced after the orphans are found are not deleted (along with the related instances
+    which cascade from them).
+
     Args:
         model (Model): Model whose instances should be deleted
+        batch_size (int): Maximum number of instances deleted at once
 
     Returns:
-        None
+        int: Number of instances deleted
     """
-    field_names = get_all_related_field_names(model)
-    kwargs = {'{0}__isnull'.format(field_name): True for field_name in field_names}
-    model.objects.filter(**kwargs).delete()
+    queryset = model.objects.all()
+
+    # Hidden relations (i.e. those with a related_name of '+', such as the historical records of
+    # django-simple-history) are not checked, so instances only referenced by them are still deleted.
+    for relation in model._meta._get_fields(forward=False):  # pylint: disable=protected-access
+        field_name = relation.field.name
+        referenced = relation.related_model.objects.filter(
+            **{'{0}__isnull'.format(field_name): False}
+        ).values(field_name)
+        queryset = queryset.exclude(pk__in=referenced)
+
+    pks = list(queryset.values_list('pk', flat=True))
+    count = 0
+
+    for start in range(0, len(pks), batch_size):
+        __, deleted = queryset.filter(pk__in=pks[start:start + batch_size]).delete()
+        count += deleted.get(model._meta.label, 0)  # pylint: disable=protected-access
+
+    return count
 
 
 class SearchQuerySetWrapper(object):
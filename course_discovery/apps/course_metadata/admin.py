@@ -271,5 +271,5 @@ for model in (LevelType, Prerequisite,):
 
 # Register remaining models using basic ModelAdmin classes
 for model in (Image, Video, ExpectedLearningItem, SyllabusItem, PersonSocialNetwork, CourseRunSocialNetwork,
-              JobOutlookItem, DataLoaderConfig):
+              JobOutlookItem, DataLoaderConfig, DataLoaderWatermark, DataLoaderRun):
     admin.site.register(model)
@@ -0,0 +1,158 @@
+import threading
+from collections import defaultdict, namedtuple
+from contextlib import contextmanager
+
+from course_discovery.apps.course_metadata.choices import ProgramStatus
+from course_discovery.apps.course_metadata.models import Course, CourseRun, Program, ProgramType, Seat
+
+ProgramData = namedtuple('ProgramData', ['staff_uuids', 'subject_uuids', 'seat_types', 'start'])
+
+# Holds the graph in use by the search indexes of each thread, if any.
+_local = threading.local()
+
+
+class CatalogGraph(object):
+    """
+    Denormalized data about programs and course runs, computed with a single pass over the catalog.
+
+    Several search index fields (e.g. a program's seat types, or a course run's program types) are derived by
+    walking the relations between courses, course runs, seats and programs. Doing so for each document repeats
+    the walk for every program containing a course. The graph instead reads each relation once, as rows rather
+    than model instances, and computes the fields of every document in memory.
+
+    The graph is a snapshot. Objects created after it was built are not included, and must be prepared
+    from their models.
+
+    The graph also memoizes data derived from organizations, which appear on many documents, as the documents
+    are prepared.
+
+    A graph is only used by the search indexes of the thread which activated it (and of processes forked by that
+    thread), so that documents prepared concurrently by other threads are not affected.
+    """
+
+    def __init__(self):
+        # Maps program primary keys to ProgramData.
+        self.programs = {}
+        # Maps course run primary keys to the names of the types of the active programs containing them.
+        self.course_run_program_types = {}
+        # Maps course run primary keys to PaidSeatAvailability.
+        self.course_run_paid_seat_availability = {}
+        # Maps names of data derived from organizations to dicts mapping (primary key, modified) to the data.
+        self.organization_results = defaultdict(dict)
+
+    @classmethod
+    def get_current(cls):
+        """ Returns the graph in use by the search indexes of the calling thread, or None. """
+        return getattr(_local, 'graph', None)
+
+    @classmethod
+    @contextmanager
+    def activate(cls):
+        """ Builds a graph, which is used by the calling thread's search indexes until the context is exited. """
+        _local.graph = cls.build()
+        try:
+            yield _local.graph
+        finally:
+            _local.graph = None
+
+    def memoize_organization(self, name, organization, func):
+        """
+        Returns func(organization), calling func at most once for each version of the organization.
+
+        Arguments:
+            name (str): Name of the data returned by func, under which the results are memoized.
+            organization (Organization): Organization passed to func.
+            func (function): Function deriving data from an organization.
+        """
+        results = self.organization_results[name]
+        key = (organization.pk, organization.modified)
+
+        if key not in results:
+            results[key] = func(organization)
+
+        return results[key]
+
+    @classmethod
+    def build(cls):
+        graph = cls()
+
+        seat_types_by_course_run = defaultdict(set)
+        upgrade_deadlines_by_course_run = defaultdict(list)
+        seats = Seat.objects.values_list('course_run_id', 'type', 'price', 'upgrade_deadline')
+        for course_run_id, seat_type, price, upgrade_deadline in seats:
+            seat_types_by_course_run[course_run_id].add(seat_type)
+
+            if Seat.is_enrollable_paid_seat(seat_type, price):
+                upgrade_deadlines_by_course_run[course_run_id].append(upgrade_deadline)
+
+        course_runs_by_course = defaultdict(list)
+        course_run_starts = {}
+        course_runs = CourseRun.objects.order_by('pk').values_list('pk', 'course_id', 'start', 'end', 'enrollment_end')
+        for course_run_id, course_id, start, end, enrollment_end in course_runs:
+            course_runs_by_course[course_id].append(course_run_id)
+            course_run_starts[course_run_id] = start
+            graph.course_run_program_types[course_run_id] = []
+            graph.course_run_paid_seat_availability[course_run_id] = CourseRun.compute_paid_seat_availability(
+                end, enrollment_end, upgrade_deadlines_by_course_run[course_run_id]
+            )
+
+        # pylint cannot infer the through models of many-to-many fields.
+        course_run_staff = CourseRun.staff.through  # pylint: disable=no-member
+        course_subjects = Course.subjects.through  # pylint: disable=no-member
+        program_excluded_course_runs = Program.excluded_course_runs.through  # pylint: disable=no-member
+        program_type_seat_types = ProgramType.applicable_seat_types.through  # pylint: disable=no-member
+
+        staff_by_course_run = defaultdict(list)
+        staff = course_run_staff.objects.order_by('sort_value').values_list('courserun_id', 'person__uuid')
+        for course_run_id, uuid in staff:
+            staff_by_course_run[course_run_id].append(str(uuid))
+
+        subjects_by_course = defaultdict(list)
+        subjects = course_subjects.objects.order_by('pk').values_list('course_id', 'subject__uuid')
+        for course_id, uuid in subjects:
+            subjects_by_course[course_id].append(str(uuid))
+
+        courses_by_program = defaultdict(list)
+        program_courses = Program.courses.through.objects.order_by('sort_value').values_list('program_id', 'course_id')
+        for program_id, course_id in program_courses:
+            courses_by_program[program_id].append(course_id)
+
+        excluded_course_runs_by_program = defaultdict(set)
+        excluded_course_runs = program_excluded_course_runs.objects.values_list('program_id', 'courserun_id')
+        for program_id, course_run_id in excluded_course_runs:
+            excluded_course_runs_by_program[program_id].add(course_run_id)
+
+        applicable_seat_types_by_program_type = defaultdict(set)
+        seat_types = program_type_seat_types.objects.values_list('programtype_id', 'seattype__slug')
+        for program_type_id, slug in seat_types:
+            applicable_seat_types_by_program_type[program_type_id].add(slug)
+
+        inactive_statuses = (ProgramStatus.Unpublished, ProgramStatus.Deleted)
+        programs = Program.objects.order_by('pk').values_list('pk', 'status', 'type_id', 'type__name')
+
+        for program_id, status, program_type_id, program_type_name in programs:
+            course_ids = courses_by_program[program_id]
+            excluded_course_run_ids = excluded_course_runs_by_program[program_id]
+            course_run_ids = [
+                course_run_id for course_id in course_ids for course_run_id in course_runs_by_course[course_id]
+                if course_run_id not in excluded_course_run_ids
+            ]
+            applicable_seat_types = applicable_seat_types_by_program_type[program_type_id]
+            starts = [course_run_starts[course_run_id] for course_run_id in course_run_ids]
+            starts = [start for start in starts if start]
+
+            graph.programs[program_id] = ProgramData(
+                staff_uuids=[uuid for course_run_id in course_run_ids for uuid in staff_by_course_run[course_run_id]],
+                subject_uuids=[uuid for course_id in course_ids for uuid in subjects_by_course[course_id]],
+                seat_types={
+                    seat_type for course_run_id in course_run_ids
+                    for seat_type in seat_types_by_course_run[course_run_id] if seat_type in applicable_seat_types
+                },
+                start=min(starts) if starts else None,
+            )
+
+            if program_type_name and status not in inactive_statuses:
+                for course_run_id in course_run_ids:
+                    graph.course_run_program_types[course_run_id].append(program_type_name)
+
+        return graph
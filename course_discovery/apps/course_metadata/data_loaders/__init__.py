@@ -1,15 +1,26 @@
 import abc
-import re
+import concurrent.futures
+import hashlib
+import itertools
+import json
+import logging
 
-import html2text
-import markdown
 from dateutil.parser import parse
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import transaction
 from django.utils.functional import cached_property
 from edx_rest_api_client.client import EdxRestApiClient
 from opaque_keys.edx.keys import CourseKey
 
 from course_discovery.apps.core.utils import delete_orphans
-from course_discovery.apps.course_metadata.models import Image, Video
+from course_discovery.apps.course_metadata.data_loaders.fetchers import mount_connection_pool
+from course_discovery.apps.course_metadata.data_loaders.html_cleaner import HtmlCleaner, clean_html
+from course_discovery.apps.course_metadata.data_loaders.lookups import LookupCache
+from course_discovery.apps.course_metadata.data_loaders.metrics import DataLoaderMetrics
+from course_discovery.apps.course_metadata.models import DataLoaderFingerprint, Image, Video
+
+logger = logging.getLogger(__name__)
 
 
 class AbstractDataLoader(metaclass=abc.ABCMeta):
@@ -19,11 +30,23 @@ class AbstractDataLoader(metaclass=abc.ABCMeta):
         api_url (str): URL of the API from which data is loaded
         partner (Partner): Partner which owns the data for this data loader
         access_token (str): OAuth2 access token
+        modified_since (datetime): If set, only records modified after this time are requested
+        full (bool): If True, records are processed even if they have not changed since the last run
+        metrics (DataLoaderMetrics): Metrics collected while loading data
+        lookups (LookupCache): Cache of the reference data (e.g. currencies, videos) looked up while loading data
+        html_cleaner (HtmlCleaner): Cleans, and memoizes, the HTML loaded by this loader
+        DEPENDENCIES (tuple): Names of the loaders whose data must be loaded, for the same partner, before this
+            loader runs
         PAGE_SIZE (int): Number of items to load per API call
+        PENDING_PAGES_PER_WORKER (int): Number of fetched, but unprocessed, pages allowed per worker thread
+        SUPPORTS_MODIFIED_SINCE (bool): True if the API can return only the records modified since a given time.
+            Other loaders request every record on each run, and rely on fingerprints to skip unchanged records.
     """
 
+    DEPENDENCIES = ()
     PAGE_SIZE = 50
-    MARKDOWN_CLEANUP_REGEX = re.compile(r'^<p>(.*)</p>$')
+    PENDING_PAGES_PER_WORKER = 2
+    SUPPORTS_MODIFIED_SINCE = False
 
     def __init__(self, partner, api_url, access_token=None, token_type=None, max_workers=None,
                  is_threadsafe=False, **kwargs):
@@ -35,6 +58,14 @@ class AbstractDataLoader(metaclass=abc.ABCMeta):
             token_type (str): The type of access token passed in (e.g. Bearer, JWT)
             max_workers (int): Number of worker threads to use when traversing paginated responses.
             is_threadsafe (bool): True if multiple threads can be used to write data.
+
+        Keyword Arguments:
+            username (str): Username passed to APIs which filter data by user.
+            modified_since (datetime): High-water mark from the last successful run. If set, only records
+                modified after this time are requested.
+            full (bool): If True, records are processed even if their fingerprints match those recorded by
+                the last run.
+            lookup_cache (LookupCache): Cache of reference data to share with other loaders run in this process.
         """
         if token_type:
             token_type = token_type.lower()
@@ -47,6 +78,11 @@ class AbstractDataLoader(metaclass=abc.ABCMeta):
         self.max_workers = max_workers
         self.is_threadsafe = is_threadsafe
         self.username = kwargs.get('username')
+        self.modified_since = kwargs.get('modified_since')
+        self.full = kwargs.get('full', False)
+        self.metrics = DataLoaderMetrics()
+        self.lookups = kwargs.get('lookup_cache') or LookupCache()
+        self.html_cleaner = HtmlCleaner(max_workers=settings.DATA_LOADER_HTML_CLEANER_MAX_WORKERS)
 
     @cached_property
     def api_client(self):
@@ -65,11 +101,66 @@ class AbstractDataLoader(metaclass=abc.ABCMeta):
 
         return EdxRestApiClient(self.api_url, **kwargs)
 
+    @property
+    def http_session(self):
+        """ Returns the requests session used by the API client. """
+        return self.api_client._store['session']  # pylint: disable=protected-access
+
+    def get_modified_since_kwargs(self):
+        """ Returns the query parameters used to request only records modified since the last successful run.
+
+        Returns:
+            dict
+        """
+        if self.modified_since and self.SUPPORTS_MODIFIED_SINCE:
+            return {'modified_since': self.modified_since.isoformat()}
+
+        return {}
+
     @abc.abstractmethod
     def ingest(self):  # pragma: no cover
         """ Load data for all supported objects (e.g. courses, runs). """
         pass
 
+    def _fetch_and_process_pages(self, pages, make_request, process_response):
+        """ Fetches pages using a pool of worker threads, and processes them serially in the calling thread.
+
+        Responses are processed in the order in which they arrive, rather than the order in which they were
+        requested, so a slow page does not block the processing of the others. The number of pages requested,
+        but not yet processed, is bounded to limit memory usage; workers stop fetching until the calling
+        thread catches up. The session keeps a connection to the host alive for each worker, and retries requests
+        which fail with transient errors.
+
+        Arguments:
+            pages (iterable): Page numbers to fetch.
+            make_request (callable): Fetches a single page, given its number.
+            process_response (callable): Processes the response for a single page.
+        """
+        process_response = self.metrics.timed('process', process_response)
+        mount_connection_pool(self.http_session, self.max_workers or 1)
+
+        pages = iter(pages)
+        max_pending = self.PENDING_PAGES_PER_WORKER * (self.max_workers or 1)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = {executor.submit(make_request, page) for page in itertools.islice(pages, max_pending)}
+
+            try:
+                while pending:
+                    done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+
+                    for future in done:
+                        response = future.result()
+
+                        # Request the next page before processing this one, so that the workers continue
+                        # fetching data while this thread writes to the database.
+                        pending.update(executor.submit(make_request, page) for page in itertools.islice(pages, 1))
+                        process_response(response)
+            finally:
+                # If fetching or processing a page failed, do not bother fetching the remaining pages.
+                for future in pending:
+                    future.cancel()
+
     @classmethod
     def clean_string(cls, s):
         """ Removes all leading and trailing spaces. Returns None if the resulting string is empty. """
@@ -91,19 +182,7 @@ class AbstractDataLoader(metaclass=abc.ABCMeta):
         This method converts the HTML to a Markdown string (to remove styles, classes, and other unsupported
         attributes), and converts the Markdown back to HTML.
         """
-        cleaned = content.replace('&nbsp;', '')
-        html_converter = html2text.HTML2Text()
-        html_converter.wrap_links = False
-        html_converter.body_width = None
-        cleaned = html_converter.handle(cleaned).strip()
-        cleaned = markdown.markdown(cleaned)
-        cleaned = cls.MARKDOWN_CLEANUP_REGEX.sub(r'\1', cleaned)
-
-        # html2text does not handle ampersands properly.
-        # See https://github.com/Alir3z4/html2text/issues/109.
-        cleaned = cleaned.replace('&amp;', '&')
-
-        return cleaned
+        return clean_html(content)
 
     @classmethod
     def parse_date(cls, date_string):
@@ -136,31 +215,129 @@ class AbstractDataLoader(metaclass=abc.ABCMeta):
         return '{org}+{course}'.format(org=course_run_key.org, course=course_run_key.course)
 
     @classmethod
-    def delete_orphans(cls):
-        """ Remove orphaned objects from the database. """
-        for model in (Image, Video):
-            delete_orphans(model)
+    def _update_instance(cls, instance, validated_data):
+        """ Updates, and saves, the instance only if the validated data differs from its current values.
+
+        Arguments:
+            instance (Model): Model instance to update.
+            validated_data (dict): New values, keyed by field name.
+
+        Returns:
+            bool: True if the instance was changed and saved.
+        """
+        changed = False
+
+        for attr, value in validated_data.items():
+            if cls._is_changed(instance, attr, value):
+                setattr(instance, attr, value)
+                changed = True
+
+        if changed:
+            instance.save()
+
+        return changed
 
     @classmethod
-    def _get_or_create_media(cls, media_type, url):
+    def _is_changed(cls, instance, attr, value):
+        try:
+            field = instance._meta.get_field(attr)  # pylint: disable=protected-access
+        except FieldDoesNotExist:
+            field = None
+
+        if field and field.many_to_one:
+            # Compare primary keys to avoid retrieving the related object.
+            return getattr(instance, field.attname) != (value.pk if value is not None else None)
+
+        if field and field.concrete and not field.is_relation:
+            # Normalize the value (e.g. str to UUID) so equal values compare as such.
+            try:
+                value = field.to_python(value)
+            except ValidationError:
+                return True
+
+        return getattr(instance, attr) != value
+
+    @classmethod
+    def compute_fingerprint(cls, data):
+        """ Returns a stable hash of the (cleaned) upstream data for a single record.
+
+        Arguments:
+            data (dict): Data retrieved from the upstream API.
+
+        Returns:
+            str
+        """
+        serialized = json.dumps(data, sort_keys=True, default=str)
+        return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+    def get_fingerprints(self, keys):
+        """ Retrieves the fingerprints recorded by the last run of this loader for the given records.
+
+        Arguments:
+            keys (list): Upstream identifiers of the records.
+
+        Returns:
+            dict: Fingerprints keyed by upstream identifier. Empty if this is a full run.
+        """
+        if self.full:
+            return {}
+
+        fingerprints = DataLoaderFingerprint.objects.filter(
+            partner=self.partner, loader=self.__class__.__name__, key__in=keys
+        )
+        return dict(fingerprints.values_list('key', 'fingerprint'))
+
+    def save_fingerprints(self, fingerprints):
+        """ Records the fingerprints of the records successfully processed by this run.
+
+        Any fingerprints previously recorded for the records are replaced, using a single query to delete them and
+        another to create the new ones.
+
+        Arguments:
+            fingerprints (dict): New fingerprints keyed by upstream identifier.
+        """
+        if not fingerprints:
+            return
+
+        loader = self.__class__.__name__
+
+        with transaction.atomic():
+            DataLoaderFingerprint.objects.filter(partner=self.partner, loader=loader, key__in=fingerprints).delete()
+            DataLoaderFingerprint.objects.bulk_create([
+                DataLoaderFingerprint(partner=self.partner, loader=loader, key=key, fingerprint=fingerprint)
+                for key, fingerprint in fingerprints.items()
+            ])
+
+    @classmethod
+    def delete_orphans(cls):
+        """ Remove orphaned objects from the database.
+
+        This is run once, after all data loaders have finished, rather than by each loader. Videos are deleted
+        before images, since images may only be referenced by orphaned videos.
+        """
+        for model in (Video, Image):
+            count = delete_orphans(model)
+            logger.info('Deleted %d orphaned %s objects.', count, model.__name__)
+
+    def _get_or_create_media(self, media_type, url):
         media = None
 
         if url:
-            media, __ = media_type.objects.get_or_create(src=url)
+            media = self.lookups.get_or_create(media_type, 'src', url)
 
         return media
 
-    @classmethod
-    def get_or_create_video(cls, url, image_url=None):
-        video = cls._get_or_create_media(Video, url)
+    def get_or_create_video(self, url, image_url=None):
+        video = self._get_or_create_media(Video, url)
 
         if video:
-            image = cls.get_or_create_image(image_url)
-            video.image = image
-            video.save()
+            image = self.get_or_create_image(image_url)
+
+            if video.image_id != getattr(image, 'pk', None):
+                video.image = image
+                video.save()
 
         return video
 
-    @classmethod
-    def get_or_create_image(cls, url):
-        return cls._get_or_create_media(Image, url)
+    def get_or_create_image(self, url):
+        return self._get_or_create_media(Image, url)
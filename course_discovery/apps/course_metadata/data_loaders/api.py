@@ -3,9 +3,11 @@ import logging
 import math
 from decimal import Decimal
 from io import BytesIO
+from uuid import UUID
 
 import requests
 from django.core.files import File
+from django.db import IntegrityError, transaction
 from opaque_keys.edx.keys import CourseKey
 
 from course_discovery.apps.core.models import Currency
@@ -20,6 +22,7 @@ logger = logging.getLogger(__name__)
 
 class OrganizationsApiDataLoader(AbstractDataLoader):
     """ Loads organizations from the Organizations API. """
+    DEPENDENCIES = ('SchoolMarketingSiteDataLoader', 'SponsorMarketingSiteDataLoader')
 
     def ingest(self):
         api_url = self.partner.organizations_api_url
@@ -29,7 +32,9 @@ class OrganizationsApiDataLoader(AbstractDataLoader):
         logger.info('Refreshing Organizations from %s...', api_url)
 
         while page:
-            response = self.api_client.organizations().get(page=page, page_size=self.PAGE_SIZE)
+            response = self.api_client.organizations().get(
+                page=page, page_size=self.PAGE_SIZE, **self.get_modified_since_kwargs()
+            )
             count = response['count']
             results = response['results']
             logger.info('Retrieved %d organizations...', len(results))
@@ -42,9 +47,10 @@ class OrganizationsApiDataLoader(AbstractDataLoader):
                 body = self.clean_strings(body)
                 self.update_organization(body)
 
-        logger.info('Retrieved %d organizations from %s.', count, api_url)
+            # Other loaders may look up the organizations created, or modified, by this one.
+            self.lookups.invalidate(Organization)
 
-        self.delete_orphans()
+        logger.info('Retrieved %d organizations from %s.', count, api_url)
 
     def update_organization(self, body):
         key = body['short_name']
@@ -63,12 +69,14 @@ class OrganizationsApiDataLoader(AbstractDataLoader):
                 'logo_image_url': logo,
             })
 
-        Organization.objects.update_or_create(key__iexact=key, partner=self.partner, defaults=defaults)
+        __, created = Organization.objects.update_or_create(key__iexact=key, partner=self.partner, defaults=defaults)
+        self.metrics.record_rows('created' if created else 'updated')
         logger.info('Processed organization "%s"', key)
 
 
 class CoursesApiDataLoader(AbstractDataLoader):
     """ Loads course runs from the Courses API. """
+    DEPENDENCIES = ('CourseMarketingSiteDataLoader', 'OrganizationsApiDataLoader')
 
     def ingest(self):
         logger.info('Refreshing Courses and CourseRuns from %s...', self.partner.courses_api_url)
@@ -81,56 +89,98 @@ class CoursesApiDataLoader(AbstractDataLoader):
 
         pagerange = range(initial_page + 1, pages + 1)
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:  # pragma: no cover
-            if self.is_threadsafe:
+        if self.is_threadsafe:  # pragma: no cover
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
                 for page in pagerange:
-                    executor.submit(self._load_data, page)
-            else:
-                for future in [executor.submit(self._make_request, page) for page in pagerange]:
-                    response = future.result()
-                    self._process_response(response)
+                    executor.submit(self.metrics.tracked(self._load_data), page)
+        else:
+            self._fetch_and_process_pages(pagerange, self._make_request, self._process_response)
 
         logger.info('Retrieved %d course runs from %s.', count, self.partner.courses_api_url)
 
-        self.delete_orphans()
-
     def _load_data(self, page):  # pragma: no cover
         """Make a request for the given page and process the response."""
         response = self._make_request(page)
         self._process_response(response)
 
     def _make_request(self, page):
-        return self.api_client.courses().get(page=page, page_size=self.PAGE_SIZE, username=self.username)
+        return self.api_client.courses().get(
+            page=page, page_size=self.PAGE_SIZE, username=self.username, **self.get_modified_since_kwargs()
+        )
 
     def _process_response(self, response):
         results = response['results']
         logger.info('Retrieved %d course runs...', len(results))
 
-        for body in results:
+        # Resolve the course runs, videos and fingerprints referenced by this page in bulk, rather than once per row.
+        # Course runs and their fingerprints are matched by the same normalized key.
+        keys = [self.get_course_run_key(body) for body in results]
+        course_runs = self.get_course_runs(results)
+        videos = self.get_or_create_videos(results)
+        previous_fingerprints = self.get_fingerprints(keys)
+        fingerprints = {}
+
+        for key, body in zip(keys, results):
             course_run_id = body['id']
 
             try:
                 body = self.clean_strings(body)
-                course_run = self.get_course_run(body)
+                fingerprint = self.compute_fingerprint(body)
+
+                course_run = course_runs.get(key)
+
+                # Skip course runs whose data has not changed since they were last processed. Course runs which
+                # have since been deleted are recreated.
+                if course_run and previous_fingerprints.get(key) == fingerprint:
+                    logger.debug('Course run [%s] has not changed. Skipping.', body['id'])
+                    self.metrics.record_rows('unchanged')
+                    continue
+
+                course_run = course_run or self.get_course_run(body)
 
                 if course_run:
-                    self.update_course_run(course_run, body)
+                    self.update_course_run(course_run, body, videos=videos)
                     course = getattr(course_run, 'canonical_for_course', False)
                     if course:
                         course = self.update_course(course, body)
                         logger.info('Processed course with key [%s].', course.key)
                 else:
                     course, created = self.get_or_create_course(body)
-                    course_run = self.create_course_run(course, body)
+                    course_run = self.create_course_run(course, body, videos=videos)
                     if created:
                         course.canonical_course_run = course_run
                         course.save()
+
+                self.metrics.record_rows('updated' if key in course_runs else 'created')
+                fingerprints[key] = fingerprint
             except:  # pylint: disable=bare-except
                 msg = 'An error occurred while updating {course_run} from {api_url}'.format(
                     course_run=course_run_id,
                     api_url=self.partner.courses_api_url
                 )
                 logger.exception(msg)
+                self.metrics.record_rows('failed')
+
+        self.save_fingerprints(fingerprints)
+
+    @classmethod
+    def get_course_run_key(cls, body):
+        """ Returns the normalized key of a course run body. Course run keys are matched case-insensitively. """
+        return cls.clean_string(body['id']).lower()
+
+    def get_course_runs(self, results):
+        """ Retrieves the existing course runs for a page of results with a single query.
+
+        Arguments:
+            results (list): Course run bodies from the Courses API.
+
+        Returns:
+            dict: CourseRuns keyed by their normalized keys (see get_course_run_key).
+        """
+        keys = [self.clean_string(body['id']) for body in results]
+        course_runs = CourseRun.objects.filter(key__in=keys).select_related('course__partner', 'canonical_for_course')
+
+        return {course_run.key.lower(): course_run for course_run in course_runs}
 
     def get_course_run(self, body):
         course_run_key = body['id']
@@ -139,14 +189,14 @@ class CoursesApiDataLoader(AbstractDataLoader):
         except CourseRun.DoesNotExist:
             return None
 
-    def update_course_run(self, course_run, body):
-        validated_data = self.format_course_run_data(body)
+    def update_course_run(self, course_run, body, videos=None):
+        validated_data = self.format_course_run_data(body, videos=videos)
         self._update_instance(course_run, validated_data)
 
         logger.info('Processed course run with UUID [%s].', course_run.uuid)
 
-    def create_course_run(self, course, body):
-        defaults = self.format_course_run_data(body, course=course)
+    def create_course_run(self, course, body, videos=None):
+        defaults = self.format_course_run_data(body, course=course, videos=videos)
 
         return CourseRun.objects.create(**defaults)
 
@@ -181,12 +231,7 @@ class CoursesApiDataLoader(AbstractDataLoader):
 
         return course
 
-    def _update_instance(self, instance, validated_data):
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
-
-    def format_course_run_data(self, body, course=None):
+    def format_course_run_data(self, body, course=None, videos=None):
         defaults = {
             'key': body['id'],
             'end': self.parse_date(body['end']),
@@ -202,7 +247,7 @@ class CoursesApiDataLoader(AbstractDataLoader):
                 'card_image_url': body['media'].get('image', {}).get('raw'),
                 'title_override': body['name'],
                 'short_description_override': body['short_description'],
-                'video': self.get_courserun_video(body),
+                'video': self.get_courserun_video(body, videos=videos),
                 'status': CourseRunStatus.Published,
                 'pacing_type': self.get_pacing_type(body),
                 'mobile_available': body.get('mobile_available') or False,
@@ -233,18 +278,54 @@ class CoursesApiDataLoader(AbstractDataLoader):
         else:
             return None
 
-    def get_courserun_video(self, body):
+    def get_courserun_video(self, body, videos=None):
         video = None
-        video_url = body['media'].get('course_video', {}).get('uri')
+        video_url = self._get_courserun_video_url(body)
 
         if video_url:
-            video, __ = Video.objects.get_or_create(src=video_url)
+            video = (videos or {}).get(video_url)
+
+            if not video:
+                video = self.lookups.get_or_create(Video, 'src', video_url)
 
         return video
 
+    def get_or_create_videos(self, results):
+        """ Retrieves, or creates, the videos for a page of results using bulk queries.
+
+        Arguments:
+            results (list): Course run bodies from the Courses API.
+
+        Returns:
+            dict: Videos keyed by their source URLs.
+        """
+        # Videos are only loaded from the Courses API when the partner has no marketing site.
+        if self.partner.has_marketing_site:
+            return {}
+
+        urls = set(filter(None, (self._get_courserun_video_url(body) for body in results)))
+        videos = {video.src: video for video in Video.objects.filter(src__in=urls)}
+        missing_urls = urls - set(videos)
+
+        if missing_urls:
+            try:
+                with transaction.atomic():
+                    Video.objects.bulk_create([Video(src=url) for url in missing_urls])
+            except IntegrityError:
+                # Another thread created some of these videos first. They will be retrieved below.
+                pass
+
+            videos.update({video.src: video for video in Video.objects.filter(src__in=missing_urls)})
+
+        return videos
+
+    def _get_courserun_video_url(self, body):
+        return body['media'].get('course_video', {}).get('uri')
+
 
 class EcommerceApiDataLoader(AbstractDataLoader):
     """ Loads course seats from the E-Commerce API. """
+    DEPENDENCIES = ('CoursesApiDataLoader',)
 
     def ingest(self):
         logger.info('Refreshing course seats from %s...', self.partner.ecommerce_api_url)
@@ -257,34 +338,79 @@ class EcommerceApiDataLoader(AbstractDataLoader):
 
         pagerange = range(initial_page + 1, pages + 1)
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:  # pragma: no cover
-            if self.is_threadsafe:
+        if self.is_threadsafe:  # pragma: no cover
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
                 for page in pagerange:
-                    executor.submit(self._load_data, page)
-            else:
-                for future in [executor.submit(self._make_request, page) for page in pagerange]:
-                    response = future.result()
-                    self._process_response(response)
+                    executor.submit(self.metrics.tracked(self._load_data), page)
+        else:
+            self._fetch_and_process_pages(pagerange, self._make_request, self._process_response)
 
         logger.info('Retrieved %d course seats from %s.', count, self.partner.ecommerce_api_url)
 
-        self.delete_orphans()
-
     def _load_data(self, page):  # pragma: no cover
         """Make a request for the given page and process the response."""
         response = self._make_request(page)
         self._process_response(response)
 
     def _make_request(self, page):
-        return self.api_client.courses().get(page=page, page_size=self.PAGE_SIZE, include_products=True)
+        return self.api_client.courses().get(
+            page=page, page_size=self.PAGE_SIZE, include_products=True, **self.get_modified_since_kwargs()
+        )
 
     def _process_response(self, response):
         results = response['results']
         logger.info('Retrieved %d course seats...', len(results))
 
+        previous_fingerprints = self.get_fingerprints([self.clean_string(body['id']) for body in results])
+        seat_types = self.get_seat_types(results)
+        fingerprints = {}
+
         for body in results:
             body = self.clean_strings(body)
-            self.update_seats(body)
+            fingerprint = self.compute_fingerprint(body)
+
+            # Skip course runs whose seats have not changed since they were last processed. Seats which have since
+            # been deleted (e.g. along with their course run) are recreated.
+            expected_seat_types = {
+                self.get_certificate_type(product) for product in body['products'] if product['structure'] == 'child'
+            }
+            existing_seat_types = seat_types.get(body['id'].lower())
+            seats_exist = existing_seat_types == expected_seat_types
+
+            if seats_exist and previous_fingerprints.get(body['id']) == fingerprint:
+                logger.debug('Seats for course run [%s] have not changed. Skipping.', body['id'])
+                self.metrics.record_rows('unchanged')
+                continue
+
+            # Seats cannot be loaded until the course run exists. Only record the fingerprint once they have been.
+            if self.update_seats(body):
+                self.metrics.record_rows('updated' if existing_seat_types else 'created')
+                fingerprints[body['id']] = fingerprint
+            else:
+                self.metrics.record_rows('failed')
+
+        self.save_fingerprints(fingerprints)
+
+    def get_seat_types(self, results):
+        """ Retrieves the types of the existing seats of the course runs in a page of results with a single query.
+
+        Arguments:
+            results (list): Course run bodies from the E-Commerce API.
+
+        Returns:
+            dict: Sets of seat types keyed by the lower-cased keys of the course runs which exist.
+        """
+        keys = [self.clean_string(body['id']) for body in results]
+        seat_types = {}
+
+        for key, seat_type in CourseRun.objects.filter(key__in=keys).values_list('key', 'seats__type'):
+            types = seat_types.setdefault(key.lower(), set())
+
+            # Course runs without seats are returned with a type of None.
+            if seat_type is not None:
+                types.add(seat_type)
+
+        return seat_types
 
     def update_seats(self, body):
         course_run_key = body['id']
@@ -294,26 +420,30 @@ class EcommerceApiDataLoader(AbstractDataLoader):
             logger.warning('Could not find course run [%s]', course_run_key)
             return None
 
+        is_complete = True
+
         for product_body in body['products']:
             if product_body['structure'] != 'child':
                 continue
             product_body = self.clean_strings(product_body)
-            self.update_seat(course_run, product_body)
+            is_complete &= self.update_seat(course_run, product_body) is not None
 
         # Remove seats which no longer exist for that course run
         certificate_types = [self.get_certificate_type(product) for product in body['products']
                              if product['structure'] == 'child']
         course_run.seats.exclude(type__in=certificate_types).delete()
 
+        # Course runs with seats which could not be loaded are loaded again by the next run.
+        return course_run if is_complete else None
+
     def update_seat(self, course_run, product_body):
         stock_record = product_body['stockrecords'][0]
         currency_code = stock_record['price_currency']
         price = Decimal(stock_record['price_excl_tax'])
         sku = stock_record['partner_sku']
 
-        try:
-            currency = Currency.objects.get(code=currency_code)
-        except Currency.DoesNotExist:
+        currency = self.lookups.get(Currency, 'code', currency_code)
+        if not currency:
             logger.warning("Could not find currency [%s]", currency_code)
             return None
 
@@ -333,8 +463,9 @@ class EcommerceApiDataLoader(AbstractDataLoader):
             'credit_hours': credit_hours,
         }
 
-        course_run.seats.update_or_create(type=seat_type, credit_provider=credit_provider, currency=currency,
-                                          defaults=defaults)
+        seat, __ = course_run.seats.update_or_create(type=seat_type, credit_provider=credit_provider,
+                                                     currency=currency, defaults=defaults)
+        return seat
 
     def get_certificate_type(self, product):
         return next(
@@ -345,6 +476,8 @@ class EcommerceApiDataLoader(AbstractDataLoader):
 
 class ProgramsApiDataLoader(AbstractDataLoader):
     """ Loads programs from the Programs API. """
+    DEPENDENCIES = ('CoursesApiDataLoader', 'OrganizationsApiDataLoader')
+
     image_width = 1440
     image_height = 480
     XSERIES = None
@@ -364,7 +497,9 @@ class ProgramsApiDataLoader(AbstractDataLoader):
         logger.info('Refreshing programs from %s...', api_url)
 
         while page:
-            response = self.api_client.programs.get(page=page, page_size=self.PAGE_SIZE)
+            response = self.api_client.programs.get(
+                page=page, page_size=self.PAGE_SIZE, **self.get_modified_since_kwargs()
+            )
             count = response['count']
             results = response['results']
             logger.info('Retrieved %d programs...', len(results))
@@ -374,16 +509,49 @@ class ProgramsApiDataLoader(AbstractDataLoader):
             else:
                 page = None
 
+            uuids = [self._get_uuid(program) for program in results]
+            previous_fingerprints = self.get_fingerprints(uuids)
+            existing_uuids = self.get_existing_uuids(uuids)
+            fingerprints = {}
+
             for program in results:
                 program = self.clean_strings(program)
-                self.update_program(program)
+                uuid = self._get_uuid(program)
+                fingerprint = self.compute_fingerprint(program)
+
+                # Skip programs whose data has not changed since they were last processed. Programs which have
+                # since been deleted are recreated.
+                if uuid in existing_uuids and previous_fingerprints.get(uuid) == fingerprint:
+                    logger.debug('Program [%s] has not changed. Skipping.', uuid)
+                    self.metrics.record_rows('unchanged')
+                    continue
+
+                if self.update_program(program):
+                    self.metrics.record_rows('updated' if uuid in existing_uuids else 'created')
+                    fingerprints[uuid] = fingerprint
+                else:
+                    self.metrics.record_rows('failed')
+
+            self.save_fingerprints(fingerprints)
 
         logger.info('Retrieved %d programs from %s.', count, api_url)
 
     def _get_uuid(self, body):
         return body['uuid']
 
+    def get_existing_uuids(self, uuids):
+        """ Returns those of the given UUIDs which belong to existing programs. """
+        programs = Program.objects.filter(partner=self.partner, uuid__in=uuids)
+        existing_uuids = {str(uuid) for uuid in programs.values_list('uuid', flat=True)}
+        return {uuid for uuid in uuids if str(UUID(uuid)) in existing_uuids}
+
     def update_program(self, body):
+        """ Creates, or updates, the program described by the body.
+
+        Returns:
+            bool: True if the program was loaded, all of its organizations and course runs were found, and its
+                banner image was downloaded.
+        """
         uuid = self._get_uuid(body)
 
         try:
@@ -401,12 +569,14 @@ class ProgramsApiDataLoader(AbstractDataLoader):
                 partner=self.partner,
                 defaults=defaults
             )
-            self._update_program_organizations(body, program)
-            self._update_program_courses_and_runs(body, program)
-            self._update_program_banner_image(body, program)
+            is_complete = self._update_program_organizations(body, program)
+            is_complete &= self._update_program_courses_and_runs(body, program)
+            is_complete &= self._update_program_banner_image(body, program)
             program.save()
+            return is_complete
         except Exception:  # pylint: disable=broad-except
             logger.exception('Failed to load program %s', uuid)
+            return False
 
     def _update_program_courses_and_runs(self, body, program):
         course_run_keys = set()
@@ -425,17 +595,23 @@ class ProgramsApiDataLoader(AbstractDataLoader):
         program.excluded_course_runs.clear()
         program.excluded_course_runs.add(*excluded_course_runs)
 
+        # Course runs that do not yet exist will be associated by a later run, once they have been loaded.
+        return CourseRun.objects.filter(key__in=course_run_keys).count() == len(course_run_keys)
+
     def _update_program_organizations(self, body, program):
         uuid = self._get_uuid(body)
         org_keys = [org['key'] for org in body['organizations']]
         organizations = Organization.objects.filter(key__in=org_keys, partner=self.partner)
 
-        if len(org_keys) != organizations.count():
+        is_valid = len(org_keys) == organizations.count()
+        if not is_valid:
             logger.error('Organizations for program [%s] are invalid!', uuid)
 
         program.authoring_organizations.clear()
         program.authoring_organizations.add(*organizations)
 
+        return is_valid
+
     def _get_banner_image_url(self, body):
         image_key = 'w{width}h{height}'.format(width=self.image_width, height=self.image_height)
         image_url = body.get('banner_image_urls', {}).get(image_key)
@@ -445,15 +621,17 @@ class ProgramsApiDataLoader(AbstractDataLoader):
         image_url = self._get_banner_image_url(body)
         if not image_url:
             logger.warning('There are no banner image url for program %s', program.title)
-            return
+            return True
 
         r = requests.get(image_url)
-        if r.status_code == 200:
-            banner_downloaded = File(BytesIO(r.content))
-            program.banner_image.save(
-                'banner.jpg',
-                banner_downloaded
-            )
-            program.save()
-        else:
+        if r.status_code != 200:
             logger.exception('Loading the banner image %s for program %s failed', image_url, program.title)
+            return False
+
+        banner_downloaded = File(BytesIO(r.content))
+        program.banner_image.save(
+            'banner.jpg',
+            banner_downloaded
+        )
+        program.save()
+        return True
@@ -0,0 +1,58 @@
+import time
+
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+# Responses to requests which are retried, since they are usually caused by transient failures (e.g. rate limiting).
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class RetryingHTTPAdapter(HTTPAdapter):
+    """ Adapter which retries idempotent requests whose responses indicate transient failures.
+
+    urllib3 retries connection errors. It can also retry responses, but raises an error once its retries are
+    exhausted, rather than returning the last response, so the failure would never reach the callers' status checks
+    (and logging). Responses are therefore retried here, and the last one returned.
+    """
+
+    def __init__(self, max_retries=3, backoff_factor=0.5, **kwargs):
+        self.status_retries = max_retries
+        self.backoff_factor = backoff_factor
+        super(RetryingHTTPAdapter, self).__init__(
+            max_retries=Retry(total=max_retries, backoff_factor=backoff_factor), **kwargs
+        )
+
+    def send(self, request, **kwargs):  # pylint: disable=arguments-differ
+        retry = 0
+
+        while True:
+            response = super(RetryingHTTPAdapter, self).send(request, **kwargs)
+
+            if (response.status_code not in RETRY_STATUS_CODES or retry >= self.status_retries or
+                    request.method not in Retry.DEFAULT_METHOD_WHITELIST):
+                return response
+
+            # As with urllib3, the first retry is immediate, and the delay doubles with each subsequent retry.
+            response.close()
+            time.sleep(self.backoff_factor * (2 ** (retry - 1)) if retry else 0)
+            retry += 1
+
+
+def mount_connection_pool(session, max_connections, max_retries=3, backoff_factor=0.5):
+    """ Mounts adapters on the session which keep up to `max_connections` connections alive per host, and retry
+    requests which fail with transient errors.
+
+    requests only keeps 10 connections per host alive by default. Connections opened by additional workers are
+    discarded after each request, forcing a new TCP (and TLS) handshake for every page.
+
+    Arguments:
+        session (requests.Session): Session used to make requests.
+        max_connections (int): Maximum number of concurrent connections to a single host.
+        max_retries (int): Number of times a failed request is retried before giving up.
+        backoff_factor (float): Seconds to wait before the second retry. The delay doubles with each retry.
+    """
+    adapter = RetryingHTTPAdapter(
+        max_retries=max_retries, backoff_factor=backoff_factor, pool_connections=1, pool_maxsize=max_connections
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
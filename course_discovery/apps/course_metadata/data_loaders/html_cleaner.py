@@ -0,0 +1,136 @@
+import hashlib
+import multiprocessing
+import re
+import threading
+from collections import OrderedDict
+
+import django
+import html2text
+import markdown
+
+MARKDOWN_CLEANUP_REGEX = re.compile(r'^<p>(.*)</p>$')
+
+
+def clean_html(content):
+    """Cleans HTML from a string.
+
+    This method converts the HTML to a Markdown string (to remove styles, classes, and other unsupported
+    attributes), and converts the Markdown back to HTML.
+    """
+    cleaned = content.replace('&nbsp;', '')
+    html_converter = html2text.HTML2Text()
+    html_converter.wrap_links = False
+    html_converter.body_width = None
+    cleaned = html_converter.handle(cleaned).strip()
+    cleaned = markdown.markdown(cleaned)
+    cleaned = MARKDOWN_CLEANUP_REGEX.sub(r'\1', cleaned)
+
+    # html2text does not handle ampersands properly.
+    # See https://github.com/Alir3z4/html2text/issues/109.
+    cleaned = cleaned.replace('&amp;', '&')
+
+    return cleaned
+
+
+class HtmlCleaner(object):
+    """ Cleans HTML, memoizing the results, and cleaning batches of content in a pool of worker processes.
+
+    Cleaning HTML is CPU-bound. Cleaning a batch in worker processes keeps the thread writing to the database
+    from being blocked by the GIL. Batches smaller than MIN_BATCH_SIZE are cleaned in the calling process, since
+    they are not worth the overhead of sending the content to the workers.
+
+    The pool is only started by the first batch which reaches MIN_BATCH_SIZE, so cleaners which only see small
+    batches do not start any processes. Its workers are started by a fork server, rather than forked from the
+    calling process. The caller may be running other threads (e.g. those fetching pages), and a process forked while
+    other threads are running inherits any locks they hold (e.g. those of the logging module), so may deadlock
+    waiting for them. Processes which are not allowed to have children (e.g. daemonic pool workers) clean batches
+    themselves.
+    """
+    MAX_CACHE_SIZE = 10000
+    MIN_BATCH_SIZE = 20
+
+    def __init__(self, max_workers=None):
+        """
+        Arguments:
+            max_workers (int): Maximum number of worker processes. Defaults to the number of CPUs. If 0, all
+                content is cleaned in the calling process.
+        """
+        self.max_workers = max_workers
+        self.pool = None
+        self.lock = threading.RLock()
+        # Maps a hash of the content to the cleaned content, least recently used first.
+        self.cache = OrderedDict()
+
+    @classmethod
+    def _get_key(cls, content):
+        return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+    def _get(self, key):
+        with self.lock:
+            cleaned = self.cache.get(key)
+
+            if cleaned is not None:
+                self.cache.move_to_end(key)
+
+            return cleaned
+
+    def _set(self, key, cleaned):
+        with self.lock:
+            self.cache[key] = cleaned
+
+            if len(self.cache) > self.MAX_CACHE_SIZE:
+                self.cache.popitem(last=False)
+
+    def clean(self, content):
+        """ Returns the cleaned content, cleaning it in the calling process if it has not already been cleaned. """
+        key = self._get_key(content)
+        cleaned = self._get(key)
+
+        if cleaned is None:
+            cleaned = clean_html(content)
+            self._set(key, cleaned)
+
+        return cleaned
+
+    def clean_batch(self, contents):
+        """ Cleans content which has not already been cleaned, so that subsequent calls to `clean` are cache hits.
+
+        Arguments:
+            contents (iterable): Strings of HTML. Values which are not strings are ignored.
+        """
+        pending = OrderedDict()
+        for content in contents:
+            if isinstance(content, str):
+                key = self._get_key(content)
+                if key not in pending and self._get(key) is None:
+                    pending[key] = content
+
+        pool = self._get_pool() if len(pending) >= self.MIN_BATCH_SIZE else None
+
+        if pool is None:
+            for key, content in pending.items():
+                self._set(key, clean_html(content))
+            return
+
+        chunksize = max(len(pending) // (4 * (self.max_workers or multiprocessing.cpu_count())), 1)
+        for key, cleaned in zip(pending, pool.map(clean_html, pending.values(), chunksize)):
+            self._set(key, cleaned)
+
+    def _get_pool(self):
+        """ Returns the pool of worker processes, starting it if necessary, or None if it cannot be started. """
+        with self.lock:
+            # Daemonic processes, such as some multiprocessing pool workers, are not allowed to have children.
+            if self.pool is None and self.max_workers != 0 and not multiprocessing.process.current_process().daemon:
+                context = multiprocessing.get_context('forkserver')
+                # The workers import this module, and therefore the models, to unpickle the tasks sent to them.
+                self.pool = context.Pool(self.max_workers, initializer=django.setup)
+
+            return self.pool
+
+    def close(self):
+        """ Shuts down the worker processes, if any were started. """
+        with self.lock:
+            if self.pool is not None:
+                self.pool.close()
+                self.pool.join()
+                self.pool = None
@@ -0,0 +1,129 @@
+import threading
+from uuid import UUID
+
+
+class LookupCache(object):
+    """ Identity map of the reference data (e.g. currencies, subjects, videos) looked up by data loaders.
+
+    Only the values which are looked up are loaded, rather than whole tables. Loaders should `load` the values
+    referenced by a page of data before processing it, so that they are retrieved with a single query. Subsequent
+    lookups of those values, including those which did not match a row, are dictionary hits.
+
+    The cache does not track changes made to the database. Loaders which create, modify or delete the rows of a
+    model looked up through the cache must `invalidate` it. `get_or_create` checks the database before creating a
+    row which is missing from the cache, so rows created by other loaders are not duplicated.
+
+    A single cache may be shared by all data loaders in a refresh, so long as they run in the same process.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        # Maps (model, field) to a dict mapping values of the field to model instances, or None if no instance has
+        # the value.
+        self.indexes = {}
+
+    @classmethod
+    def _normalize(cls, value):
+        if isinstance(value, UUID):
+            return str(value)
+
+        return value
+
+    def _get_index(self, model, field):
+        return self.indexes.setdefault((model, field), {})
+
+    def load(self, model, field, values):
+        """ Loads the instances of the model whose field has one of the given values, with a single query.
+
+        Values which have already been loaded are not queried again. Empty values are ignored.
+
+        Arguments:
+            model (Model): Model class.
+            field (str): Name of a field whose values are unique.
+            values (iterable): Values of the field.
+        """
+        with self.lock:
+            index = self._get_index(model, field)
+            values = {self._normalize(value) for value in values if value}
+            values = values.difference(index)
+
+            if not values:
+                return
+
+            for instance in model.objects.filter(**{field + '__in': values}):
+                index[self._normalize(getattr(instance, field))] = instance
+
+            for value in values:
+                index.setdefault(value, None)
+
+    def invalidate(self, model):
+        """ Removes the instances of the model, and the values known not to match any, from the cache. """
+        with self.lock:
+            for key in [key for key in self.indexes if key[0] == model]:
+                del self.indexes[key]
+
+    def get(self, model, field, value):
+        """ Returns the instance of the model whose field has the given value, or None if none exists.
+
+        Arguments:
+            model (Model): Model class.
+            field (str): Name of a field whose values are unique.
+            value: Value of the field.
+
+        Returns:
+            Model
+        """
+        with self.lock:
+            self.load(model, field, [value])
+            return self._get_index(model, field).get(self._normalize(value))
+
+    def filter(self, model, field, values):
+        """ Returns the instances of the model whose field has one of the given values.
+
+        Values which do not match an instance are ignored. Instances are returned in primary key order, matching
+        the default order of a QuerySet filtered with `__in`.
+
+        Returns:
+            list[Model]
+        """
+        values = [self._normalize(value) for value in values if value]
+
+        with self.lock:
+            self.load(model, field, values)
+            index = self._get_index(model, field)
+            instances = {index[value] for value in values if index.get(value) is not None}
+
+        return sorted(instances, key=lambda instance: instance.pk)
+
+    @classmethod
+    def _normalize_uuids(cls, uuids):
+        normalized = []
+
+        for uuid in uuids:
+            try:
+                normalized.append(str(UUID(str(uuid))))
+            except ValueError:
+                continue
+
+        return normalized
+
+    def load_uuids(self, model, uuids):
+        """ Loads the instances of the model with the given UUIDs. Invalid and empty UUIDs are ignored. """
+        self.load(model, 'uuid', self._normalize_uuids(uuids))
+
+    def get_uuids(self, model, uuids):
+        """ Returns the instances of the model with the given UUIDs. Invalid and empty UUIDs are ignored. """
+        return self.filter(model, 'uuid', self._normalize_uuids(uuids))
+
+    def get_or_create(self, model, field, value):
+        """ Returns the instance of the model whose field has the given value, creating it if it does not exist. """
+        instance = self.get(model, field, value)
+
+        if instance is None:
+            # The row may have been created since the value was loaded (e.g. by another loader).
+            instance, __ = model.objects.get_or_create(**{field: value})
+
+            with self.lock:
+                self._get_index(model, field)[self._normalize(value)] = instance
+
+        return instance
@@ -15,7 +15,7 @@ from opaque_keys.edx.keys import CourseKey
 from course_discovery.apps.course_metadata.choices import CourseRunPacing, CourseRunStatus
 from course_discovery.apps.course_metadata.data_loaders import AbstractDataLoader
 from course_discovery.apps.course_metadata.models import (
-    Course, CourseRun, LevelType, Organization, Person, Position, Program, Subject
+    Course, CourseRun, Image, LevelType, Organization, Person, Position, Program, Subject, Video
 )
 from course_discovery.apps.course_metadata.utils import MarketingSiteAPIClient
 from course_discovery.apps.ietf_language_tags.models import LanguageTag
@@ -24,6 +24,13 @@ logger = logging.getLogger(__name__)
 
 
 class AbstractMarketingSiteDataLoader(AbstractDataLoader):
+    # Paths to the fields of a node which contain HTML to be cleaned. The HTML for a page of nodes is cleaned in
+    # a single batch before the nodes are processed.
+    HTML_FIELDS = ()
+
+    # Nodes are sorted by their last-changed time (see get_modified_since_kwargs).
+    SUPPORTS_MODIFIED_SINCE = True
+
     def __init__(self, partner, api_url, access_token=None, token_type=None, max_workers=None,
                  is_threadsafe=False, **kwargs):
         super(AbstractMarketingSiteDataLoader, self).__init__(
@@ -46,15 +53,42 @@ class AbstractMarketingSiteDataLoader(AbstractDataLoader):
 
         return marketing_site_api_client.api_session
 
+    @property
+    def http_session(self):
+        return self.api_client
+
     def get_query_kwargs(self):
-        return {
+        kwargs = {
             'type': self.node_type,
             'max-depth': 2,
             'load-entity-refs': 'file',
         }
+        kwargs.update(self.get_modified_since_kwargs())
+        return kwargs
+
+    def get_modified_since_kwargs(self):
+        # NOTE: Drupal's RESTWS endpoints cannot filter on a range of values. Instead, we sort the nodes
+        # by their last-changed time, newest first, and stop paging once we reach unmodified nodes.
+        if self.modified_since:
+            return {
+                'sort': 'changed',
+                'direction': 'DESC',
+            }
+
+        return {}
 
     def ingest(self):
         """ Load data for all supported objects (e.g. courses, runs). """
+        try:
+            self._ingest()
+        finally:
+            self.html_cleaner.close()
+
+    def _ingest(self):
+        if self.modified_since:
+            self._ingest_modified_nodes()
+            return
+
         initial_page = 0
         response = self._request(initial_page)
         self._process_response(response)
@@ -66,14 +100,35 @@ class AbstractMarketingSiteDataLoader(AbstractDataLoader):
             pages = [self._extract_page(url) + 1 for url in (data['first'], data['last'])]
             pagerange = range(*pages)
 
-            with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-                if self.is_threadsafe:  # pragma: no cover
+            if self.is_threadsafe:  # pragma: no cover
+                with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
                     for page in pagerange:
-                        executor.submit(self._load_data, page)
-                else:
-                    for future in [executor.submit(self._request, page) for page in pagerange]:
-                        response = future.result()
-                        self._process_response(response)
+                        executor.submit(self.metrics.tracked(self._load_data), page)
+            else:
+                self._fetch_and_process_pages(pagerange, self._request, self._process_response)
+
+    def _ingest_modified_nodes(self):
+        """ Load the nodes changed since the last successful run, walking pages until an unmodified node is found. """
+        page = 0
+
+        while page is not None:
+            response = self._request(page)
+            self._process_response(response)
+
+            data = response.json()
+            if 'next' in data and all(self._is_modified(node) for node in data['list']):
+                page += 1
+            else:
+                page = None
+
+    def _is_modified(self, node):
+        """ Returns True if the node changed after the high-water mark, or if this cannot be determined. """
+        changed = node.get('changed')
+
+        if not (self.modified_since and changed):
+            return True
+
+        return datetime.datetime.fromtimestamp(int(changed), tz=pytz.UTC) >= self.modified_since
 
     def _load_data(self, page):  # pragma: no cover
         """Make a request for the given page and process the response."""
@@ -110,13 +165,96 @@ class AbstractMarketingSiteDataLoader(AbstractDataLoader):
         self._check_status_code(response)
 
         data = response.json()
+        previous_fingerprints = self.get_fingerprints([node['uuid'] for node in data['list'] if node.get('uuid')])
+        fingerprints = {}
+        nodes = []
+
         for node in data['list']:
+            if not self._is_modified(node):
+                continue
+
             try:
                 url = node['url']
                 node = self.clean_strings(node)
-                self.process_node(node)
+                uuid = node.get('uuid')
+                nodes.append((url, node, uuid, self.compute_fingerprint(node)))
             except:  # pylint: disable=bare-except
                 logger.exception('Failed to load %s.', url)
+                self.metrics.record_rows('failed')
+
+        # Skip nodes whose data has not changed since they were last processed. Nodes whose objects have since been
+        # deleted are processed again, so that the objects are recreated.
+        identified = [node for __, node, uuid, __ in nodes if uuid]
+        existing_uuids = self.get_existing_uuids(identified) if identified else set()
+        pending = []
+
+        for url, node, uuid, fingerprint in nodes:
+            if uuid in existing_uuids and previous_fingerprints.get(uuid) == fingerprint:
+                logger.debug('Node [%s] has not changed. Skipping.', url)
+                self.metrics.record_rows('unchanged')
+            else:
+                pending.append((url, node, uuid, fingerprint))
+
+        # Clean the HTML for the whole page at once, so that it can be done in parallel.
+        with self.metrics.time('clean_html'):
+            self.html_cleaner.clean_batch(value for __, node, __, __ in pending for value in self.get_html(node))
+
+        self.load_references([node for __, node, __, __ in pending])
+
+        for url, node, uuid, fingerprint in pending:
+            try:
+                # Nodes which could not be loaded (e.g. because a related object does not yet exist) return None.
+                # Their fingerprints are not recorded so that they are retried by the next run.
+                if self.process_node(node):
+                    self.metrics.record_rows('updated' if uuid in existing_uuids else 'created')
+
+                    if uuid:
+                        fingerprints[uuid] = fingerprint
+                else:
+                    self.metrics.record_rows('failed')
+            except:  # pylint: disable=bare-except
+                logger.exception('Failed to load %s.', url)
+                self.metrics.record_rows('failed')
+
+        # Other loaders may look up the objects created, or modified, by this one.
+        self.lookups.invalidate(self.model)
+        self.save_fingerprints(fingerprints)
+
+    def get_existing_uuids(self, nodes):
+        """ Returns the UUIDs of those of the given nodes whose objects exist.
+
+        Arguments:
+            nodes (list): Nodes retrieved from the marketing site.
+
+        Returns:
+            set
+        """
+        uuids = {node['uuid'] for node in nodes}
+        objects = self.model.objects.filter(uuid__in=uuids)
+        existing_uuids = {str(uuid) for uuid in objects.values_list('uuid', flat=True)}
+        return {uuid for uuid in uuids if str(UUID(uuid)) in existing_uuids}
+
+    def get_html(self, data):
+        """ Returns the values of the fields of the node, listed in HTML_FIELDS, which contain HTML to be cleaned. """
+        values = []
+
+        for path in self.HTML_FIELDS:
+            value = data
+            for field in path:
+                value = value.get(field) if isinstance(value, dict) else None
+
+            if value:
+                values.append(value)
+
+        return values
+
+    def load_references(self, nodes):
+        """ Loads the objects referenced by a page of nodes into the lookup cache, before the nodes are processed.
+
+        Arguments:
+            nodes (list): Nodes retrieved from the marketing site.
+        """
+        pass
 
     def _get_nested_url(self, field):
         """ Helper method that retrieves the nested `url` field in the specified field, if it exists.
@@ -132,12 +270,30 @@ class AbstractMarketingSiteDataLoader(AbstractDataLoader):
     def node_type(self):  # pragma: no cover
         pass
 
+    @abc.abstractproperty
+    def model(self):  # pragma: no cover
+        """ Model of the objects loaded from the nodes, whose UUIDs are those of the nodes. """
+        pass
+
 
 class XSeriesMarketingSiteDataLoader(AbstractMarketingSiteDataLoader):
+    DEPENDENCIES = ('ProgramsApiDataLoader',)
+    HTML_FIELDS = (('body', 'value'),)
+
     @property
     def node_type(self):
         return 'xseries'
 
+    @property
+    def model(self):
+        return Program
+
+    def get_existing_uuids(self, nodes):
+        # Programs are created by the Programs API, with their own UUIDs, so they are identified by their slugs.
+        slugs = {node['url'].split('/')[-1]: node['uuid'] for node in nodes}
+        programs = Program.objects.filter(marketing_slug__in=slugs, partner=self.partner)
+        return {slugs[slug] for slug in programs.values_list('marketing_slug', flat=True)}
+
     def process_node(self, data):
         marketing_slug = data['url'].split('/')[-1]
 
@@ -152,7 +308,7 @@ class XSeriesMarketingSiteDataLoader(AbstractMarketingSiteDataLoader):
 
         # NOTE (CCB): Remove the heading at the beginning of the overview. Why this isn't part of the template
         # is beyond me. It's just silly.
-        overview = self.clean_html(data['body']['value'])
+        overview = self.html_cleaner.clean(data['body']['value'])
         overview = overview.lstrip('### XSeries Program Overview').strip()
 
         data = {
@@ -172,17 +328,23 @@ class XSeriesMarketingSiteDataLoader(AbstractMarketingSiteDataLoader):
 
 
 class SubjectMarketingSiteDataLoader(AbstractMarketingSiteDataLoader):
+    HTML_FIELDS = (('body', 'value'), ('field_subject_subtitle', 'value'),)
+
     @property
     def node_type(self):
         return 'subject'
 
+    @property
+    def model(self):
+        return Subject
+
     def process_node(self, data):
         slug = data['field_subject_url_slug']
         defaults = {
             'uuid': data['uuid'],
             'name': data['title'],
-            'description': self.clean_html(data['body']['value']),
-            'subtitle': self.clean_html(data['field_subject_subtitle']['value']),
+            'description': self.html_cleaner.clean(data['body']['value']),
+            'subtitle': self.html_cleaner.clean(data['field_subject_subtitle']['value']),
             'card_image_url': self._get_nested_url(data.get('field_subject_card_image')),
             # NOTE (CCB): This is not a typo. Yes, the banner image for subjects is in a field with xseries in the name.
             'banner_image_url': self._get_nested_url(data.get('field_xseries_banner_image'))
@@ -194,16 +356,22 @@ class SubjectMarketingSiteDataLoader(AbstractMarketingSiteDataLoader):
 
 
 class SchoolMarketingSiteDataLoader(AbstractMarketingSiteDataLoader):
+    HTML_FIELDS = (('field_school_description', 'value'),)
+
     @property
     def node_type(self):
         return 'school'
 
+    @property
+    def model(self):
+        return Organization
+
     def process_node(self, data):
         key = data['title']
         defaults = {
             'uuid': data['uuid'],
             'name': data['field_school_name'],
-            'description': self.clean_html(data['field_school_description']['value']),
+            'description': self.html_cleaner.clean(data['field_school_description']['value']),
             'logo_image_url': self._get_nested_url(data.get('field_school_image_logo')),
             'banner_image_url': self._get_nested_url(data.get('field_school_image_banner')),
             'marketing_url_path': 'school/' + data['field_school_url_slug'],
@@ -232,16 +400,22 @@ class SchoolMarketingSiteDataLoader(AbstractMarketingSiteDataLoader):
 
 
 class SponsorMarketingSiteDataLoader(AbstractMarketingSiteDataLoader):
+    HTML_FIELDS = (('body', 'value'),)
+
     @property
     def node_type(self):
         return 'sponsorer'
 
+    @property
+    def model(self):
+        return Organization
+
     def process_node(self, data):
         uuid = data['uuid']
         body = (data['body'] or {}).get('value')
 
         if body:
-            body = self.clean_html(body)
+            body = self.html_cleaner.clean(body)
 
         defaults = {
             'key': data['url'].split('/')[-1],
@@ -256,10 +430,17 @@ class SponsorMarketingSiteDataLoader(AbstractMarketingSiteDataLoader):
 
 
 class PersonMarketingSiteDataLoader(AbstractMarketingSiteDataLoader):
+    DEPENDENCIES = ('SchoolMarketingSiteDataLoader',)
+    HTML_FIELDS = (('field_person_resume', 'value'),)
+
     @property
     def node_type(self):
         return 'person'
 
+    @property
+    def model(self):
+        return Person
+
     def get_query_kwargs(self):
         kwargs = super(PersonMarketingSiteDataLoader, self).get_query_kwargs()
         # NOTE (CCB): We need to include the nested field_collection_item data since that is where
@@ -273,7 +454,7 @@ class PersonMarketingSiteDataLoader(AbstractMarketingSiteDataLoader):
         defaults = {
             'given_name': data['field_person_first_middle_name'],
             'family_name': data['field_person_last_name'],
-            'bio': self.clean_html(data['field_person_resume']['value']),
+            'bio': self.html_cleaner.clean(data['field_person_resume']['value']),
             'profile_image_url': self._get_nested_url(data.get('field_person_image')),
             'slug': slug,
             'profile_url': data['url'],
@@ -286,7 +467,8 @@ class PersonMarketingSiteDataLoader(AbstractMarketingSiteDataLoader):
             person.slug = slug
             person.save()
 
-        self.set_position(person, data)
+        if not self.set_position(person, data):
+            return None
 
         logger.info('Processed person with UUID [%s].', uuid)
         return person
@@ -328,9 +510,20 @@ class PersonMarketingSiteDataLoader(AbstractMarketingSiteDataLoader):
                     Position.objects.update_or_create(person=person, defaults=defaults)
         except:  # pylint: disable=bare-except
             logger.exception('Failed to set position for person with UUID [%s]!', uuid)
+            return False
+
+        return True
 
 
 class CourseMarketingSiteDataLoader(AbstractMarketingSiteDataLoader):
+    DEPENDENCIES = ('SubjectMarketingSiteDataLoader', 'SchoolMarketingSiteDataLoader', 'PersonMarketingSiteDataLoader')
+    HTML_FIELDS = (
+        ('field_course_course_title', 'value'),
+        ('field_course_body', 'value'),
+        ('field_course_description', 'value'),
+        ('field_course_sub_title_short',),
+    )
+
     LANGUAGE_MAP = {
         'English': 'en-us',
         '日本語': 'ja',
@@ -356,6 +549,10 @@ class CourseMarketingSiteDataLoader(AbstractMarketingSiteDataLoader):
     def node_type(self):
         return 'course'
 
+    @property
+    def model(self):
+        return CourseRun
+
     @classmethod
     def get_language_tags_from_names(cls, names):
         language_codes = [cls.LANGUAGE_MAP.get(name) for name in names]
@@ -392,6 +589,59 @@ class CourseMarketingSiteDataLoader(AbstractMarketingSiteDataLoader):
                 course.canonical_course_run = course_run
                 course.save()
 
+        # The node is loaded again by the next run if any of the objects it references have not been loaded yet.
+        if course_run and self.has_missing_references(data):
+            return None
+
+        return course_run
+
+    def load_references(self, nodes):
+        # Malformed nodes are reported when they are processed, rather than failing the whole page here.
+        def get_objects(field):
+            return [_object for node in nodes for _object in (node.get(field) or []) if isinstance(_object, dict)]
+
+        references = (
+            (Organization, 'field_course_school_node'),
+            (Subject, 'field_course_subject'),
+            (Person, 'field_course_staff'),
+        )
+
+        for model, field in references:
+            self.lookups.load_uuids(model, [_object.get('uuid') for _object in get_objects(field)])
+
+        language_names = [
+            _object.get('name', '').strip()
+            for _object in get_objects('field_course_languages') + get_objects('field_course_video_locale_lang')
+        ]
+        self.lookups.load(LanguageTag, 'code', [self.LANGUAGE_MAP.get(name) for name in language_names])
+        self.lookups.load(LevelType, 'name', [node.get('field_course_level') for node in nodes])
+
+        self.lookups.load(Video, 'src', [
+            self._get_nested_url(node.get('field_course_video') or node.get('field_product_video')) for node in nodes
+        ])
+        self.lookups.load(Image, 'src', [
+            self._get_nested_url(node.get('field_course_image_featured_card')) for node in nodes
+        ])
+
+    def has_missing_references(self, data):
+        """ Returns True if any of the schools, subjects or staff referenced by the node do not exist. """
+        references = (
+            (Organization, 'field_course_school_node'),
+            (Subject, 'field_course_subject'),
+            (Person, 'field_course_staff'),
+        )
+
+        for model, field in references:
+            uuids = {_object.get('uuid') for _object in data[field] if _object.get('uuid')}
+
+            if len(self._get_objects_by_uuid(model, data[field])) < len(uuids):
+                logger.warning(
+                    'Course run [%s] references %s objects which do not exist.', data['field_course_id'], model.__name__
+                )
+                return True
+
+        return False
+
     def get_course_run(self, data):
         course_run_key = data['field_course_id']
         try:
@@ -440,11 +690,6 @@ class CourseMarketingSiteDataLoader(AbstractMarketingSiteDataLoader):
 
         return course
 
-    def _update_instance(self, instance, validated_data):
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
-
     def format_course_run_data(self, data, course):
         uuid = data['uuid']
         key = data['field_course_id']
@@ -460,7 +705,7 @@ class CourseMarketingSiteDataLoader(AbstractMarketingSiteDataLoader):
         defaults = {
             'key': key,
             'uuid': uuid,
-            'title_override': self.clean_html(data['field_course_course_title']['value']),
+            'title_override': self.html_cleaner.clean(data['field_course_course_title']['value']),
             'language': language,
             'slug': slug,
             'card_image_url': self._get_nested_url(data.get('field_course_image_promoted')),
@@ -489,11 +734,11 @@ class CourseMarketingSiteDataLoader(AbstractMarketingSiteDataLoader):
 
         defaults = {
             'key': key,
-            'title': self.clean_html(data['field_course_course_title']['value']),
+            'title': self.html_cleaner.clean(data['field_course_course_title']['value']),
             'number': data['field_course_code'],
             'full_description': self.get_description(data),
             'video': self.get_video(data),
-            'short_description': self.clean_html(data['field_course_sub_title_short']),
+            'short_description': self.html_cleaner.clean(data['field_course_sub_title_short']),
             'level_type': self.get_level_type(data['field_course_level']),
             'card_image_url': self._get_nested_url(data.get('field_course_image_promoted')),
         }
@@ -504,7 +749,7 @@ class CourseMarketingSiteDataLoader(AbstractMarketingSiteDataLoader):
         description = (data.get('field_course_body', {}) or {}).get('value')
         description = description or (data.get('field_course_description', {}) or {}).get('value')
         description = description or ''
-        description = self.clean_html(description)
+        description = self.html_cleaner.clean(description)
         return description
 
     def get_course_run_status(self, data):
@@ -514,7 +759,7 @@ class CourseMarketingSiteDataLoader(AbstractMarketingSiteDataLoader):
         level_type = None
 
         if name:
-            level_type, __ = LevelType.objects.get_or_create(name=name)
+            level_type = self.lookups.get_or_create(LevelType, 'name', name)
 
         return level_type
 
@@ -534,11 +779,12 @@ class CourseMarketingSiteDataLoader(AbstractMarketingSiteDataLoader):
 
     def _get_objects_by_uuid(self, object_type, raw_objects_data):
         uuids = [_object.get('uuid') for _object in raw_objects_data]
-        return object_type.objects.filter(uuid__in=uuids)
+        return self.lookups.get_uuids(object_type, uuids)
 
     def _extract_language_tags(self, raw_objects_data):
         language_names = [_object['name'].strip() for _object in raw_objects_data]
-        return self.get_language_tags_from_names(language_names)
+        language_codes = [self.LANGUAGE_MAP.get(name) for name in language_names]
+        return self.lookups.filter(LanguageTag, 'code', language_codes)
 
     def set_authoring_organizations(self, course, data):
         schools = self._get_objects_by_uuid(Organization, data['field_course_school_node'])
@@ -0,0 +1,199 @@
+import math
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.utils import CursorWrapper
+
+
+def percentile(values, pct):
+    """ Returns the nearest-rank percentile of the given values, or None if there are no values.
+
+    Arguments:
+        values (list): Values from which the percentile is computed.
+        pct (int): Percentile (0-100).
+
+    Returns:
+        float
+    """
+    if not values:
+        return None
+
+    values = sorted(values)
+    rank = max(int(math.ceil(pct / 100.0 * len(values))), 1)
+    return values[rank - 1]
+
+
+class QueryCountingCursorWrapper(CursorWrapper):
+    """ Cursor wrapper which counts the queries it executes. """
+
+    def __init__(self, cursor, db, metrics):
+        super(QueryCountingCursorWrapper, self).__init__(cursor, db)
+        self.metrics = metrics
+
+    def execute(self, sql, params=None):
+        self.metrics.record_query()
+        return super(QueryCountingCursorWrapper, self).execute(sql, params)
+
+    def executemany(self, sql, param_list):
+        self.metrics.record_query()
+        return super(QueryCountingCursorWrapper, self).executemany(sql, param_list)
+
+
+class DataLoaderMetrics(object):
+    """ Collects metrics describing a single run of a data loader.
+
+    Counters may be updated from multiple threads (e.g. when pages are fetched by worker threads). Queries are only
+    counted for the threads in which the loader runs, so work done concurrently by other threads (e.g. another
+    loader, or a request) is not attributed to the loader. Rows are counted by the loaders, once per record loaded,
+    rather than once per instance saved while loading it.
+    """
+    ROW_OUTCOMES = ('created', 'updated', 'unchanged', 'failed',)
+
+    def __init__(self):
+        # pylint infers threading.Lock() as a function call which is not a context manager, but not RLock().
+        self.lock = threading.RLock()
+        self.threads = set()
+        self.latencies = []
+        self.bytes_downloaded = 0
+        self.queries = 0
+        self.rows = Counter({outcome: 0 for outcome in self.ROW_OUTCOMES})
+        self.stages = Counter()
+        self.wall_time = None
+
+    def record_response(self, response, *args, **kwargs):  # pylint: disable=unused-argument
+        """ Records the latency and size of an HTTP response. Compatible with requests' response hooks. """
+        with self.lock:
+            self.latencies.append(response.elapsed.total_seconds())
+            self.bytes_downloaded += len(response.content)
+
+    def record_query(self):
+        with self.lock:
+            self.queries += 1
+
+    def record_rows(self, outcome, count=1):
+        """ Records the outcome of loading one, or more, records.
+
+        Arguments:
+            outcome (str): One of created, updated, unchanged or failed.
+            count (int): Number of records with this outcome.
+        """
+        with self.lock:
+            self.rows[outcome] += count
+
+    def has_failures(self):
+        """ Returns True if any records failed to load. """
+        with self.lock:
+            return self.rows['failed'] > 0
+
+    @contextmanager
+    def track(self):
+        """
+        Counts the queries issued by the calling thread within the block.
+
+        Blocks may be nested, including within blocks tracking other metrics (whose queries are then counted by
+        both). The cursor replaced on entry is restored on exit, rather than removed.
+        """
+        thread = threading.get_ident()
+
+        with self.lock:
+            is_tracked = thread in self.threads
+            self.threads.add(thread)
+
+        if is_tracked:
+            # The queries are already counted by an enclosing block.
+            yield
+            return
+
+        # The connection is local to the calling thread, so only its cursor is replaced. A cursor set on the
+        # connection itself, rather than its class, was set by an enclosing block.
+        connection = connections[DEFAULT_DB_ALIAS]
+        previous_cursor = vars(connection).get('cursor')
+        original_cursor = connection.cursor
+
+        def cursor():
+            return QueryCountingCursorWrapper(original_cursor(), connection, self)
+
+        connection.cursor = cursor
+
+        try:
+            yield
+        finally:
+            if previous_cursor is None:
+                del connection.cursor
+            else:
+                connection.cursor = previous_cursor
+
+            with self.lock:
+                self.threads.discard(thread)
+
+    def tracked(self, func):
+        """ Wraps the callable so that the queries made by the thread calling it are counted. """
+        def wrapper(*args, **kwargs):
+            with self.track():
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    @contextmanager
+    def time(self, stage):
+        """ Adds the time spent within the block to the total for the given stage. """
+        start = time.time()
+        try:
+            yield
+        finally:
+            elapsed = time.time() - start
+            with self.lock:
+                self.stages[stage] += elapsed
+
+    def timed(self, stage, func):
+        """ Wraps the callable so that the time spent calling it is added to the total for the given stage. """
+        def wrapper(*args, **kwargs):
+            with self.time(stage):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    @contextmanager
+    def collect(self, session=None):
+        """ Collects metrics for the operations performed within the block.
+
+        HTTP responses are recorded for requests made with the given session. Queries are only counted for the
+        calling thread. Worker threads which query the database must wrap their work with `tracked` to be counted.
+
+        Arguments:
+            session (requests.Session): Session used to make the requests to be recorded.
+        """
+        if session is not None:
+            session.hooks['response'].append(self.record_response)
+
+        start = time.time()
+
+        try:
+            with self.track():
+                yield self
+        finally:
+            self.wall_time = time.time() - start
+
+            if session is not None:
+                session.hooks['response'].remove(self.record_response)
+
+    def report(self):
+        """ Returns the collected metrics as a JSON-serializable dict. """
+        with self.lock:
+            return {
+                'wall_time': self.wall_time,
+                'pages_fetched': len(self.latencies),
+                'bytes_downloaded': self.bytes_downloaded,
+                'latency': {
+                    'p50': percentile(self.latencies, 50),
+                    'p90': percentile(self.latencies, 90),
+                    'p99': percentile(self.latencies, 99),
+                    'max': max(self.latencies) if self.latencies else None,
+                },
+                'queries': self.queries,
+                'rows': dict(self.rows),
+                'stages': dict(self.stages),
+            }
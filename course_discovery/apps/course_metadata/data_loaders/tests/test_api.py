@@ -1,9 +1,11 @@
 import datetime
 from decimal import Decimal
+from urllib.parse import parse_qs, urlparse
 
 import ddt
 import mock
 import responses
+from django.apps import apps
 from django.test import TestCase
 from pytz import UTC
 
@@ -12,11 +14,14 @@ from course_discovery.apps.course_metadata.choices import CourseRunPacing, Cours
 from course_discovery.apps.course_metadata.data_loaders.api import (
     AbstractDataLoader, CoursesApiDataLoader, EcommerceApiDataLoader, OrganizationsApiDataLoader, ProgramsApiDataLoader
 )
+from course_discovery.apps.course_metadata.data_loaders.metrics import DataLoaderMetrics
 from course_discovery.apps.course_metadata.data_loaders.tests import JPEG, JSON, mock_data
 from course_discovery.apps.course_metadata.data_loaders.tests.mixins import ApiClientTestMixin, DataLoaderTestMixin
-from course_discovery.apps.course_metadata.models import Course, CourseRun, Organization, Program, ProgramType, Seat
+from course_discovery.apps.course_metadata.models import (
+    Course, CourseRun, DataLoaderFingerprint, Organization, Program, ProgramType, Seat, Video
+)
 from course_discovery.apps.course_metadata.tests.factories import (
-    CourseFactory, CourseRunFactory, ImageFactory, OrganizationFactory, SeatFactory, VideoFactory
+    CourseFactory, CourseRunFactory, ImageFactory, OrganizationFactory, PartnerFactory, SeatFactory, VideoFactory
 )
 
 LOGGER_PATH = 'course_discovery.apps.course_metadata.data_loaders.api.logger'
@@ -48,6 +53,19 @@ class AbstractDataLoaderTest(TestCase):
         dt = datetime.datetime.utcnow()
         self.assertEqual(AbstractDataLoader.parse_date(dt.isoformat()), dt)
 
+    def test_get_modified_since_kwargs(self):
+        """ Verify the method only returns a filter if a high-water mark is set, and the API supports it. """
+        partner = PartnerFactory()
+        modified_since = datetime.datetime(2017, 1, 1, tzinfo=UTC)
+        loader = CoursesApiDataLoader(partner, partner.courses_api_url, modified_since=modified_since)
+        self.assertEqual(loader.get_modified_since_kwargs(), {})
+
+        with mock.patch.object(CoursesApiDataLoader, 'SUPPORTS_MODIFIED_SINCE', True):
+            self.assertEqual(loader.get_modified_since_kwargs(), {'modified_since': modified_since.isoformat()})
+
+            loader = CoursesApiDataLoader(partner, partner.courses_api_url)
+            self.assertEqual(loader.get_modified_since_kwargs(), {})
+
     def test_delete_orphans(self):
         """ Verify the delete_orphans method deletes orphaned instances. """
         instances = (ImageFactory(), VideoFactory(),)
@@ -56,6 +74,93 @@ class AbstractDataLoaderTest(TestCase):
         for instance in instances:
             self.assertFalse(instance.__class__.objects.filter(pk=instance.pk).exists())  # pylint: disable=no-member
 
+    def test_fetch_and_process_pages(self):
+        """ Verify all pages are processed, and the number of fetched but unprocessed pages is bounded. """
+        # pylint: disable=protected-access
+        partner = PartnerFactory()
+        loader = CoursesApiDataLoader(partner, partner.courses_api_url, max_workers=2)
+        max_pending = loader.PENDING_PAGES_PER_WORKER * loader.max_workers
+        fetched = []
+        processed = []
+
+        def make_request(page):
+            fetched.append(page)
+            return page
+
+        def process_response(page):
+            # The page being processed is counted in addition to those still pending.
+            self.assertLessEqual(len(fetched) - len(processed), max_pending + 1)
+            processed.append(page)
+
+        pages = range(1, 21)
+
+        with mock.patch('course_discovery.apps.course_metadata.data_loaders.mount_connection_pool') as mock_mount:
+            loader._fetch_and_process_pages(pages, make_request, process_response)
+            mock_mount.assert_called_once_with(loader.http_session, 2)
+
+        self.assertEqual(sorted(processed), list(pages))
+
+    def test_fetch_and_process_pages_with_error(self):
+        """ Verify errors raised while fetching a page are raised to the caller. """
+        # pylint: disable=protected-access
+        partner = PartnerFactory()
+        loader = CoursesApiDataLoader(partner, partner.courses_api_url, max_workers=2)
+        make_request = mock.Mock(side_effect=Exception)
+        process_response = mock.Mock()
+
+        with self.assertRaises(Exception):
+            loader._fetch_and_process_pages(range(1, 21), make_request, process_response)
+
+        process_response.assert_not_called()
+
+    def test_compute_fingerprint(self):
+        """ Verify the fingerprint is stable, regardless of key order, and changes with the data. """
+        data = {'id': 'course-v1:edX+DemoX+Demo_Course', 'name': 'Demo', 'media': {'image': None}}
+        reordered = {'media': {'image': None}, 'name': 'Demo', 'id': 'course-v1:edX+DemoX+Demo_Course'}
+
+        fingerprint = AbstractDataLoader.compute_fingerprint(data)
+
+        self.assertEqual(fingerprint, AbstractDataLoader.compute_fingerprint(reordered))
+        self.assertNotEqual(fingerprint, AbstractDataLoader.compute_fingerprint(dict(data, name='New')))
+
+    def test_save_fingerprints(self):
+        """
+        Verify fingerprints are created, or replaced, with a constant number of queries. Replaced fingerprints are
+        deleted without being loaded first.
+        """
+        # The search index signal processor used by tests listens to all models, which prevents fast deletes.
+        signal_processor = apps.get_app_config('haystack').signal_processor
+        signal_processor.teardown()
+        self.addCleanup(signal_processor.setup)
+
+        partner = PartnerFactory()
+        loader = CoursesApiDataLoader(partner, partner.courses_api_url)
+        loader.save_fingerprints({'a': '1', 'b': '2'})
+
+        with self.assertNumQueries(4):
+            loader.save_fingerprints({'b': '3', 'c': '4', 'd': '5'})
+
+        self.assertEqual(loader.get_fingerprints(['a', 'b', 'c', 'd']), {'a': '1', 'b': '3', 'c': '4', 'd': '5'})
+
+    def test_update_instance(self):
+        """ Verify the method only saves the instance if a value has changed. """
+        # pylint: disable=protected-access
+        course_run = CourseRunFactory()
+        unchanged = {
+            'key': course_run.key,
+            'uuid': str(course_run.uuid),
+            'video': course_run.video,
+            'hidden': course_run.hidden,
+        }
+
+        with mock.patch.object(CourseRun, 'save') as mock_save:
+            self.assertFalse(AbstractDataLoader._update_instance(course_run, unchanged))
+            mock_save.assert_not_called()
+
+            changed = dict(unchanged, hidden=not course_run.hidden)
+            self.assertTrue(AbstractDataLoader._update_instance(course_run, changed))
+            mock_save.assert_called_once_with()
+
     def test_clean_html(self):
         """ Verify the method removes unnecessary HTML attributes. """
         data = (
@@ -120,8 +225,11 @@ class OrganizationsApiDataLoaderTests(ApiClientTestMixin, DataLoaderTestMixin, T
         for datum in api_data:
             self.assert_organization_loaded(datum, partner_has_marketing_site)
 
+        self.assertEqual(self.loader.metrics.rows['created'], expected_num_orgs)
+
         # Verify multiple calls to ingest data do NOT result in data integrity errors.
         self.loader.ingest()
+        self.assertEqual(self.loader.metrics.rows['updated'], expected_num_orgs)
 
     @responses.activate
     def test_ingest_respects_partner(self):
@@ -232,6 +340,62 @@ class CoursesApiDataLoaderTests(ApiClientTestMixin, DataLoaderTestMixin, TestCas
         # Verify multiple calls to ingest data do NOT result in data integrity errors.
         self.loader.ingest()
 
+    @responses.activate
+    def test_ingest_skips_unchanged_course_runs(self):
+        """ Verify re-ingesting identical data does not save the existing course runs and courses again. """
+        self.mock_api()
+        self.loader.ingest()
+
+        with mock.patch.object(CourseRun, 'save') as mock_course_run_save:
+            with mock.patch.object(Course, 'save') as mock_course_save:
+                self.loader.ingest()
+                mock_course_run_save.assert_not_called()
+                mock_course_save.assert_not_called()
+
+    @responses.activate
+    def test_ingest_skips_unchanged_course_runs_with_unnormalized_keys(self):
+        """ Verify course runs whose keys are not normalized (e.g. are padded with whitespace) are still skipped. """
+        bodies = [dict(body, id=' {} '.format(body['id'])) for body in mock_data.COURSES_API_BODIES]
+        self.mock_api(bodies)
+        self.loader.ingest()
+
+        with mock.patch.object(self.loader, 'update_course_run') as mock_update_course_run:
+            self.loader.ingest()
+            mock_update_course_run.assert_not_called()
+
+    @responses.activate
+    def test_ingest_recreates_deleted_course_runs(self):
+        """ Verify course runs deleted since the last run are recreated, even though their data has not changed. """
+        api_data = self.mock_api()
+        self.loader.ingest()
+        count = CourseRun.objects.count()
+
+        CourseRun.objects.get(key=api_data[0]['id']).delete()
+        self.loader.metrics = DataLoaderMetrics()
+        self.loader.ingest()
+
+        self.assertEqual(CourseRun.objects.count(), count)
+        self.assert_course_run_loaded(api_data[0])
+        self.assertEqual(self.loader.metrics.rows['created'], 1)
+        self.assertEqual(self.loader.metrics.rows['updated'], 0)
+
+    @responses.activate
+    def test_ingest_modified_since(self):
+        """ Verify the loader only requests records modified since the high-water mark, if the API supports it. """
+        self.mock_api()
+        modified_since = datetime.datetime(2017, 1, 1, tzinfo=UTC)
+        self.loader.modified_since = modified_since
+
+        self.loader.ingest()
+        qs = parse_qs(urlparse(responses.calls[0].request.url).query)
+        self.assertNotIn('modified_since', qs)
+
+        with mock.patch.object(CoursesApiDataLoader, 'SUPPORTS_MODIFIED_SINCE', True):
+            self.loader.ingest()
+
+        qs = parse_qs(urlparse(responses.calls[-1].request.url).query)
+        self.assertEqual(qs['modified_since'], [modified_since.isoformat()])
+
     @responses.activate
     def test_ingest_exception_handling(self):
         """ Verify the data loader properly handles exceptions during processing of the data from the API. """
@@ -298,6 +462,21 @@ class CoursesApiDataLoaderTests(ApiClientTestMixin, DataLoaderTestMixin, TestCas
         """ Verify the method returns a pacing type corresponding to the API response's pacing field. """
         self.assertEqual(self.loader.get_pacing_type({'pacing': pacing}), expected_pacing_type)
 
+    def test_get_or_create_videos(self):
+        """ Verify the method retrieves existing videos, and creates missing ones, for a page of results. """
+        self.partner.marketing_site_url_root = None
+        self.partner.save()  # pylint: disable=no-member
+        existing = VideoFactory()
+        urls = [existing.src, 'http://example.com/new.mp4', None]
+        results = [{'media': {'course_video': {'uri': url}}} for url in urls]
+
+        videos = self.loader.get_or_create_videos(results)
+
+        self.assertEqual(set(videos), {existing.src, 'http://example.com/new.mp4'})
+        self.assertEqual(videos[existing.src], existing)
+        self.assertTrue(Video.objects.filter(src='http://example.com/new.mp4').exists())
+        self.assertEqual(self.loader.get_courserun_video(results[1], videos=videos), videos[urls[1]])
+
     @ddt.unpack
     @ddt.data(
         (None, None),
@@ -416,6 +595,32 @@ class EcommerceApiDataLoaderTests(ApiClientTestMixin, DataLoaderTestMixin, TestC
         # Verify multiple calls to ingest data do NOT result in data integrity errors.
         self.loader.ingest()
 
+    @responses.activate
+    def test_ingest_skips_unchanged_seats(self):
+        """ Verify seats are only reprocessed if their data changed since the last run, or a full run is requested. """
+        api_data = self.mock_api()
+        self.loader.ingest()
+
+        with mock.patch.object(self.loader, 'update_seat', wraps=self.loader.update_seat) as mock_update_seat:
+            self.loader.ingest()
+
+            # Course runs which could not be found, or whose seats could not be loaded (e.g. because their currency
+            # does not exist), are retried by the next run.
+            course_run = CourseRun.objects.get(key='nocurrency/course/run')
+            mock_update_seat.assert_called_once_with(course_run, mock.ANY)
+            fingerprints = DataLoaderFingerprint.objects.filter(loader=self.loader_class.__name__)
+            self.assertFalse(fingerprints.filter(key__in=[body['id'] for body in api_data[-2:]]).exists())
+
+            # Seats which were deleted since the last run are recreated.
+            mock_update_seat.reset_mock()
+            Seat.objects.filter(course_run__key=api_data[0]['id']).delete()
+            self.loader.ingest()
+            self.assertEqual(CourseRun.objects.get(key=api_data[0]['id']).seats.count(), 1)
+
+            self.loader.full = True
+            self.loader.ingest()
+            self.assertTrue(mock_update_seat.called)
+
     @ddt.unpack
     @ddt.data(
         ({"attribute_values": []}, Seat.AUDIT),
@@ -539,6 +744,13 @@ class ProgramsApiDataLoaderTests(ApiClientTestMixin, DataLoaderTestMixin, TestCa
         for datum in api_data:
             self.assert_program_loaded(datum)
 
+        # Programs which are invalid, or only partially loaded (e.g. because their banner image could not be
+        # downloaded), are counted as failed, so that they are retried.
+        rows = self.loader.metrics.rows
+        self.assertEqual(rows['created'] + rows['failed'], len(mock_data.PROGRAMS_API_BODIES))
+        self.assertGreaterEqual(rows['created'], 1)
+        self.assertEqual(rows['updated'], 0)
+
         self.loader.ingest()
 
     @responses.activate
@@ -0,0 +1,66 @@
+import mock
+import requests
+import responses
+from django.test import SimpleTestCase
+
+from course_discovery.apps.course_metadata.data_loaders.fetchers import RETRY_STATUS_CODES, mount_connection_pool
+
+FETCHERS_PATH = 'course_discovery.apps.course_metadata.data_loaders.fetchers'
+
+
+class MountConnectionPoolTests(SimpleTestCase):
+    def setUp(self):
+        super(MountConnectionPoolTests, self).setUp()
+        self.session = requests.Session()
+        mount_connection_pool(self.session, 25, max_retries=2, backoff_factor=1)
+
+    def mock_responses(self, url, statuses):
+        """ Responds to requests for the URL with the given statuses, in order. """
+        statuses = iter(statuses)
+        responses.add_callback(responses.GET, url, callback=lambda request: (next(statuses), {}, ''))
+        responses.add_callback(responses.POST, url, callback=lambda request: (next(statuses), {}, ''))
+
+    def test_mount_connection_pool(self):
+        """ Verify the session keeps the requested number of connections alive, and retries connection errors,
+        for both HTTP and HTTPS. """
+        for prefix in ('http://', 'https://'):
+            adapter = self.session.get_adapter(prefix + 'example.com')
+            self.assertEqual(adapter._pool_maxsize, 25)  # pylint: disable=protected-access
+            self.assertEqual(adapter.max_retries.total, 2)
+            self.assertEqual(adapter.max_retries.backoff_factor, 1)
+
+    @responses.activate
+    def test_retry_transient_errors(self):
+        """ Verify responses indicating transient failures are retried, with exponential backoff. """
+        url = 'http://example.com/api/'
+        self.mock_responses(url, [503, 429, 200])
+
+        with mock.patch(FETCHERS_PATH + '.time.sleep') as mock_sleep:
+            response = self.session.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(responses.calls), 3)
+        self.assertEqual([call[0][0] for call in mock_sleep.call_args_list], [0, 1])
+
+    @responses.activate
+    def test_retries_exhausted(self):
+        """ Verify the last response is returned, rather than an error raised, once the retries are exhausted. """
+        url = 'http://example.com/api/'
+        self.mock_responses(url, [RETRY_STATUS_CODES[-1]] * 3 + [404])
+
+        with mock.patch(FETCHERS_PATH + '.time.sleep'):
+            response = self.session.get(url)
+
+        self.assertEqual(response.status_code, RETRY_STATUS_CODES[-1])
+        self.assertEqual(len(responses.calls), 3)
+
+    @responses.activate
+    def test_non_idempotent_requests(self):
+        """ Verify requests which are not idempotent are not retried. """
+        url = 'http://example.com/api/'
+        self.mock_responses(url, [503, 200])
+
+        response = self.session.post(url)
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(len(responses.calls), 1)
@@ -0,0 +1,89 @@
+import mock
+from django.test import SimpleTestCase
+
+from course_discovery.apps.course_metadata.data_loaders.html_cleaner import HtmlCleaner, clean_html
+
+CLEAN_HTML_PATH = 'course_discovery.apps.course_metadata.data_loaders.html_cleaner.clean_html'
+
+
+class HtmlCleanerTests(SimpleTestCase):
+    def setUp(self):
+        super(HtmlCleanerTests, self).setUp()
+        self.cleaner = HtmlCleaner(max_workers=2)
+        self.addCleanup(self.cleaner.close)
+
+    def test_clean(self):
+        """ Verify content is cleaned, and the result memoized. """
+        content = '<p style="color: red">Hello&nbsp;<b>world</b>!</p>'
+
+        with mock.patch(CLEAN_HTML_PATH, side_effect=clean_html) as mock_clean_html:
+            self.assertEqual(self.cleaner.clean(content), 'Hello<strong>world</strong>!')
+            self.assertEqual(self.cleaner.clean(content), 'Hello<strong>world</strong>!')
+            self.assertEqual(mock_clean_html.call_count, 1)
+
+    def test_cache_size_is_bounded(self):
+        """ Verify the least recently used results are evicted once the cache is full. """
+        self.cleaner.MAX_CACHE_SIZE = 2
+
+        for content in ('a', 'b', 'a', 'c'):
+            self.cleaner.clean(content)
+
+        self.assertEqual(len(self.cleaner.cache), 2)
+        self.assertIsNone(self.cleaner._get(self.cleaner._get_key('b')))  # pylint: disable=protected-access
+
+    def test_clean_batch(self):
+        """ Verify large batches are cleaned by worker processes, after which cleaning is a cache hit. """
+        contents = ['<p>Item {}&amp;</p>'.format(index) for index in range(HtmlCleaner.MIN_BATCH_SIZE)]
+        self.assertIsNone(self.cleaner.pool)
+
+        self.cleaner.clean_batch(contents)
+        self.assertIsNotNone(self.cleaner.pool)
+
+        with mock.patch(CLEAN_HTML_PATH) as mock_clean_html:
+            for index, content in enumerate(contents):
+                self.assertEqual(self.cleaner.clean(content), 'Item {}&'.format(index))
+            mock_clean_html.assert_not_called()
+
+        self.cleaner.close()
+        self.assertIsNone(self.cleaner.pool)
+
+    def test_clean_batch_ignores_duplicates(self):
+        """ Verify only strings which have not already been cleaned are sent to the worker processes. """
+        contents = [str(index) for index in range(HtmlCleaner.MIN_BATCH_SIZE + 1)]
+        self.cleaner.clean(contents[0])
+        pool = mock.Mock()
+        pool.map.side_effect = lambda func, values, chunksize: [func(value) for value in values]
+
+        with mock.patch.object(self.cleaner, '_get_pool', return_value=pool):
+            self.cleaner.clean_batch(contents + contents + [None, {}])
+            self.cleaner.clean_batch(contents[1:] + ['new'])
+
+        self.assertEqual(pool.map.call_count, 1)
+        self.assertEqual(list(pool.map.call_args[0][1]), contents[1:])
+        self.assertEqual(len(self.cleaner.cache), len(contents) + 1)
+
+    def test_clean_small_batch(self):
+        """ Verify small batches are cleaned in the calling process, without starting the worker processes. """
+        self.cleaner.clean_batch(['<p>a</p>', '<p>b</p>'])
+
+        self.assertIsNone(self.cleaner.pool)
+        self.assertEqual(len(self.cleaner.cache), 2)
+
+    def test_clean_batch_without_workers(self):
+        """ Verify batches are cleaned in the calling process if the cleaner may not start worker processes. """
+        self.cleaner = HtmlCleaner(max_workers=0)
+        contents = [str(index) for index in range(HtmlCleaner.MIN_BATCH_SIZE)]
+        self.cleaner.clean_batch(contents)
+
+        self.assertIsNone(self.cleaner.pool)
+        self.assertEqual(len(self.cleaner.cache), len(contents))
+
+    def test_clean_batch_in_daemon_process(self):
+        """ Verify worker processes are not started if the calling process is not allowed to have children. """
+        contents = [str(index) for index in range(HtmlCleaner.MIN_BATCH_SIZE)]
+
+        with mock.patch('multiprocessing.process.current_process', return_value=mock.Mock(daemon=True)):
+            self.cleaner.clean_batch(contents)
+
+        self.assertIsNone(self.cleaner.pool)
+        self.assertEqual(len(self.cleaner.cache), len(contents))
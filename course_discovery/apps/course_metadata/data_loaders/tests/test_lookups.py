@@ -0,0 +1,93 @@
+import uuid
+
+from django.apps import apps
+from django.db.models.signals import post_delete
+from django.test import TestCase
+
+from course_discovery.apps.core.models import Currency
+from course_discovery.apps.course_metadata.data_loaders.lookups import LookupCache
+from course_discovery.apps.course_metadata.models import Subject, Video
+from course_discovery.apps.course_metadata.tests.factories import SubjectFactory, VideoFactory
+
+
+class LookupCacheTests(TestCase):
+    def setUp(self):
+        super(LookupCacheTests, self).setUp()
+        self.cache = LookupCache()
+
+    def test_get(self):
+        """ Verify each value is looked up once, after which lookups, including misses, do not query the database. """
+        usd = Currency.objects.get(code='USD')
+
+        with self.assertNumQueries(2):
+            self.assertEqual(self.cache.get(Currency, 'code', 'USD'), usd)
+            self.assertIsNone(self.cache.get(Currency, 'code', 'XYZ'))
+            self.assertEqual(self.cache.get(Currency, 'code', 'USD'), usd)
+            self.assertIsNone(self.cache.get(Currency, 'code', 'XYZ'))
+
+    def test_load(self):
+        """ Verify only the requested values are loaded, with a single query. """
+        subjects = SubjectFactory.create_batch(3)
+
+        with self.assertNumQueries(1):
+            self.cache.load_uuids(Subject, [subjects[0].uuid, subjects[1].uuid, str(uuid.uuid4())])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.cache.get_uuids(Subject, [subject.uuid for subject in subjects[:2]]), subjects[:2])
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.cache.get_uuids(Subject, [subjects[2].uuid]), [subjects[2]])
+
+    def test_get_uuids(self):
+        """ Verify instances are found by UUID, in primary key order, and invalid UUIDs are ignored. """
+        subjects = SubjectFactory.create_batch(3)
+        uuids = [str(subject.uuid) for subject in reversed(subjects)] + [None, 'invalid', str(uuid.uuid4())]
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.cache.get_uuids(Subject, uuids), subjects)
+            self.assertEqual(self.cache.get_uuids(Subject, [subjects[1].uuid]), [subjects[1]])
+
+    def test_get_or_create(self):
+        """ Verify missing instances are created once, and cached. """
+        url = 'https://example.com/video.mp4'
+
+        video = self.cache.get_or_create(Video, 'src', url)
+        self.assertEqual(Video.objects.get(src=url), video)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.cache.get_or_create(Video, 'src', url), video)
+
+    def test_get_or_create_existing(self):
+        """ Verify rows created without sending signals (e.g. by bulk_create) are found, rather than duplicated. """
+        self.assertIsNone(self.cache.get(Video, 'src', 'https://example.com/video.mp4'))
+        Video.objects.bulk_create([Video(src='https://example.com/video.mp4')])
+
+        video = self.cache.get_or_create(Video, 'src', 'https://example.com/video.mp4')
+
+        self.assertEqual(Video.objects.get(src='https://example.com/video.mp4'), video)
+        self.assertEqual(self.cache.get(Video, 'src', 'https://example.com/video.mp4'), video)
+
+    def test_invalidate(self):
+        """ Verify changes to the database are only reflected once the model has been invalidated. """
+        url = 'https://example.com/video.mp4'
+        self.assertIsNone(self.cache.get(Video, 'src', url))
+
+        video = VideoFactory(src=url)
+        self.assertIsNone(self.cache.get(Video, 'src', url))
+        self.cache.invalidate(Video)
+        self.assertEqual(self.cache.get(Video, 'src', url), video)
+
+        video.delete()
+        self.assertIsNotNone(self.cache.get(Video, 'src', url))
+        self.cache.invalidate(Video)
+        self.assertIsNone(self.cache.get(Video, 'src', url))
+
+    def test_no_signal_receivers(self):
+        """ Verify the cache does not listen for deletions, which would prevent fast deletes. """
+        apps.get_app_config('haystack').signal_processor.teardown()
+        self.addCleanup(apps.get_app_config('haystack').signal_processor.setup)
+
+        self.cache.get(Currency, 'code', 'USD')
+        self.cache.get(Video, 'src', 'https://example.com/video.mp4')
+
+        self.assertFalse(post_delete.has_listeners(Video))
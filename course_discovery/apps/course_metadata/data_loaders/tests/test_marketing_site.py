@@ -20,7 +20,9 @@ from course_discovery.apps.course_metadata.data_loaders.marketing_site import (
 )
 from course_discovery.apps.course_metadata.data_loaders.tests import JSON, mock_data
 from course_discovery.apps.course_metadata.data_loaders.tests.mixins import DataLoaderTestMixin
-from course_discovery.apps.course_metadata.models import Course, Organization, Person, Program, Subject, Video
+from course_discovery.apps.course_metadata.models import (
+    Course, DataLoaderFingerprint, Organization, Person, Program, Subject, Video
+)
 from course_discovery.apps.course_metadata.tests import factories
 from course_discovery.apps.ietf_language_tags.models import LanguageTag
 
@@ -122,7 +124,8 @@ class AbstractMarketingSiteDataLoaderTestMixin(DataLoaderTestMixin):
                 self.loader.ingest()
                 self.assertEqual(mock_logger.exception.call_count, len(api_data))
                 calls = [mock.call('Failed to load %s.', datum['url']) for datum in api_data]
-                mock_logger.exception.assert_has_calls(calls)
+                # Pages are processed in the order in which they are received, not the order they were requested.
+                mock_logger.exception.assert_has_calls(calls, any_order=True)
 
     @responses.activate
     def test_api_client_login_failure(self):
@@ -197,6 +200,9 @@ class XSeriesMarketingSiteDataLoaderTests(AbstractMarketingSiteDataLoaderTestMix
                                datum['url'].split('/')[-1]) for datum in api_data]
             mock_logger.error.assert_has_calls(calls)
 
+        # The nodes are reported as failed, so that they are requested again by the next run.
+        self.assertEqual(self.loader.metrics.report()['rows']['failed'], len(api_data))
+
 
 class SubjectMarketingSiteDataLoaderTests(AbstractMarketingSiteDataLoaderTestMixin, TestCase):
     loader_class = SubjectMarketingSiteDataLoader
@@ -227,6 +233,54 @@ class SubjectMarketingSiteDataLoaderTests(AbstractMarketingSiteDataLoaderTestMix
         for datum in api_data:
             self.assert_subject_loaded(datum)
 
+    @responses.activate
+    def test_ingest_skips_unchanged_nodes(self):
+        """ Verify nodes are not reprocessed if their data has not changed since the last run. """
+        self.mock_login_response()
+        self.mock_api()
+        self.loader.ingest()
+
+        with mock.patch.object(self.loader, 'process_node') as mock_process_node:
+            self.loader.ingest()
+            mock_process_node.assert_not_called()
+
+    @responses.activate
+    def test_ingest_recreates_deleted_subjects(self):
+        """ Verify subjects deleted since the last run are recreated, even though their nodes have not changed. """
+        self.mock_login_response()
+        api_data = self.mock_api()
+        self.loader.ingest()
+
+        Subject.objects.all().delete()
+        self.loader.ingest()
+
+        for datum in api_data:
+            self.assert_subject_loaded(datum)
+
+    @responses.activate
+    def test_ingest_modified_since(self):
+        """ Verify only nodes changed after the high-water mark are loaded, and paging stops at unmodified nodes. """
+        modified_since = datetime.datetime(2017, 1, 1, tzinfo=pytz.UTC)
+        modified, unmodified = [dict(datum) for datum in self.mocked_data]
+        modified['changed'] = str(int((modified_since + datetime.timedelta(days=1)).timestamp()))
+        unmodified['changed'] = str(int((modified_since - datetime.timedelta(days=1)).timestamp()))
+        self.mocked_data = [modified, unmodified]
+
+        self.mock_login_response()
+        self.mock_api()
+        self.loader.modified_since = modified_since
+
+        self.loader.ingest()
+
+        self.assert_subject_loaded(modified)
+        self.assertFalse(Subject.objects.filter(slug=unmodified['field_subject_url_slug']).exists())
+
+        node_calls = [call for call in responses.calls if 'node.json' in call.request.url]
+        self.assertEqual(len(node_calls), 2)
+        qs = parse_qs(urlparse(node_calls[0].request.url).query)
+        self.assertEqual(qs['sort'], ['changed'])
+        self.assertEqual(qs['direction'], ['DESC'])
+
 
 class SchoolMarketingSiteDataLoaderTests(AbstractMarketingSiteDataLoaderTestMixin, TestCase):
     loader_class = SchoolMarketingSiteDataLoader
@@ -369,6 +423,30 @@ class CourseMarketingSiteDataLoaderTests(AbstractMarketingSiteDataLoaderTestMixi
         expected = list(LanguageTag.objects.filter(code__in=('en-us', 'zh-cmn')))
         self.assertEqual(list(self.loader.get_language_tags_from_names(names)), expected)
 
+    def test_get_html(self):
+        """ Verify the method returns the values of the node's HTML fields, ignoring those which are empty. """
+        data = {
+            'field_course_course_title': {'value': '<b>Title</b>'},
+            'field_course_body': [],
+            'field_course_description': {'value': None},
+            'field_course_sub_title_short': '<i>Short</i>',
+        }
+        self.assertEqual(self.loader.get_html(data), ['<b>Title</b>', '<i>Short</i>'])
+
+    @responses.activate
+    def test_load_references(self):
+        """ Verify the objects referenced by a page of nodes are loaded in bulk, so processing the nodes does not
+        look them up again. """
+        nodes = self.mock_api()
+
+        with self.assertNumQueries(7):
+            self.loader.load_references(nodes)
+
+        with self.assertNumQueries(0):
+            for node in nodes:
+                self.assertFalse(self.loader.has_missing_references(node))
+                self.loader._extract_language_tags(node['field_course_languages'])  # pylint: disable=protected-access
+
     def test_get_level_type(self):
         self.assertIsNone(self.loader.get_level_type(None))
 
@@ -560,6 +638,21 @@ class CourseMarketingSiteDataLoaderTests(AbstractMarketingSiteDataLoaderTestMixi
             self.assert_course_run_loaded(datum)
             self.assert_course_loaded(datum)
 
+    @responses.activate
+    def test_ingest_with_missing_references(self):
+        """ Verify nodes referencing objects which do not exist yet are loaded again by the next run. """
+        self.mock_login_response()
+        data = self.mock_api()
+        Person.objects.all().delete()
+
+        self.loader.ingest()
+
+        nodes_with_staff = [datum for datum in data if datum['field_course_staff']]
+        fingerprints = DataLoaderFingerprint.objects.filter(loader=self.loader_class.__name__)
+        self.assertTrue(nodes_with_staff)
+        self.assertFalse(fingerprints.filter(key__in=[datum['uuid'] for datum in nodes_with_staff]).exists())
+        self.assertEqual(self.loader.metrics.report()['rows']['failed'], len(nodes_with_staff))
+
     @responses.activate
     def test_canonical(self):
         self.mocked_data = [
@@ -0,0 +1,127 @@
+import threading
+
+import requests
+import responses
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test import TestCase
+
+from course_discovery.apps.course_metadata.data_loaders.metrics import DataLoaderMetrics, percentile
+from course_discovery.apps.course_metadata.models import Subject
+from course_discovery.apps.course_metadata.tests.factories import SubjectFactory
+
+
+class PercentileTests(TestCase):
+    def test_percentile(self):
+        """ Verify the method returns the nearest-rank percentile. """
+        values = [5, 1, 4, 2, 3, 6, 8, 7, 10, 9]
+        self.assertEqual(percentile(values, 50), 5)
+        self.assertEqual(percentile(values, 90), 9)
+        self.assertEqual(percentile(values, 99), 10)
+        self.assertEqual(percentile(values, 0), 1)
+        self.assertIsNone(percentile([], 50))
+
+
+class DataLoaderMetricsTests(TestCase):
+    @responses.activate
+    def test_collect(self):
+        """ Verify HTTP responses and queries are recorded within the block, and only within it. """
+        url = 'http://example.com/api/'
+        responses.add(responses.GET, url, body='x' * 100)
+        session = requests.Session()
+        metrics = DataLoaderMetrics()
+
+        with metrics.collect(session):
+            session.get(url)
+            session.get(url)
+            subject = SubjectFactory()
+            subject.save()
+            list(Subject.objects.all())
+
+        queries = metrics.queries
+
+        # Nothing should be recorded once the block has exited.
+        session.get(url)
+        SubjectFactory()
+
+        report = metrics.report()
+        self.assertEqual(report['pages_fetched'], 2)
+        self.assertEqual(report['bytes_downloaded'], 200)
+        self.assertIsNotNone(report['latency']['p50'])
+        self.assertGreaterEqual(report['queries'], 3)
+        self.assertEqual(report['queries'], queries)
+        # Rows are counted by the loaders, not by the saves made while loading them.
+        self.assertEqual(report['rows']['created'], 0)
+        self.assertEqual(report['rows']['updated'], 0)
+        self.assertIsNotNone(report['wall_time'])
+        self.assertEqual(session.hooks['response'], [])
+
+    def test_collect_other_threads(self):
+        """ Verify queries made by other threads are only recorded if the threads are tracked. """
+        metrics = DataLoaderMetrics()
+
+        def query():
+            try:
+                list(Subject.objects.all())
+            finally:
+                connection.close()
+
+        with metrics.collect():
+            thread = threading.Thread(target=query)
+            thread.start()
+            thread.join()
+            self.assertEqual(metrics.queries, 0)
+
+            thread = threading.Thread(target=metrics.tracked(query))
+            thread.start()
+            thread.join()
+            self.assertEqual(metrics.queries, 1)
+
+    def test_track_nested(self):
+        """ Verify nested blocks count queries once per metrics, and restore the cursor of the enclosing block. """
+        metrics = DataLoaderMetrics()
+        other = DataLoaderMetrics()
+        cursor = vars(connections[DEFAULT_DB_ALIAS]).get('cursor')
+
+        with metrics.track():
+            with metrics.track():
+                list(Subject.objects.all())
+            self.assertEqual(metrics.queries, 1)
+
+            with other.track():
+                list(Subject.objects.all())
+            self.assertEqual(other.queries, 1)
+            self.assertEqual(metrics.queries, 2)
+
+            # The enclosing block should still be counting queries once the inner blocks have exited.
+            list(Subject.objects.all())
+            self.assertEqual(metrics.queries, 3)
+            self.assertEqual(other.queries, 1)
+
+        list(Subject.objects.all())
+        self.assertEqual(metrics.queries, 3)
+        self.assertEqual(vars(connections[DEFAULT_DB_ALIAS]).get('cursor'), cursor)
+
+    def test_collect_with_error(self):
+        """ Verify the hooks are removed if the block raises an exception. """
+        session = requests.Session()
+        metrics = DataLoaderMetrics()
+
+        with self.assertRaises(ValueError):
+            with metrics.collect(session):
+                raise ValueError
+
+        self.assertEqual(session.hooks['response'], [])
+        list(Subject.objects.all())
+        self.assertEqual(metrics.queries, 0)
+
+    def test_record_rows_and_stages(self):
+        """ Verify row outcomes and time spent in each stage are accumulated. """
+        metrics = DataLoaderMetrics()
+        metrics.record_rows('unchanged', 3)
+        metrics.record_rows('failed')
+        metrics.timed('process', lambda: None)()
+
+        report = metrics.report()
+        self.assertEqual(report['rows'], {'created': 0, 'updated': 0, 'unchanged': 3, 'failed': 1})
+        self.assertIn('process', report['stages'])
+        self.assertIsNone(report['latency']['max'])
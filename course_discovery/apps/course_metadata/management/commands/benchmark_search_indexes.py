@@ -0,0 +1,244 @@
+import json
+import time
+from collections import OrderedDict
+
+from django.apps import apps
+from django.core.management import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from course_discovery.apps.course_metadata.catalog_graph import CatalogGraph
+from course_discovery.apps.course_metadata.models import SeatType
+from course_discovery.apps.course_metadata.search_indexes import CourseIndex, CourseRunIndex, ProgramIndex
+from course_discovery.apps.course_metadata.signal_processors import QueuedSignalProcessor
+
+INDEXES = (CourseIndex, CourseRunIndex, ProgramIndex)
+
+COLUMNS = (
+    ('Index', '{index}'),
+    ('Field', '{field}'),
+    ('Total (ms)', '{total_ms:.1f}'),
+    ('Per doc (ms)', '{per_document_ms:.3f}'),
+    ('Queries', '{queries}'),
+    ('Bytes/doc', '{bytes_per_document:.0f}'),
+)
+
+
+class DocumentEncoder(DjangoJSONEncoder):
+    """ Serializes values the way the search backend does, which also converts sets to lists. """
+
+    def default(self, o):  # pylint: disable=method-hidden
+        if isinstance(o, set):
+            return list(o)
+        return super(DocumentEncoder, self).default(o)
+
+
+def document_size(value):
+    return len(json.dumps(value, cls=DocumentEncoder).encode('utf-8'))
+
+
+class Command(BaseCommand):
+    """
+    Benchmarks the search index fields using a synthetic catalog.
+
+    This is a development tool. The catalog is created with the test factories, so factory-boy (installed by
+    requirements/test.txt and requirements/local.txt, but not requirements/production.txt) must be installed.
+    """
+    help = 'Benchmark the time, queries and document size of each search index field, using a synthetic catalog.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--programs',
+            action='store',
+            dest='programs',
+            type=int,
+            default=10,
+            help='Number of programs in the synthetic catalog.'
+        )
+
+        parser.add_argument(
+            '--courses',
+            action='store',
+            dest='courses',
+            type=int,
+            default=5,
+            help='Number of courses in each program.'
+        )
+
+        parser.add_argument(
+            '--course-runs',
+            action='store',
+            dest='course_runs',
+            type=int,
+            default=3,
+            help='Number of course runs of each course.'
+        )
+
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            dest='json',
+            default=False,
+            help='Output the results as JSON, rather than as a table.'
+        )
+
+    def handle(self, *args, **options):
+        sizes = (options['programs'], options['courses'], options['course_runs'])
+        if min(sizes) < 1:
+            raise CommandError('--programs, --courses and --course-runs must be positive integers.')
+
+        try:
+            factories = self.get_factories()
+        except ImportError:
+            raise CommandError(
+                'The synthetic catalog is created with factory-boy, which is installed by requirements/test.txt.'
+            )
+
+        # The synthetic catalog must not be written to the search index, or remain in the database. Changes
+        # queued before the signal handlers are disconnected are written first.
+        signal_processor = apps.get_app_config('haystack').signal_processor
+        if isinstance(signal_processor, QueuedSignalProcessor):
+            signal_processor.flush()
+        signal_processor.teardown()
+
+        try:
+            with transaction.atomic():
+                self.create_catalog(factories, *sizes)
+
+                # Documents are prepared the same way update_index prepares them.
+                with CatalogGraph.activate():
+                    results = [self.benchmark_index(index_class()) for index_class in INDEXES]
+
+                transaction.set_rollback(True)
+        finally:
+            signal_processor.setup()
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.stdout.write(self.format_table(results))
+
+    def get_factories(self):
+        """ Imports the test factories, which are only available if the test requirements are installed. """
+        from course_discovery.apps.course_metadata.tests import factories
+        return factories
+
+    def create_catalog(self, factories, programs, courses, course_runs):
+        """ Creates programs, each containing courses with course runs, which share a few organizations. """
+        partner = factories.PartnerFactory()
+        organizations = factories.OrganizationFactory.create_batch(5, partner=partner)
+        subjects = factories.SubjectFactory.create_batch(5, partner=partner)
+        staff = factories.PersonFactory.create_batch(10, partner=partner)
+        verified, __ = SeatType.objects.get_or_create(name='Verified')
+        program_type = factories.ProgramTypeFactory(applicable_seat_types=[verified])
+
+        for program_number in range(programs):
+            program_courses = []
+
+            for course_number in range(courses):
+                number = program_number * courses + course_number
+                course = factories.CourseFactory(
+                    partner=partner,
+                    authoring_organizations=[organizations[number % len(organizations)]],
+                    sponsoring_organizations=[organizations[(number + 1) % len(organizations)]],
+                    subjects=subjects[number % len(subjects):][:2],
+                )
+
+                for course_run in factories.CourseRunFactory.create_batch(course_runs, course=course, staff=staff[:2]):
+                    factories.SeatFactory(course_run=course_run, type='audit')
+                    factories.SeatFactory(course_run=course_run, type='verified')
+
+                program_courses.append(course)
+
+            factories.ProgramFactory(
+                partner=partner,
+                type=program_type,
+                courses=program_courses,
+                authoring_organizations=organizations[:1],
+            )
+
+    def benchmark_index(self, index):
+        """
+        Prepares the document of every object in an index's queryset, timing each field separately.
+
+        Fields are prepared the same way SearchIndex.prepare prepares them.
+        """
+        fields = OrderedDict(
+            (field_name, {'field': field_name, 'seconds': 0.0, 'queries': 0, 'bytes': 0})
+            for field_name in index.fields
+        )
+
+        with CaptureQueriesContext(connection) as context:
+            started = time.perf_counter()
+            objects = list(index.index_queryset())
+            queryset_seconds = time.perf_counter() - started
+        queryset_queries = len(context)
+
+        for obj in objects:
+            for field_name, field in index.fields.items():
+                prepare_method = getattr(index, 'prepare_{}'.format(field_name), None)
+
+                with CaptureQueriesContext(connection) as context:
+                    started = time.perf_counter()
+                    # Fields with prepare methods are prepared by both the field and the method.
+                    value = field.prepare(obj)
+                    if prepare_method:
+                        value = prepare_method(obj)
+                    seconds = time.perf_counter() - started
+
+                result = fields[field_name]
+                result['seconds'] += seconds
+                result['queries'] += len(context)
+                result['bytes'] += document_size(value)
+
+        document_sizes = [document_size(index.full_prepare(obj)) for obj in objects]
+        count = len(objects) or 1
+
+        def summarize(field_name, seconds, queries, size):
+            return {
+                'field': field_name,
+                'total_ms': seconds * 1000,
+                'per_document_ms': seconds * 1000 / count,
+                'queries': queries,
+                'bytes_per_document': size / count,
+            }
+
+        rows = [summarize('(queryset)', queryset_seconds, queryset_queries, 0)]
+        rows += sorted(
+            (summarize(result['field'], result['seconds'], result['queries'], result['bytes'])
+             for result in fields.values()),
+            key=lambda row: row['total_ms'],
+            reverse=True
+        )
+
+        return {
+            'index': index.__class__.__name__,
+            'documents': len(objects),
+            'total_ms': sum(row['total_ms'] for row in rows),
+            'queries': sum(row['queries'] for row in rows),
+            'document_bytes': {
+                'mean': sum(document_sizes) / count,
+                'max': max(document_sizes, default=0),
+                'total': sum(document_sizes),
+            },
+            'fields': rows,
+        }
+
+    def format_table(self, results):
+        rows = [[header for header, __ in COLUMNS]]
+
+        for result in results:
+            summary = dict(
+                result,
+                field='(all, {} documents)'.format(result['documents']),
+                per_document_ms=result['total_ms'] / (result['documents'] or 1),
+                bytes_per_document=result['document_bytes']['mean'],
+            )
+
+            for row in [summary] + result['fields']:
+                context = dict(row, index=result['index'])
+                rows.append([template.format(**context) for __, template in COLUMNS])
+
+        widths = [max(len(row[index]) for row in rows) for index in range(len(COLUMNS))]
+        return '\n'.join('  '.join(value.ljust(width) for value, width in zip(row, widths)).rstrip() for row in rows)
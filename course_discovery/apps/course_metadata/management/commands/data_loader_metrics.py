@@ -0,0 +1,131 @@
+import json
+
+from django.core.management import BaseCommand, CommandError
+
+from course_discovery.apps.course_metadata.models import DataLoaderRun
+
+COLUMNS = (
+    ('Loader', '{run.loader}'),
+    ('Partner', '{run.partner.short_code}'),
+    ('Started', '{run.started:%Y-%m-%d %H:%M}'),
+    ('OK', '{ok}'),
+    ('Wall (s)', '{wall_time}'),
+    ('Process (s)', '{process_time}'),
+    ('Pages', '{metrics[pages_fetched]}'),
+    ('p50 (ms)', '{p50}'),
+    ('p99 (ms)', '{p99}'),
+    ('MB', '{megabytes:.1f}'),
+    ('Queries', '{metrics[queries]}'),
+    ('Created', '{rows[created]}'),
+    ('Updated', '{rows[updated]}'),
+    ('Unchanged', '{rows[unchanged]}'),
+    ('Failed', '{rows[failed]}'),
+)
+
+
+def format_seconds(value, multiplier=1):
+    return '-' if value is None else '{:.0f}'.format(value * multiplier)
+
+
+class Command(BaseCommand):
+    help = 'Display the metrics recorded by the most recent runs of the data loaders.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--partner_code',
+            action='store',
+            dest='partner_code',
+            default=None,
+            help='The short code for a specific partner whose runs should be displayed.'
+        )
+
+        parser.add_argument(
+            '--loader',
+            action='store',
+            dest='loader',
+            default=None,
+            help='The class name of a specific data loader (e.g. CoursesApiDataLoader) whose runs should be displayed.'
+        )
+
+        parser.add_argument(
+            '--runs',
+            action='store',
+            dest='runs',
+            type=int,
+            default=1,
+            help='Number of runs to display for each loader and partner, starting with the most recent.'
+        )
+
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            dest='json',
+            default=False,
+            help='Output the metrics as JSON, rather than as a table.'
+        )
+
+    def handle(self, *args, **options):
+        if options['runs'] < 1:
+            raise CommandError('--runs must be a positive integer.')
+
+        runs = self.get_runs(options['partner_code'], options['loader'], options['runs'])
+
+        if options['json']:
+            data = [
+                {
+                    'loader': run.loader,
+                    'partner': run.partner.short_code,
+                    'started': run.started.isoformat(),
+                    'finished': run.finished.isoformat(),
+                    'succeeded': run.succeeded,
+                    'metrics': run.metrics,
+                } for run in runs
+            ]
+            self.stdout.write(json.dumps(data, indent=2))
+        else:
+            self.stdout.write(self.format_table(runs))
+
+    def get_runs(self, partner_code, loader, limit):
+        """ Returns the most recent runs for each loader and partner.
+
+        Runs are ordered with the slowest loaders first, so that those which dominate a refresh are easy to spot.
+        Older runs of the same loader follow the most recent, so that regressions are easy to spot.
+        """
+        queryset = DataLoaderRun.objects.select_related('partner').order_by('-started')
+
+        if partner_code:
+            queryset = queryset.filter(partner__short_code=partner_code)
+
+        if loader:
+            queryset = queryset.filter(loader=loader)
+
+        grouped = {}
+        for run in queryset.iterator():
+            runs = grouped.setdefault((run.partner.short_code, run.loader), [])
+            if len(runs) < limit:
+                runs.append(run)
+
+        groups = sorted(grouped.values(), key=lambda runs: runs[0].metrics.get('wall_time') or 0, reverse=True)
+        return [run for runs in groups for run in runs]
+
+    def format_table(self, runs):
+        rows = [[header for header, __ in COLUMNS]]
+
+        for run in runs:
+            metrics = run.metrics
+            latency = metrics.get('latency', {})
+            context = {
+                'run': run,
+                'metrics': metrics,
+                'rows': metrics.get('rows', {}),
+                'ok': 'Y' if run.succeeded else 'N',
+                'wall_time': format_seconds(metrics.get('wall_time')),
+                'process_time': format_seconds(metrics.get('stages', {}).get('process')),
+                'p50': format_seconds(latency.get('p50'), multiplier=1000),
+                'p99': format_seconds(latency.get('p99'), multiplier=1000),
+                'megabytes': metrics.get('bytes_downloaded', 0) / 1024.0 / 1024.0,
+            }
+            rows.append([template.format(**context) for __, template in COLUMNS])
+
+        widths = [max(len(row[index]) for row in rows) for index in range(len(COLUMNS))]
+        return '\n'.join('  '.join(value.ljust(width) for value, width in zip(row, widths)).rstrip() for row in rows)
@@ -1,32 +1,88 @@
 import concurrent.futures
-import itertools
+import datetime
 import logging
+from collections import namedtuple
 
 import jwt
 import waffle
+from django.apps import apps
+from django.conf import settings
 from django.core.management import BaseCommand, CommandError
 from django.db import connection
+from django.utils import timezone
 from edx_rest_api_client.client import EdxRestApiClient
 
+from course_discovery.apps.api import affiliate_window
+from course_discovery.apps.api.cache import bump_catalog_generation
 from course_discovery.apps.core.models import Partner
+from course_discovery.apps.course_metadata.data_loaders import AbstractDataLoader
 from course_discovery.apps.course_metadata.data_loaders.api import (
     CoursesApiDataLoader, EcommerceApiDataLoader, OrganizationsApiDataLoader, ProgramsApiDataLoader
 )
+from course_discovery.apps.course_metadata.data_loaders.lookups import LookupCache
 from course_discovery.apps.course_metadata.data_loaders.marketing_site import (
     CourseMarketingSiteDataLoader, PersonMarketingSiteDataLoader, SchoolMarketingSiteDataLoader,
     SponsorMarketingSiteDataLoader, SubjectMarketingSiteDataLoader, XSeriesMarketingSiteDataLoader
 )
-from course_discovery.apps.course_metadata.models import Course, DataLoaderConfig
+from course_discovery.apps.course_metadata.models import Course, DataLoaderConfig, DataLoaderRun, DataLoaderWatermark
+from course_discovery.apps.course_metadata.signal_processors import QueuedSignalProcessor
 
 logger = logging.getLogger(__name__)
 
 
 def execute_loader(loader_class, *loader_args, **loader_kwargs):
+    loader = None
+    succeeded = False
+    started = timezone.now()
+
     try:
-        loader_class(*loader_args, **loader_kwargs).ingest()
+        loader = loader_class(*loader_args, **loader_kwargs)
+
+        with loader.metrics.collect(loader.http_session):
+            loader.ingest()
+
+        # Only advance the high-water mark after a successful run. The start time is recorded, rather than
+        # the end time, so that records modified while the loader was running are picked up next time. Records
+        # which failed to load would not be requested again, so the mark is not advanced if any failed.
+        if loader.metrics.has_failures():
+            logger.warning(
+                '%s failed to load some records. Its high-water mark has not been advanced.', loader_class.__name__
+            )
+        else:
+            DataLoaderWatermark.objects.update_or_create(
+                partner=loader.partner, loader=loader_class.__name__, defaults={'last_run': started}
+            )
+        succeeded = True
     except Exception:  # pylint: disable=broad-except
         logger.exception('%s failed!', loader_class.__name__)
 
+    if loader:
+        record_run(loader, started, succeeded)
+
+    return succeeded
+
+
+def record_run(loader, started, succeeded):
+    """ Persists the metrics collected by a data loader run, and deletes those of the loader's runs which are older
+    than the retention period. Failing to do so should not fail the refresh.
+    """
+    try:
+        DataLoaderRun.objects.create(
+            partner=loader.partner,
+            loader=loader.__class__.__name__,
+            started=started,
+            finished=timezone.now(),
+            succeeded=succeeded,
+            metrics=loader.metrics.report()
+        )
+
+        expired = started - datetime.timedelta(days=settings.DATA_LOADER_RUN_RETENTION_DAYS)
+        DataLoaderRun.objects.filter(
+            partner=loader.partner, loader=loader.__class__.__name__, started__lt=expired
+        ).delete()
+    except Exception:  # pylint: disable=broad-except
+        logger.exception('Failed to record metrics for %s.', loader.__class__.__name__)
+
 
 def execute_parallel_loader(loader_class, *loader_args, **loader_kwargs):
     """
@@ -44,7 +100,159 @@ def execute_parallel_loader(loader_class, *loader_args, **loader_kwargs):
     """
     connection.close()
 
-    execute_loader(loader_class, *loader_args, **loader_kwargs)
+    succeeded = execute_loader(loader_class, *loader_args, **loader_kwargs)
+
+    # Worker processes do not run exit handlers, so changes queued for the search index must be flushed here.
+    signal_processor = apps.get_app_config('haystack').signal_processor
+    if isinstance(signal_processor, QueuedSignalProcessor):
+        signal_processor.flush()
+
+    return succeeded
+
+
+class AccessTokens(object):
+    """ Retrieves the OAuth access token of each partner when it is first needed, and again once it expires.
+
+    Tokens are retrieved as each partner's loaders start, rather than for all partners before any loader runs, so
+    that the loaders of partners refreshed later do not start with expired tokens.
+    """
+    # Tokens which expire within this time are replaced, so that loaders do not start with a token about to expire.
+    EXPIRY_MARGIN = datetime.timedelta(minutes=5)
+
+    def __init__(self, token_type='JWT'):
+        self.token_type = token_type
+        self.tokens = {}
+
+    def get(self, partner):
+        """ Returns an access token for the partner.
+
+        Arguments:
+            partner (Partner): Partner whose OAuth client credentials are used.
+
+        Returns:
+            str
+        """
+        access_token, expires_at = self.tokens.get(partner.id, (None, None))
+
+        if access_token is None or expires_at - self.EXPIRY_MARGIN <= datetime.datetime.utcnow():
+            logger.info('Retrieving access token for partner [{}]'.format(partner.short_code))
+
+            try:
+                access_token, expires_at = EdxRestApiClient.get_oauth_access_token(
+                    '{root}/access_token'.format(root=partner.oidc_url_root.strip('/')),
+                    partner.oidc_key,
+                    partner.oidc_secret,
+                    token_type=self.token_type
+                )
+            except Exception:
+                logger.exception('No access token acquired through client_credential flow.')
+                raise
+
+            self.tokens[partner.id] = (access_token, expires_at)
+
+        return access_token
+
+
+class LoaderJob(namedtuple('LoaderJob', ['loader_class', 'args', 'kwargs'])):
+    """ A single data loader run, for a single partner.
+
+    The arguments are those of the loader, excluding the access token and its type, which are only retrieved when
+    the loader is about to run.
+    """
+
+    @property
+    def partner(self):
+        return self.args[0]
+
+    @property
+    def name(self):
+        return '{loader} for partner [{partner}]'.format(
+            loader=self.loader_class.__name__, partner=self.partner.short_code
+        )
+
+    def get_loader_arguments(self, access_tokens):
+        """ Returns the positional and keyword arguments of the loader, including the partner's access token.
+
+        Arguments:
+            access_tokens (AccessTokens): Access tokens of the partners.
+
+        Returns:
+            tuple: Positional arguments, and keyword arguments.
+        """
+        access_token = access_tokens.get(self.partner)
+        args = self.args[:2] + (access_token, access_tokens.token_type) + self.args[2:]
+        kwargs = dict(self.kwargs)
+
+        username = jwt.decode(access_token, verify=False)['preferred_username']
+        if username:
+            kwargs['username'] = username
+
+        return args, kwargs
+
+    @property
+    def key(self):
+        return self.partner.id, self.loader_class.__name__
+
+    @property
+    def dependencies(self):
+        return {(self.partner.id, name) for name in self.loader_class.DEPENDENCIES}
+
+
+def execute_jobs(executor, jobs, access_tokens):
+    """
+    Runs data loaders in parallel, starting each as soon as the loaders it depends on have finished.
+
+    Dependencies are only tracked between loaders for the same partner. A dependency on a loader which is not
+    being run (e.g. because the partner has not configured its API) is considered to be satisfied. Loaders
+    which fail are treated as finished, so that their dependents still run, as they would if run serially.
+
+    Arguments:
+        executor (concurrent.futures.Executor): Executor used to run the loaders.
+        jobs (list[LoaderJob]): Loaders to run.
+        access_tokens (AccessTokens): Access tokens of the partners.
+
+    Returns:
+        list[LoaderJob]: Loaders which failed.
+    """
+    scheduled = {job.key for job in jobs}
+    finished = set()
+    failed = []
+    waiting = list(jobs)
+    running = {}
+
+    while waiting or running:
+        ready = [job for job in waiting if all(
+            dependency in finished or dependency not in scheduled for dependency in job.dependencies
+        )]
+
+        for job in ready:
+            waiting.remove(job)
+            args, kwargs = job.get_loader_arguments(access_tokens)
+            future = executor.submit(execute_parallel_loader, job.loader_class, *args, **kwargs)
+            running[future] = job
+
+        if not running:
+            raise CommandError('Data loaders have circular dependencies: {}'.format(
+                ', '.join(sorted(job.loader_class.__name__ for job in waiting))
+            ))
+
+        done, __ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+
+        for future in done:
+            job = running.pop(future)
+            finished.add(job.key)
+
+            try:
+                succeeded = future.result()
+            except Exception:  # pylint: disable=broad-except
+                # The loader's own errors are logged by the worker. This is an error running the worker itself.
+                logger.exception('Failed to run %s!', job.name)
+                succeeded = False
+
+            if not succeeded:
+                failed.append(job)
+
+    return failed
 
 
 class Command(BaseCommand):
@@ -59,6 +267,14 @@ class Command(BaseCommand):
             help='The short code for a specific partner to refresh.'
         )
 
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            dest='full',
+            default=False,
+            help='Ignore the high-water marks and fingerprints from previous runs, and reload all data.'
+        )
+
     def handle(self, *args, **options):
         # For each partner defined...
         partners = Partner.objects.all()
@@ -71,111 +287,140 @@ class Command(BaseCommand):
         if not partners:
             raise CommandError('No partners available!')
 
-        token_type = 'JWT'
+        full = options.get('full')
+        jobs = []
         for partner in partners:
-            logger.info('Retrieving access token for partner [{}]'.format(partner_code))
+            jobs.extend(self.get_jobs(partner, full))
 
-            try:
-                access_token, __ = EdxRestApiClient.get_oauth_access_token(
-                    '{root}/access_token'.format(root=partner.oidc_url_root.strip('/')),
-                    partner.oidc_key,
-                    partner.oidc_secret,
-                    token_type=token_type
-                )
-            except Exception:
-                logger.exception('No access token acquired through client_credential flow.')
-                raise
-            username = jwt.decode(access_token, verify=False)['preferred_username']
-            kwargs = {'username': username} if username else {}
-
-            # The Linux kernel implements copy-on-write when fork() is called to create a new
-            # process. Pages that the parent and child processes share, such as the database
-            # connection, are marked read-only. If a write is performed on a read-only page
-            # (e.g., closing the connection), it is then copied, since the memory is no longer
-            # identical between the two processes. This leads to the following behavior:
-            #
-            # 1) Newly forked process
-            #       parent
-            #              -> connection (Django open, MySQL open)
-            #       child
-            #
-            # 2) Child process closes the connection
-            #       parent -> connection (*Django open, MySQL closed*)
-            #       child  -> connection (Django closed, MySQL closed)
-            #
-            # Calling connection.close() from a child process causes the MySQL server to
-            # close a connection which the parent process thinks is still usable. Since
-            # the parent process thinks the connection is still open, Django won't attempt
-            # to open a new one, and the parent ends up running a query on a closed connection.
-            # This results in a 'MySQL server has gone away' error.
-            #
-            # To resolve this, we force Django to reconnect to the database before running any queries.
+        access_tokens = AccessTokens()
+
+        if waffle.switch_is_active('parallel_refresh_pipeline'):
+            # Jobs for all partners share a single pool, and each loader starts as soon as the loaders it
+            # depends on have finished, rather than waiting for an entire stage to finish.
+            with concurrent.futures.ProcessPoolExecutor() as executor:
+                failed = execute_jobs(executor, jobs, access_tokens)
+        else:
+            # Loaders run serially share a cache of reference data, so that it is only read from the database once.
+            lookup_cache = LookupCache()
+            failed = []
+
+            for job in jobs:
+                loader_args, loader_kwargs = job.get_loader_arguments(access_tokens)
+                if not execute_loader(job.loader_class, *loader_args, lookup_cache=lookup_cache, **loader_kwargs):
+                    failed.append(job)
+
+        if failed:
+            logger.error('Data loaders failed: %s.', ', '.join(job.name for job in failed))
+
+        # Media orphaned by any of the loaders are cleaned up once, rather than after each loader.
+        try:
+            # Worker processes may have closed the database connection (see above), so reconnect first.
             connection.connect()
+            AbstractDataLoader.delete_orphans()
+        except Exception:  # pylint: disable=broad-except
+            logger.exception('Failed to delete orphaned media!')
 
-            # If no courses exist for this partner, this command is likely being run on a
-            # new catalog installation. In that case, we don't want multiple threads racing
-            # to create courses. If courses do exist, this command is likely being run
-            # as an update, significantly lowering the probability of race conditions.
-            courses_exist = Course.objects.filter(partner=partner).exists()
-            is_threadsafe = courses_exist and waffle.switch_is_active('threaded_metadata_write')
-            max_workers = DataLoaderConfig.get_solo().max_workers
+        # Changes made by worker processes may not have been seen by this process, so cached API responses are
+        # invalidated once all of the loaders have finished.
+        bump_catalog_generation()
 
-            logger.info(
-                'Command is{negation} using threads to write data.'.format(negation='' if is_threadsafe else ' not')
-            )
+        if waffle.switch_is_active(affiliate_window.PREBUILT_FEEDS_SWITCH):
+            # Feeds are built from the search index, so changes queued for it are written first.
+            signal_processor = apps.get_app_config('haystack').signal_processor
+            if isinstance(signal_processor, QueuedSignalProcessor):
+                signal_processor.flush()
+
+            affiliate_window.build_feeds()
+        else:
+            affiliate_window.remove_feeds()
+
+        # TODO Cleanup CourseRun overrides equivalent to the Course values.
 
-            pipeline = (
-                (
-                    (SubjectMarketingSiteDataLoader, partner.marketing_site_url_root, max_workers),
-                    (SchoolMarketingSiteDataLoader, partner.marketing_site_url_root, max_workers),
-                    (SponsorMarketingSiteDataLoader, partner.marketing_site_url_root, max_workers),
-                    (PersonMarketingSiteDataLoader, partner.marketing_site_url_root, max_workers),
-                ),
-                (
-                    (CourseMarketingSiteDataLoader, partner.marketing_site_url_root, max_workers),
-                    (OrganizationsApiDataLoader, partner.organizations_api_url, max_workers),
-                ),
-                (
-                    (CoursesApiDataLoader, partner.courses_api_url, max_workers),
-                ),
-                (
-                    (EcommerceApiDataLoader, partner.ecommerce_api_url, 1),
-                    (ProgramsApiDataLoader, partner.programs_api_url, max_workers),
-                ),
-                (
-                    (XSeriesMarketingSiteDataLoader, partner.marketing_site_url_root, max_workers),
-                ),
+    def get_jobs(self, partner, full):
+        """ Returns the data loaders to run for a partner, in an order which satisfies their dependencies. """
+        kwargs = {}
+
+        # A full refresh also reprocesses records whose data has not changed since the last run.
+        if full:
+            kwargs['full'] = True
+
+        # The Linux kernel implements copy-on-write when fork() is called to create a new
+        # process. Pages that the parent and child processes share, such as the database
+        # connection, are marked read-only. If a write is performed on a read-only page
+        # (e.g., closing the connection), it is then copied, since the memory is no longer
+        # identical between the two processes. This leads to the following behavior:
+        #
+        # 1) Newly forked process
+        #       parent
+        #              -> connection (Django open, MySQL open)
+        #       child
+        #
+        # 2) Child process closes the connection
+        #       parent -> connection (*Django open, MySQL closed*)
+        #       child  -> connection (Django closed, MySQL closed)
+        #
+        # Calling connection.close() from a child process causes the MySQL server to
+        # close a connection which the parent process thinks is still usable. Since
+        # the parent process thinks the connection is still open, Django won't attempt
+        # to open a new one, and the parent ends up running a query on a closed connection.
+        # This results in a 'MySQL server has gone away' error.
+        #
+        # To resolve this, we force Django to reconnect to the database before running any queries.
+        connection.connect()
+
+        # If no courses exist for this partner, this command is likely being run on a
+        # new catalog installation. In that case, we don't want multiple threads racing
+        # to create courses. If courses do exist, this command is likely being run
+        # as an update, significantly lowering the probability of race conditions.
+        courses_exist = Course.objects.filter(partner=partner).exists()
+        is_threadsafe = courses_exist and waffle.switch_is_active('threaded_metadata_write')
+        max_workers = DataLoaderConfig.get_solo().max_workers
+
+        logger.info(
+            'Command is{negation} using threads to write data.'.format(negation='' if is_threadsafe else ' not')
+        )
+
+        # Unless a full refresh was requested, each loader only requests records modified since its
+        # last successful run for this partner.
+        watermarks = {}
+        if not full:
+            watermarks = dict(
+                DataLoaderWatermark.objects.filter(partner=partner).values_list('loader', 'last_run')
             )
 
-            if waffle.switch_is_active('parallel_refresh_pipeline'):
-                for stage in pipeline:
-                    with concurrent.futures.ProcessPoolExecutor() as executor:
-                        for loader_class, api_url, max_workers in stage:
-                            if api_url:
-                                executor.submit(
-                                    execute_parallel_loader,
-                                    loader_class,
-                                    partner,
-                                    api_url,
-                                    access_token,
-                                    token_type,
-                                    max_workers,
-                                    is_threadsafe,
-                                    **kwargs,
-                                )
-            else:
-                # Flatten pipeline and run serially.
-                for loader_class, api_url, max_workers in itertools.chain(*(stage for stage in pipeline)):
-                    if api_url:
-                        execute_loader(
-                            loader_class,
-                            partner,
-                            api_url,
-                            access_token,
-                            token_type,
-                            max_workers,
-                            is_threadsafe,
-                            **kwargs,
-                        )
-
-            # TODO Cleanup CourseRun overrides equivalent to the Course values.
+        # Loaders are listed in an order which satisfies their declared dependencies, so that they can
+        # also be run serially.
+        pipeline = (
+            (SubjectMarketingSiteDataLoader, partner.marketing_site_url_root, max_workers),
+            (SchoolMarketingSiteDataLoader, partner.marketing_site_url_root, max_workers),
+            (SponsorMarketingSiteDataLoader, partner.marketing_site_url_root, max_workers),
+            (PersonMarketingSiteDataLoader, partner.marketing_site_url_root, max_workers),
+            (CourseMarketingSiteDataLoader, partner.marketing_site_url_root, max_workers),
+            (OrganizationsApiDataLoader, partner.organizations_api_url, max_workers),
+            (CoursesApiDataLoader, partner.courses_api_url, max_workers),
+            (EcommerceApiDataLoader, partner.ecommerce_api_url, 1),
+            (ProgramsApiDataLoader, partner.programs_api_url, max_workers),
+            (XSeriesMarketingSiteDataLoader, partner.marketing_site_url_root, max_workers),
+        )
+
+        jobs = []
+        for loader_class, api_url, max_workers in pipeline:
+            if api_url:
+                loader_kwargs = self.get_loader_kwargs(loader_class, watermarks, kwargs)
+                jobs.append(LoaderJob(loader_class, (partner, api_url, max_workers, is_threadsafe), loader_kwargs))
+
+        return jobs
+
+    def get_loader_kwargs(self, loader_class, watermarks, kwargs):
+        """
+        Returns the keyword arguments for a loader, including its high-water mark if one exists and the loader
+        supports it. The mark is moved back by DATA_LOADER_WATERMARK_MARGIN, so that records modified upstream
+        shortly before it, according to a clock behind ours, are not missed.
+        """
+        last_run = watermarks.get(loader_class.__name__)
+
+        if last_run and loader_class.SUPPORTS_MODIFIED_SINCE:
+            modified_since = last_run - datetime.timedelta(seconds=settings.DATA_LOADER_WATERMARK_MARGIN)
+            return dict(kwargs, modified_since=modified_since)
+
+        return kwargs
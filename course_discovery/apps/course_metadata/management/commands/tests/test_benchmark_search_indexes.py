@@ -0,0 +1,66 @@
+import json
+from io import StringIO
+
+import mock
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from course_discovery.apps.course_metadata.management.commands.benchmark_search_indexes import Command
+from course_discovery.apps.course_metadata.models import Course, CourseRun, Program
+from course_discovery.apps.course_metadata.signal_processors import QueuedSignalProcessor
+
+COMMAND_PATH = 'course_discovery.apps.course_metadata.management.commands.benchmark_search_indexes'
+
+
+class BenchmarkSearchIndexesCommandTests(TestCase):
+    def call_command(self, *args):
+        out = StringIO()
+        call_command('benchmark_search_indexes', '--programs=2', '--courses=2', '--course-runs=2', *args, stdout=out)
+        return out.getvalue()
+
+    def test_json(self):
+        """ Verify every field of each index is benchmarked, and the synthetic catalog is removed. """
+        results = json.loads(self.call_command('--json'))
+
+        self.assertEqual([result['index'] for result in results], ['CourseIndex', 'CourseRunIndex', 'ProgramIndex'])
+        self.assertEqual([result['documents'] for result in results], [4, 8, 2])
+
+        for result in results:
+            fields = [row['field'] for row in result['fields']]
+            self.assertEqual(fields[0], '(queryset)')
+            self.assertIn('title', fields)
+            self.assertGreater(result['document_bytes']['mean'], 0)
+            self.assertGreaterEqual(result['document_bytes']['max'], result['document_bytes']['mean'])
+
+        self.assertFalse(Course.objects.exists())
+        self.assertFalse(CourseRun.objects.exists())
+        self.assertFalse(Program.objects.exists())
+
+    def test_table(self):
+        """ Verify a header, a summary row for each index, and a row for each field are displayed. """
+        lines = self.call_command().splitlines()
+
+        self.assertTrue(lines[0].startswith('Index'))
+        self.assertEqual(len([line for line in lines if '(all, ' in line]), 3)
+        self.assertEqual(len([line for line in lines if '(queryset)' in line]), 3)
+
+    def test_invalid_sizes(self):
+        """ Verify the catalog sizes must be positive. """
+        with self.assertRaises(CommandError):
+            call_command('benchmark_search_indexes', '--programs=0')
+
+    def test_without_factories(self):
+        """ Verify an error is raised if the test requirements, which include factory-boy, are not installed. """
+        with mock.patch.object(Command, 'get_factories', side_effect=ImportError):
+            with self.assertRaises(CommandError):
+                self.call_command()
+
+    def test_queued_changes_flushed(self):
+        """ Verify changes queued for the search index are written before its signal handlers are disconnected. """
+        signal_processor = mock.Mock(spec=QueuedSignalProcessor)
+
+        with mock.patch(COMMAND_PATH + '.apps') as mock_apps:
+            mock_apps.get_app_config.return_value.signal_processor = signal_processor
+            self.call_command('--json')
+
+        self.assertEqual([call[0] for call in signal_processor.method_calls], ['flush', 'teardown', 'setup'])
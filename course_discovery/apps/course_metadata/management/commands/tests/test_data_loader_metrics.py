@@ -0,0 +1,69 @@
+import datetime
+import json
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from pytz import UTC
+
+from course_discovery.apps.course_metadata.data_loaders.metrics import DataLoaderMetrics
+from course_discovery.apps.course_metadata.models import DataLoaderRun
+from course_discovery.apps.course_metadata.tests.factories import PartnerFactory
+
+
+class DataLoaderMetricsCommandTests(TestCase):
+    def setUp(self):
+        super(DataLoaderMetricsCommandTests, self).setUp()
+        self.partner = PartnerFactory()
+        self.started = datetime.datetime(2017, 3, 1, tzinfo=UTC)
+
+    def create_run(self, loader, wall_time, days=0):
+        metrics = DataLoaderMetrics()
+        metrics.wall_time = wall_time
+        metrics.record_rows('created', 2)
+        started = self.started + datetime.timedelta(days=days)
+
+        return DataLoaderRun.objects.create(
+            partner=self.partner,
+            loader=loader,
+            started=started,
+            finished=started + datetime.timedelta(seconds=wall_time),
+            succeeded=True,
+            metrics=metrics.report()
+        )
+
+    def call_command(self, *args):
+        out = StringIO()
+        call_command('data_loader_metrics', *args, stdout=out)
+        return out.getvalue()
+
+    def test_table(self):
+        """ Verify the most recent run of each loader is displayed, with the slowest loaders first. """
+        self.create_run('PersonMarketingSiteDataLoader', 300, days=-1)
+        self.create_run('PersonMarketingSiteDataLoader', 30)
+        self.create_run('CoursesApiDataLoader', 60)
+
+        lines = self.call_command().splitlines()
+
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].startswith('Loader'))
+        self.assertTrue(lines[1].startswith('CoursesApiDataLoader'))
+        self.assertTrue(lines[2].startswith('PersonMarketingSiteDataLoader'))
+        self.assertIn(' 30 ', lines[2])
+
+    def test_json(self):
+        """ Verify the requested number of runs are output as JSON, most recent first. """
+        self.create_run('CoursesApiDataLoader', 60, days=-1)
+        self.create_run('CoursesApiDataLoader', 90)
+        self.create_run('PersonMarketingSiteDataLoader', 30)
+
+        data = json.loads(self.call_command('--json', '--runs=2', '--loader=CoursesApiDataLoader'))
+
+        self.assertEqual([run['metrics']['wall_time'] for run in data], [90, 60])
+        self.assertEqual(data[0]['partner'], self.partner.short_code)
+        self.assertEqual(data[0]['metrics']['rows']['created'], 2)
+
+    def test_invalid_runs(self):
+        """ Verify an error is raised if the number of runs is not positive. """
+        with self.assertRaises(CommandError):
+            self.call_command('--runs=0')
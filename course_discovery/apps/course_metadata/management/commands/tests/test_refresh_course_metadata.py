@@ -1,14 +1,26 @@
+import concurrent.futures
+import contextlib
+import datetime
 import json
+import shutil
+import tempfile
 
 import ddt
 import jwt
 import mock
 import responses
+from django.conf import settings
 from django.core.management import CommandError, call_command
-from django.test import TransactionTestCase
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+from pytz import UTC
+from rest_framework.reverse import reverse
 
-from course_discovery.apps.core.tests.factories import PartnerFactory
+from course_discovery.apps.catalogs.models import Catalog
+from course_discovery.apps.catalogs.tests.factories import CatalogFactory
+from course_discovery.apps.core.tests.factories import PartnerFactory, UserFactory
 from course_discovery.apps.core.tests.utils import mock_api_callback
+from course_discovery.apps.course_metadata.data_loaders import AbstractDataLoader
 from course_discovery.apps.course_metadata.data_loaders.api import (
     CoursesApiDataLoader, EcommerceApiDataLoader, OrganizationsApiDataLoader, ProgramsApiDataLoader
 )
@@ -17,10 +29,14 @@ from course_discovery.apps.course_metadata.data_loaders.marketing_site import (
     SponsorMarketingSiteDataLoader, SubjectMarketingSiteDataLoader, XSeriesMarketingSiteDataLoader
 )
 from course_discovery.apps.course_metadata.data_loaders.tests import mock_data
-from course_discovery.apps.course_metadata.management.commands.refresh_course_metadata import execute_parallel_loader
+from course_discovery.apps.course_metadata.management.commands.refresh_course_metadata import (
+    AccessTokens, LoaderJob, execute_jobs, execute_loader
+)
+from course_discovery.apps.course_metadata.models import Course, DataLoaderRun, DataLoaderWatermark
 from course_discovery.apps.course_metadata.tests import toggle_switch
 from course_discovery.apps.course_metadata.tests.factories import CourseFactory
 
+COMMAND_PATH = 'course_discovery.apps.course_metadata.management.commands.refresh_course_metadata'
 JSON = 'application/json'
 ACCESS_TOKEN = str(jwt.encode({'preferred_username': 'bob'}, 'secret'), 'utf-8')
 
@@ -54,7 +70,7 @@ class RefreshCourseMetadataCommandTests(TransactionTestCase):
     def mock_access_token_api(self, requests_mock=None):
         body = {
             'access_token': ACCESS_TOKEN,
-            'expires_in': 30
+            'expires_in': 3600
         }
         requests_mock = requests_mock or responses
 
@@ -130,12 +146,13 @@ class RefreshCourseMetadataCommandTests(TransactionTestCase):
             self.mock_apis()
 
             with mock.patch('course_discovery.apps.course_metadata.management.commands.'
-                            'refresh_course_metadata.execute_loader') as mock_executor:
+                            'refresh_course_metadata.execute_loader', return_value=True) as mock_executor:
                 call_command('refresh_course_metadata')
 
                 # Set up expected calls
                 expected_calls = [mock.call(loader_class, self.partner, api_url,
-                                            ACCESS_TOKEN, 'JWT', max_workers or 7, False, **self.kwargs)
+                                            ACCESS_TOKEN, 'JWT', max_workers or 7, False,
+                                            lookup_cache=mock.ANY, **self.kwargs)
                                   for loader_class, api_url, max_workers in self.pipeline]
                 mock_executor.assert_has_calls(expected_calls)
 
@@ -151,15 +168,278 @@ class RefreshCourseMetadataCommandTests(TransactionTestCase):
             # courses, the command won't risk race conditions between threads trying to
             # create the same course.
             CourseFactory(partner=self.partner)
-            with mock.patch('concurrent.futures.ProcessPoolExecutor.submit') as mock_executor:
+            with mock.patch(COMMAND_PATH + '.execute_jobs', return_value=[]) as mock_execute_jobs:
                 call_command('refresh_course_metadata')
 
-                # Set up expected calls
-                expected_calls = [mock.call(execute_parallel_loader, loader_class,
-                                            self.partner, api_url, ACCESS_TOKEN,
-                                            'JWT', max_workers or 7, True, **self.kwargs)
-                                  for loader_class, api_url, max_workers in self.pipeline]
-                mock_executor.assert_has_calls(expected_calls, any_order=True)
+                executor, jobs, access_tokens = mock_execute_jobs.call_args[0]
+                self.assertIsInstance(executor, concurrent.futures.ProcessPoolExecutor)
+
+                # Set up expected jobs. Access tokens are only retrieved when each job is started.
+                expected_jobs = [LoaderJob(loader_class, (self.partner, api_url, max_workers or 7, True), {})
+                                 for loader_class, api_url, max_workers in self.pipeline]
+                self.assertEqual(jobs, expected_jobs)
+                self.assertEqual(
+                    jobs[0].get_loader_arguments(access_tokens),
+                    ((self.partner, self.partner.marketing_site_url_root, ACCESS_TOKEN, 'JWT', 7, True), self.kwargs)
+                )
+
+    def test_refresh_course_metadata_deletes_orphans_once(self):
+        """ Verify orphaned media are deleted once, after all loaders have run. """
+        with responses.RequestsMock() as rsps:
+            self.mock_access_token_api(rsps)
+
+            with mock.patch(COMMAND_PATH + '.execute_loader') as mock_executor:
+                mock_executor.side_effect = lambda *args, **kwargs: self.assertFalse(mock_delete_orphans.called)
+
+                with mock.patch.object(AbstractDataLoader, 'delete_orphans') as mock_delete_orphans:
+                    call_command('refresh_course_metadata')
+                    mock_delete_orphans.assert_called_once_with()
+
+    @ddt.data(True, False)
+    def test_refresh_course_metadata_builds_affiliate_window_feeds(self, switch_active):
+        """ Verify Affiliate Window feeds are built after all loaders have run if the switch is active, or removed. """
+        toggle_switch('prebuild_affiliate_window_feeds', switch_active)
+
+        with responses.RequestsMock() as rsps:
+            self.mock_access_token_api(rsps)
+
+            with mock.patch(COMMAND_PATH + '.execute_loader') as mock_executor:
+                mock_executor.side_effect = lambda *args, **kwargs: self.assertFalse(mock_build_feeds.called)
+
+                with mock.patch('course_discovery.apps.api.affiliate_window.build_feeds') as mock_build_feeds, \
+                        mock.patch('course_discovery.apps.api.affiliate_window.remove_feeds') as mock_remove_feeds:
+                    call_command('refresh_course_metadata')
+                    self.assertEqual(mock_build_feeds.called, switch_active)
+                    self.assertEqual(mock_remove_feeds.called, not switch_active)
+
+    def test_refresh_course_metadata_serves_prebuilt_feeds(self):
+        """ Verify prebuilt feeds are served after a refresh which does not change the catalog. """
+        toggle_switch('prebuild_affiliate_window_feeds', True)
+        user = UserFactory()
+        catalog = CatalogFactory(viewers=[user])
+
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+
+        with responses.RequestsMock() as rsps, contextlib.ExitStack() as stack:
+            self.mock_access_token_api(rsps)
+
+            # The loaders' bookkeeping (e.g. high-water marks and run metrics) is still written.
+            for loader_class, __, __ in self.pipeline:
+                stack.enter_context(mock.patch.object(loader_class, 'ingest'))
+
+            stack.enter_context(override_settings(MEDIA_ROOT=media_root))
+            stack.enter_context(mock.patch.object(Catalog, 'courses', return_value=Course.objects.none()))
+            call_command('refresh_course_metadata')
+
+            self.assertTrue(DataLoaderRun.objects.exists())
+
+            self.client.force_login(user)
+            url = reverse('api:v1:partners:affiliate_window-detail', kwargs={'pk': catalog.id})
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('ETag', response)
+
+            # Bookkeeping written after the feeds were built (e.g. by another refresh) does not make them stale.
+            for watermark in DataLoaderWatermark.objects.all():
+                watermark.save()
+            DataLoaderRun.objects.all().delete()
+            self.assertIn('ETag', self.client.get(url))
+
+    def test_pipeline_order_satisfies_dependencies(self):
+        """ Verify every loader runs after the loaders it depends on when the pipeline is run serially. """
+        names = [loader_class.__name__ for loader_class, __, __ in self.pipeline]
+
+        for index, (loader_class, __, __) in enumerate(self.pipeline):
+            for dependency in loader_class.DEPENDENCIES:
+                self.assertIn(dependency, names[:index])
+
+    def test_execute_jobs(self):
+        """ Verify each loader starts after its dependencies have finished, and independent loaders overlap. """
+        other_partner = PartnerFactory()
+        jobs = [
+            LoaderJob(loader_class, (partner, api_url), {})
+            for partner in (self.partner, other_partner)
+            for loader_class, api_url, __ in self.pipeline
+            # Dependencies on loaders which are not run should be ignored.
+            if loader_class != SchoolMarketingSiteDataLoader
+        ]
+        events = []
+
+        def record(loader_class, partner, *args, **kwargs):  # pylint: disable=unused-argument
+            events.append(('start', partner.id, loader_class.__name__))
+            events.append(('finish', partner.id, loader_class.__name__))
+
+        with mock.patch(COMMAND_PATH + '.execute_parallel_loader', side_effect=record):
+            with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+                execute_jobs(executor, jobs, self.get_access_tokens())
+
+        self.assertEqual(len(events), 2 * len(jobs))
+
+        for job in jobs:
+            start = events.index(('start',) + job.key)
+            for dependency in job.dependencies:
+                if dependency[1] != SchoolMarketingSiteDataLoader.__name__:
+                    self.assertLess(events.index(('finish',) + dependency), start)
+
+    def test_execute_jobs_with_failures(self):
+        """ Verify loaders which fail, or whose worker fails, are returned, and their dependents still run. """
+        jobs = [
+            LoaderJob(loader_class, (self.partner, api_url), {}) for loader_class, api_url, __ in self.pipeline
+        ]
+        started = []
+
+        def execute(loader_class, *args, **kwargs):  # pylint: disable=unused-argument
+            started.append(loader_class)
+
+            if loader_class == CoursesApiDataLoader:
+                raise Exception
+            return loader_class != EcommerceApiDataLoader
+
+        with mock.patch(COMMAND_PATH + '.execute_parallel_loader', side_effect=execute):
+            with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+                failed = execute_jobs(executor, jobs, self.get_access_tokens())
+
+        self.assertEqual(
+            sorted(job.loader_class.__name__ for job in failed), ['CoursesApiDataLoader', 'EcommerceApiDataLoader']
+        )
+        self.assertEqual(len(started), len(jobs))
+
+    def test_access_tokens(self):
+        """ Verify a partner's access token is retrieved when first needed, and again once it is about to expire. """
+        access_tokens = AccessTokens()
+        expires_at = datetime.datetime.utcnow() + datetime.timedelta(hours=1)
+        path = 'edx_rest_api_client.client.EdxRestApiClient.get_oauth_access_token'
+
+        with mock.patch(path, return_value=(ACCESS_TOKEN, expires_at)) as mock_get_token:
+            self.assertEqual(access_tokens.get(self.partner), ACCESS_TOKEN)
+            self.assertEqual(access_tokens.get(self.partner), ACCESS_TOKEN)
+            self.assertEqual(mock_get_token.call_count, 1)
+
+            # Tokens are retrieved for each partner, and replaced if they expire within the margin.
+            other_partner = PartnerFactory()
+            mock_get_token.return_value = (ACCESS_TOKEN, datetime.datetime.utcnow() + datetime.timedelta(minutes=1))
+            access_tokens.get(other_partner)
+            access_tokens.get(other_partner)
+            self.assertEqual(mock_get_token.call_count, 3)
+
+    def get_access_tokens(self):
+        return mock.Mock(token_type='JWT', get=mock.Mock(return_value=ACCESS_TOKEN))
+
+    def test_execute_jobs_with_circular_dependencies(self):
+        """ Verify an error is raised if the loaders' dependencies can never be satisfied. """
+        first = mock.Mock(__name__='FirstDataLoader', DEPENDENCIES=('SecondDataLoader',))
+        second = mock.Mock(__name__='SecondDataLoader', DEPENDENCIES=('FirstDataLoader',))
+        jobs = [LoaderJob(first, (self.partner,), {}), LoaderJob(second, (self.partner,), {})]
+
+        with concurrent.futures.ThreadPoolExecutor() as executor:
+            with self.assertRaises(CommandError):
+                execute_jobs(executor, jobs, mock.Mock())
+
+    @ddt.data(True, False)
+    def test_refresh_course_metadata_with_watermark(self, full):
+        """
+        Verify loaders which support them receive their high-water marks, less a margin for clock skew, unless a
+        full refresh is requested.
+        """
+        last_run = datetime.datetime(2017, 1, 1, tzinfo=UTC)
+        for loader_class in (CourseMarketingSiteDataLoader, CoursesApiDataLoader):
+            DataLoaderWatermark.objects.create(partner=self.partner, loader=loader_class.__name__, last_run=last_run)
+        command_args = ['--full'] if full else []
+
+        with responses.RequestsMock() as rsps:
+            self.mock_access_token_api(rsps)
+            self.mock_apis()
+
+            with mock.patch('course_discovery.apps.course_metadata.management.commands.'
+                            'refresh_course_metadata.execute_loader', return_value=True) as mock_executor:
+                call_command('refresh_course_metadata', *command_args)
+
+                expected_calls = []
+                for loader_class, api_url, max_workers in self.pipeline:
+                    kwargs = dict(self.kwargs)
+                    if full:
+                        kwargs['full'] = True
+                    elif loader_class == CourseMarketingSiteDataLoader:
+                        kwargs['modified_since'] = last_run - datetime.timedelta(
+                            seconds=settings.DATA_LOADER_WATERMARK_MARGIN
+                        )
+
+                    expected_calls.append(mock.call(loader_class, self.partner, api_url,
+                                                    ACCESS_TOKEN, 'JWT', max_workers or 7, False,
+                                                    lookup_cache=mock.ANY, **kwargs))
+                mock_executor.assert_has_calls(expected_calls)
+
+    def test_execute_loader_records_watermark(self):
+        """ Verify a successful loader run advances the high-water mark, and a failed run does not. """
+        api_url = self.partner.courses_api_url
+
+        with mock.patch.object(CoursesApiDataLoader, 'ingest', side_effect=Exception):
+            execute_loader(CoursesApiDataLoader, self.partner, api_url, ACCESS_TOKEN, 'JWT')
+        self.assertFalse(DataLoaderWatermark.objects.exists())
+
+        with mock.patch.object(CoursesApiDataLoader, 'ingest'):
+            execute_loader(CoursesApiDataLoader, self.partner, api_url, ACCESS_TOKEN, 'JWT')
+        self.assertTrue(
+            DataLoaderWatermark.objects.filter(partner=self.partner, loader='CoursesApiDataLoader').exists()
+        )
+
+    def test_execute_loader_with_failed_records(self):
+        """ Verify the high-water mark is not advanced if any records failed to load, so they are requested again. """
+        api_url = self.partner.courses_api_url
+
+        def ingest(loader):
+            loader.metrics.record_rows('failed')
+
+        with mock.patch.object(CoursesApiDataLoader, 'ingest', autospec=True, side_effect=ingest):
+            execute_loader(CoursesApiDataLoader, self.partner, api_url, ACCESS_TOKEN, 'JWT')
+
+        self.assertFalse(DataLoaderWatermark.objects.exists())
+        self.assertTrue(DataLoaderRun.objects.get(partner=self.partner, loader='CoursesApiDataLoader').succeeded)
+
+    def test_execute_loader_records_run(self):
+        """ Verify the metrics collected by each loader run are persisted, whether or not the run succeeded. """
+        api_url = self.partner.courses_api_url
+
+        def ingest(loader):
+            CourseFactory(partner=self.partner)
+            loader.metrics.record_rows('created')
+
+        with mock.patch.object(CoursesApiDataLoader, 'ingest', autospec=True, side_effect=ingest):
+            execute_loader(CoursesApiDataLoader, self.partner, api_url, ACCESS_TOKEN, 'JWT')
+
+        with mock.patch.object(CoursesApiDataLoader, 'ingest', side_effect=Exception):
+            execute_loader(CoursesApiDataLoader, self.partner, api_url, ACCESS_TOKEN, 'JWT')
+
+        failed, succeeded = DataLoaderRun.objects.filter(partner=self.partner, loader='CoursesApiDataLoader')
+        self.assertTrue(succeeded.succeeded)
+        self.assertFalse(failed.succeeded)
+        self.assertLessEqual(succeeded.started, succeeded.finished)
+        self.assertEqual(succeeded.metrics['rows']['created'], 1)
+        self.assertGreater(succeeded.metrics['queries'], 0)
+
+    def test_execute_loader_deletes_expired_runs(self):
+        """ Verify the metrics of the loader's runs which are older than the retention period are deleted. """
+        api_url = self.partner.courses_api_url
+        now = timezone.now()
+        retained = now - datetime.timedelta(days=settings.DATA_LOADER_RUN_RETENTION_DAYS - 1)
+        expired = now - datetime.timedelta(days=settings.DATA_LOADER_RUN_RETENTION_DAYS + 1)
+
+        for started in (retained, expired):
+            DataLoaderRun.objects.create(
+                partner=self.partner, loader='CoursesApiDataLoader', started=started, finished=started
+            )
+        other = DataLoaderRun.objects.create(
+            partner=self.partner, loader='OrganizationsApiDataLoader', started=expired, finished=expired
+        )
+
+        with mock.patch.object(CoursesApiDataLoader, 'ingest'):
+            execute_loader(CoursesApiDataLoader, self.partner, api_url, ACCESS_TOKEN, 'JWT')
+
+        runs = DataLoaderRun.objects.filter(partner=self.partner, loader='CoursesApiDataLoader')
+        self.assertEqual(runs.count(), 2)
+        self.assertFalse(runs.filter(started=expired).exists())
+        self.assertTrue(DataLoaderRun.objects.filter(pk=other.pk).exists())
 
     def test_refresh_course_metadata_with_invalid_partner_code(self):
         """ Verify an error is raised if an invalid partner code is passed on the command line. """
@@ -200,3 +480,10 @@ class RefreshCourseMetadataCommandTests(TransactionTestCase):
                 )
                 expected_calls = [mock.call('%s failed!', loader_class.__name__) for loader_class in loader_classes]
                 mock_logger.exception.assert_has_calls(expected_calls)
+
+                # The failed loaders are also summarized once all of the loaders have run.
+                failed = ', '.join(
+                    '{} for partner [{}]'.format(loader_class.__name__, self.partner.short_code)
+                    for loader_class in loader_classes
+                )
+                mock_logger.error.assert_called_once_with('Data loaders failed: %s.', failed)
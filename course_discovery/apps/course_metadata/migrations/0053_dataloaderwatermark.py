@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2017-03-20 14:02
+from __future__ import unicode_literals
+
+import django.db.models.deletion
+import django_extensions.db.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_auto_20161101_2207'),
+        ('course_metadata', '0052_create_course_run_publication_switch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataLoaderWatermark',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', django_extensions.db.fields.CreationDateTimeField(auto_now_add=True, verbose_name='created')),
+                ('modified', django_extensions.db.fields.ModificationDateTimeField(auto_now=True, verbose_name='modified')),
+                ('loader', models.CharField(max_length=255)),
+                ('last_run', models.DateTimeField()),
+                ('partner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.Partner')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='dataloaderwatermark',
+            unique_together=set([('partner', 'loader')]),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2017-03-22 10:41
+from __future__ import unicode_literals
+
+import django.db.models.deletion
+import django_extensions.db.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_auto_20161101_2207'),
+        ('course_metadata', '0053_dataloaderwatermark'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataLoaderFingerprint',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', django_extensions.db.fields.CreationDateTimeField(auto_now_add=True, verbose_name='created')),
+                ('modified', django_extensions.db.fields.ModificationDateTimeField(auto_now=True, verbose_name='modified')),
+                ('loader', models.CharField(max_length=255)),
+                ('key', models.CharField(help_text='Upstream identifier of the record (e.g. course run key).', max_length=255)),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('partner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.Partner')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='dataloaderfingerprint',
+            unique_together=set([('partner', 'loader', 'key')]),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2017-03-24 09:12
+from __future__ import unicode_literals
+
+import django.db.models.deletion
+import django_extensions.db.fields
+import jsonfield.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_auto_20161101_2207'),
+        ('course_metadata', '0054_dataloaderfingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataLoaderRun',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', django_extensions.db.fields.CreationDateTimeField(auto_now_add=True, verbose_name='created')),
+                ('modified', django_extensions.db.fields.ModificationDateTimeField(auto_now=True, verbose_name='modified')),
+                ('loader', models.CharField(max_length=255)),
+                ('started', models.DateTimeField()),
+                ('finished', models.DateTimeField()),
+                ('succeeded', models.BooleanField(default=False)),
+                ('metrics', jsonfield.fields.JSONField(default=dict, help_text='Pages fetched, HTTP latency, queries issued, rows loaded, etc.')),
+                ('partner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.Partner')),
+            ],
+            options={
+                'ordering': ('-started',),
+                'get_latest_by': 'started',
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations
+
+SWITCH = 'prebuild_affiliate_window_feeds'
+
+
+def create_switch(apps, schema_editor):
+    """Create the prebuild_affiliate_window_feeds switch."""
+    Switch = apps.get_model('waffle', 'Switch')
+    Switch.objects.get_or_create(name=SWITCH, defaults={'active': False})
+
+
+def delete_switch(apps, schema_editor):
+    """Delete the prebuild_affiliate_window_feeds switch."""
+    Switch = apps.get_model('waffle', 'Switch')
+    Switch.objects.filter(name=SWITCH).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course_metadata', '0055_dataloaderrun'),
+        ('waffle', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_switch, reverse_code=delete_switch),
+    ]
@@ -1,7 +1,10 @@
 import datetime
+import functools
+import inspect
 import itertools
 import logging
-from collections import defaultdict
+from collections import defaultdict, namedtuple
+from contextlib import contextmanager
 from urllib.parse import urljoin
 from uuid import uuid4
 
@@ -15,6 +18,7 @@ from django.utils.translation import ugettext_lazy as _
 from django_extensions.db.fields import AutoSlugField
 from django_extensions.db.models import TimeStampedModel
 from haystack.query import SearchQuerySet
+from jsonfield.fields import JSONField
 from solo.models import SingletonModel
 from sortedm2m.fields import SortedManyToManyField
 from stdimage.models import StdImageField
@@ -33,6 +37,34 @@ from course_discovery.apps.ietf_language_tags.models import LanguageTag
 
 logger = logging.getLogger(__name__)
 
+# The values of CourseRun.has_enrollable_paid_seats and CourseRun.get_paid_seat_enrollment_end.
+PaidSeatAvailability = namedtuple('PaidSeatAvailability', ['has_enrollable_paid_seats', 'paid_seat_enrollment_end'])
+
+
+def snapshot_cached(func):
+    """
+    Decorates a Program property, so that it is computed at most once while the program's snapshot is active
+    (see Program.snapshot). It is applied beneath @property.
+
+    Generator properties are materialized, so that the walk they make is not repeated, but they still return an
+    iterator. Outside of a snapshot, the property is computed on each access.
+    """
+    is_generator = inspect.isgeneratorfunction(func)
+
+    @functools.wraps(func)
+    def wrapper(self):
+        if self.snapshot_values is None:
+            return func(self)
+
+        if func.__name__ not in self.snapshot_values:
+            value = func(self)
+            self.snapshot_values[func.__name__] = tuple(value) if is_generator else value
+
+        value = self.snapshot_values[func.__name__]
+        return iter(value) if is_generator else value
+
+    return wrapper
+
 
 class AbstractNamedModel(TimeStampedModel):
     """ Abstract base class for models with only a name field. """
@@ -400,44 +432,70 @@ class CourseRun(TimeStampedModel):
 
     def _enrollable_paid_seats(self):
         """
-        Return a QuerySet that may be used to fetch the enrollable paid Seats (Seats with price > 0 and no
-        prerequisites) associated with this CourseRun.
+        Return a list of the enrollable paid Seats (Seats with price > 0 and no prerequisites) associated with this
+        CourseRun.
+
+        Seats are filtered in Python, rather than by the database, so that prefetched seats are used.
+        """
+        return [seat for seat in self.seats.all() if Seat.is_enrollable_paid_seat(seat.type, seat.price)]
+
+    @staticmethod
+    def compute_paid_seat_availability(end, enrollment_end, upgrade_deadlines):
+        """
+        Compute the paid seat availability of a CourseRun from its dates, and the upgrade deadlines of its enrollable
+        paid Seats.
+
+        This allows the availability of many CourseRuns to be computed from rows read in bulk, rather than from
+        model instances.
+
+        Arguments:
+            end (datetime): End of the CourseRun.
+            enrollment_end (datetime): End of enrollment in the CourseRun.
+            upgrade_deadlines (list): Upgrade deadline of each enrollable paid Seat of the CourseRun.
+
+        Returns:
+            PaidSeatAvailability
         """
-        return self.seats.exclude(type__in=Seat.SEATS_WITH_PREREQUISITES).filter(price__gt=0.0)
+        if len(upgrade_deadlines) == 0:
+            # Enrollable paid seats are not available for this CourseRun.
+            return PaidSeatAvailability(False, None)
+
+        # An unenrolled user may not enroll and purchase paid seats after the course has ended.
+        deadline = end
+
+        # An unenrolled user may not enroll and purchase paid seats after enrollment has ended.
+        if enrollment_end and (deadline is None or enrollment_end < deadline):
+            deadline = enrollment_end
+
+        # We consider Null values to be > than non-Null values, so the latest upgrade_deadline is only
+        # meaningful if every Seat has one.
+        if None not in upgrade_deadlines:
+            upgrade_deadline = max(upgrade_deadlines)
+            if deadline is None or upgrade_deadline < deadline:
+                deadline = upgrade_deadline
+
+        return PaidSeatAvailability(True, deadline)
+
+    def get_paid_seat_availability(self):
+        """
+        Return the values of has_enrollable_paid_seats and get_paid_seat_enrollment_end, computed together.
+        """
+        upgrade_deadlines = [seat.upgrade_deadline for seat in self._enrollable_paid_seats()]
+        return self.compute_paid_seat_availability(self.end, self.enrollment_end, upgrade_deadlines)
 
     def has_enrollable_paid_seats(self):
         """
         Return a boolean indicating whether or not enrollable paid Seats (Seats with price > 0 and no prerequisites)
         are available for this CourseRun.
         """
-        return len(self._enrollable_paid_seats()[:1]) > 0
+        return len(self._enrollable_paid_seats()) > 0
 
     def get_paid_seat_enrollment_end(self):
         """
         Return the final date for which an unenrolled user may enroll and purchase a paid Seat for this CourseRun, or
         None if the date is unknown or enrollable paid Seats are not available.
         """
-        seats = list(self._enrollable_paid_seats().order_by('-upgrade_deadline'))
-        if len(seats) == 0:
-            # Enrollable paid seats are not available for this CourseRun.
-            return None
-
-        # An unenrolled user may not enroll and purchase paid seats after the course has ended.
-        deadline = self.end
-
-        # An unenrolled user may not enroll and purchase paid seats after enrollment has ended.
-        if self.enrollment_end and (deadline is None or self.enrollment_end < deadline):
-            deadline = self.enrollment_end
-
-        # Note that even though we're sorting in descending order by upgrade_deadline, we will need to look at
-        # both the first and last record in the result set to determine which Seat has the latest upgrade_deadline.
-        # We consider Null values to be > than non-Null values, and Null values may sort to the top or bottom of
-        # the result set, depending on the DB backend.
-        latest_seat = seats[-1] if seats[-1].upgrade_deadline is None else seats[0]
-        if latest_seat.upgrade_deadline and (deadline is None or latest_seat.upgrade_deadline < deadline):
-            deadline = latest_seat.upgrade_deadline
-
-        return deadline
+        return self.get_paid_seat_availability().paid_seat_enrollment_end
 
     def enrollable_seats(self, types):
         """
@@ -478,8 +536,8 @@ class CourseRun(TimeStampedModel):
         """
         program_statuses_to_exclude = (ProgramStatus.Unpublished, ProgramStatus.Deleted)
         associated_programs = []
-        for program in self.programs.exclude(status__in=program_statuses_to_exclude):
-            if self not in program.excluded_course_runs.all():
+        for program in self.programs.all():
+            if program.status not in program_statuses_to_exclude and self not in program.excluded_course_runs.all():
                 associated_programs.append(program)
         return [program.type.name for program in associated_programs]
 
@@ -663,6 +721,11 @@ class Seat(TimeStampedModel):
             ('course_run', 'type', 'currency', 'credit_provider')
         )
 
+    @classmethod
+    def is_enrollable_paid_seat(cls, seat_type, price):
+        """ Return a boolean indicating whether a Seat is paid, and may be purchased without prerequisites. """
+        return seat_type not in cls.SEATS_WITH_PREREQUISITES and price > 0
+
 
 class Endorsement(TimeStampedModel):
     endorser = models.ForeignKey(Person, blank=False, null=False)
@@ -786,10 +849,34 @@ class Program(TimeStampedModel):
 
     objects = ProgramQuerySet.as_manager()
 
+    # Values of properties decorated with snapshot_cached, while a snapshot is active.
+    snapshot_values = None
+
     def __str__(self):
         return self.title
 
+    @contextmanager
+    def snapshot(self):
+        """
+        Memoizes the program's course runs and seats, and the fields derived from them, until the context is exited.
+
+        Several fields (e.g. seat_types, price_ranges and start) are derived by walking the program's courses,
+        course runs and seats. Serializing a program reads most of them, so the walk is made once for each field
+        unless a snapshot is active. Changes made to the program's relations while the snapshot is active are not
+        reflected by its fields.
+        """
+        if self.snapshot_values is not None:
+            yield
+            return
+
+        self.snapshot_values = {}
+        try:
+            yield
+        finally:
+            self.snapshot_values = None
+
     @property
+    @snapshot_cached
     def is_program_eligible_for_one_click_purchase(self):
         """
         Checks if the program is eligible for one click purchase.
@@ -837,6 +924,7 @@ class Program(TimeStampedModel):
         return None
 
     @property
+    @snapshot_cached
     def course_runs(self):
         """
         Warning! Only call this method after retrieving programs from `ProgramSerializer.prefetch_queryset()`.
@@ -850,10 +938,12 @@ class Program(TimeStampedModel):
                     yield run
 
     @property
+    @snapshot_cached
     def languages(self):
         return set(course_run.language for course_run in self.course_runs if course_run.language is not None)
 
     @property
+    @snapshot_cached
     def transcript_languages(self):
         languages = [course_run.transcript_languages.all() for course_run in self.course_runs]
         languages = itertools.chain.from_iterable(languages)
@@ -866,6 +956,7 @@ class Program(TimeStampedModel):
         return set(subjects)
 
     @property
+    @snapshot_cached
     def seats(self):
         applicable_seat_types = set(seat_type.slug for seat_type in self.type.applicable_seat_types.all())
 
@@ -875,6 +966,7 @@ class Program(TimeStampedModel):
                     yield seat
 
     @property
+    @snapshot_cached
     def seat_types(self):
         return set(seat.type for seat in self.seats)
 
@@ -951,6 +1043,7 @@ class Program(TimeStampedModel):
         return currencies_with_total
 
     @property
+    @snapshot_cached
     def price_ranges(self):
         currencies = defaultdict(list)
         for seat in self.seats:
@@ -970,6 +1063,7 @@ class Program(TimeStampedModel):
         return price_ranges
 
     @property
+    @snapshot_cached
     def start(self):
         """ Start datetime, calculated by determining the earliest start datetime of all related course runs. """
         if self.course_runs:
@@ -981,6 +1075,7 @@ class Program(TimeStampedModel):
         return None
 
     @property
+    @snapshot_cached
     def staff(self):
         staff = [course_run.staff.all() for course_run in self.course_runs]
         staff = itertools.chain.from_iterable(staff)
@@ -1041,3 +1136,63 @@ class DataLoaderConfig(SingletonModel):
     Configuration for data loaders used in the refresh_course_metadata command.
     """
     max_workers = models.PositiveSmallIntegerField(default=7)
+
+
+class DataLoaderWatermark(TimeStampedModel):
+    """
+    High-water mark recording the start of the last successful run of a data loader for a partner.
+
+    Data loaders use this value to request only those records modified since the previous run.
+    """
+    partner = models.ForeignKey(Partner)
+    loader = models.CharField(max_length=255)
+    last_run = models.DateTimeField()
+
+    class Meta(object):
+        unique_together = (
+            ('partner', 'loader'),
+        )
+
+    def __str__(self):
+        return '{loader}: {last_run}'.format(loader=self.loader, last_run=self.last_run)
+
+
+class DataLoaderFingerprint(TimeStampedModel):
+    """
+    Hash of the upstream data last successfully processed by a data loader for a single record.
+
+    Data loaders use this value to skip records that have not changed since they were last processed.
+    """
+    partner = models.ForeignKey(Partner)
+    loader = models.CharField(max_length=255)
+    key = models.CharField(max_length=255, help_text=_('Upstream identifier of the record (e.g. course run key).'))
+    fingerprint = models.CharField(max_length=64)
+
+    class Meta(object):
+        unique_together = (
+            ('partner', 'loader', 'key'),
+        )
+
+    def __str__(self):
+        return '{loader}: {key}'.format(loader=self.loader, key=self.key)
+
+
+class DataLoaderRun(TimeStampedModel):
+    """
+    Metrics describing a single run of a data loader for a partner.
+
+    These are used to identify the loaders which dominate the run time of a refresh, and regressions between runs.
+    """
+    partner = models.ForeignKey(Partner)
+    loader = models.CharField(max_length=255)
+    started = models.DateTimeField()
+    finished = models.DateTimeField()
+    succeeded = models.BooleanField(default=False)
+    metrics = JSONField(default=dict, help_text=_('Pages fetched, HTTP latency, queries issued, rows loaded, etc.'))
+
+    class Meta(object):
+        get_latest_by = 'started'
+        ordering = ('-started',)
+
+    def __str__(self):
+        return '{loader}: {started}'.format(loader=self.loader, started=self.started)
@@ -1,10 +1,12 @@
 import json
 
+from django.db.models import Prefetch
 from haystack import indexes
 from opaque_keys.edx.keys import CourseKey
 
+from course_discovery.apps.course_metadata.catalog_graph import CatalogGraph
 from course_discovery.apps.course_metadata.choices import CourseRunStatus, ProgramStatus
-from course_discovery.apps.course_metadata.models import Course, CourseRun, Program
+from course_discovery.apps.course_metadata.models import Course, CourseRun, Organization, Program
 
 # http://django-haystack.readthedocs.io/en/v2.5.0/boost.html#field-boost
 # Boost title over all other parameters (multiplicative)
@@ -21,16 +23,31 @@ ORG_FIELD_BOOST = TITLE_FIELD_BOOST
 
 
 class OrganizationsMixin:
-    def format_organization(self, organization):
+    @classmethod
+    def prefetch_organizations(cls, lookup):
+        """ Returns a Prefetch of the organizations at the given lookup, with the data needed to format them. """
+        return Prefetch(lookup, queryset=Organization.objects.select_related('partner').prefetch_related('tags'))
+
+    def _memoize_organization(self, name, organization, func):
+        graph = CatalogGraph.get_current()
+        return graph.memoize_organization(name, organization, func) if graph else func(organization)
+
+    def _format_organization(self, organization):
         return '{key}: {name}'.format(key=organization.key, name=organization.name)
 
-    def format_organization_body(self, organization):
+    def _format_organization_body(self, organization):
         # Deferred to prevent a circular import:
         # course_discovery.apps.api.serializers -> course_discovery.apps.course_metadata.search_indexes
         from course_discovery.apps.api.serializers import OrganizationSerializer
 
         return json.dumps(OrganizationSerializer(organization).data)
 
+    def format_organization(self, organization):
+        return self._memoize_organization('name', organization, self._format_organization)
+
+    def format_organization_body(self, organization):
+        return self._memoize_organization('body', organization, self._format_organization_body)
+
     def _prepare_organizations(self, organizations):
         return [self.format_organization(organization) for organization in organizations]
 
@@ -52,6 +69,8 @@ class BaseIndex(indexes.SearchIndex):
     aggregation_key = indexes.CharField()
     content_type = indexes.CharField(faceted=True)
     text = indexes.CharField(document=True, use_template=True)
+    # Used by update_index to determine which documents can be copied from the current index.
+    modified = indexes.DateTimeField(model_attr='modified')
 
     def prepare_content_type(self, obj):  # pylint: disable=unused-argument
         return self.model.__name__.lower()
@@ -113,6 +132,19 @@ class CourseIndex(BaseCourseIndex, indexes.Indexable):
 
     prerequisites = indexes.MultiValueField(faceted=True)
 
+    def index_queryset(self, using=None):
+        return super(CourseIndex, self).index_queryset(using=using).select_related(
+            'partner', 'level_type'
+        ).prefetch_related(
+            'course_runs',
+            'expected_learning_items',
+            'prerequisites',
+            'programs',
+            'subjects',
+            self.prefetch_organizations('authoring_organizations'),
+            self.prefetch_organizations('sponsoring_organizations'),
+        )
+
     def prepare_aggregation_key(self, obj):
         return 'course:{}'.format(obj.key)
 
@@ -159,15 +191,43 @@ class CourseRunIndex(BaseCourseIndex, indexes.Indexable):
     has_enrollable_paid_seats = indexes.BooleanField(null=False)
     paid_seat_enrollment_end = indexes.DateTimeField(null=True)
 
+    def index_queryset(self, using=None):
+        queryset = super(CourseRunIndex, self).index_queryset(using=using).select_related(
+            'course__level_type', 'course__partner', 'language'
+        ).prefetch_related(
+            'seats',
+            'staff',
+            'transcript_languages',
+            'course__prerequisites',
+            'course__subjects',
+            self.prefetch_organizations('course__authoring_organizations'),
+            self.prefetch_organizations('course__sponsoring_organizations'),
+        )
+
+        if CatalogGraph.get_current() is None:
+            queryset = queryset.prefetch_related(Prefetch(
+                'course__programs',
+                queryset=Program.objects.select_related('type').prefetch_related('excluded_course_runs')
+            ))
+
+        return queryset
+
     def prepare_aggregation_key(self, obj):
         # Aggregate CourseRuns by Course key since that is how we plan to dedup CourseRuns on the marketing site.
         return 'courserun:{}'.format(obj.course.key)
 
+    def _get_paid_seat_availability(self, obj):
+        graph = CatalogGraph.get_current()
+        if graph and obj.pk in graph.course_run_paid_seat_availability:
+            return graph.course_run_paid_seat_availability[obj.pk]
+
+        return obj.get_paid_seat_availability()
+
     def prepare_has_enrollable_paid_seats(self, obj):
-        return obj.has_enrollable_paid_seats()
+        return self._get_paid_seat_availability(obj).has_enrollable_paid_seats
 
     def prepare_paid_seat_enrollment_end(self, obj):
-        return obj.get_paid_seat_enrollment_end()
+        return self._get_paid_seat_availability(obj).paid_seat_enrollment_end
 
     def prepare_partner(self, obj):
         return obj.course.partner.short_code
@@ -203,6 +263,10 @@ class CourseRunIndex(BaseCourseIndex, indexes.Indexable):
         return obj.marketing_url
 
     def prepare_program_types(self, obj):
+        graph = CatalogGraph.get_current()
+        if graph and obj.pk in graph.course_run_program_types:
+            return graph.course_run_program_types[obj.pk]
+
         return obj.program_types
 
     def prepare_staff_uuids(self, obj):
@@ -232,10 +296,33 @@ class ProgramIndex(BaseIndex, indexes.Indexable, OrganizationsMixin):
     card_image_url = indexes.CharField(model_attr='card_image_url', null=True)
     status = indexes.CharField(model_attr='status', faceted=True)
     partner = indexes.CharField(model_attr='partner__short_code', null=True, faceted=True)
-    start = indexes.DateTimeField(model_attr='start', null=True, faceted=True)
-    seat_types = indexes.MultiValueField(model_attr='seat_types', null=True, faceted=True)
+    start = indexes.DateTimeField(null=True, faceted=True)
+    seat_types = indexes.MultiValueField(null=True, faceted=True)
     published = indexes.BooleanField(null=False, faceted=True)
 
+    def index_queryset(self, using=None):
+        course_runs = CourseRun.objects.select_related('language').prefetch_related('transcript_languages')
+
+        # Seats and staff are only needed if they are not read from the catalog graph.
+        if CatalogGraph.get_current() is None:
+            course_runs = course_runs.prefetch_related('seats', 'staff')
+        courses = Course.objects.prefetch_related('subjects', Prefetch('course_runs', queryset=course_runs))
+
+        queryset = super(ProgramIndex, self).index_queryset(using=using)
+
+        return queryset.select_related('type', 'partner').prefetch_related(
+            Prefetch('courses', queryset=courses),
+            'corporate_endorsements__individual_endorsements__endorser',
+            'excluded_course_runs',
+            'expected_learning_items',
+            'faq',
+            'individual_endorsements__endorser',
+            'job_outlook_items',
+            'type__applicable_seat_types',
+            self.prefetch_organizations('authoring_organizations'),
+            self.prefetch_organizations('credit_backing_organizations'),
+        )
+
     def prepare_aggregation_key(self, obj):
         return 'program:{}'.format(obj.uuid)
 
@@ -245,12 +332,32 @@ class ProgramIndex(BaseIndex, indexes.Indexable, OrganizationsMixin):
     def prepare_organizations(self, obj):
         return self.prepare_authoring_organizations(obj) + self.prepare_credit_backing_organizations(obj)
 
+    def _get_graph_data(self, obj):
+        graph = CatalogGraph.get_current()
+        return graph.programs.get(obj.pk) if graph else None
+
     def prepare_subject_uuids(self, obj):
+        data = self._get_graph_data(obj)
+        if data:
+            return data.subject_uuids
+
         return [str(subject.uuid) for course in obj.courses.all() for subject in course.subjects.all()]
 
     def prepare_staff_uuids(self, obj):
+        data = self._get_graph_data(obj)
+        if data:
+            return data.staff_uuids
+
         return [str(staff.uuid) for course_run in obj.course_runs for staff in course_run.staff.all()]
 
+    def prepare_start(self, obj):
+        data = self._get_graph_data(obj)
+        return data.start if data else obj.start
+
+    def prepare_seat_types(self, obj):
+        data = self._get_graph_data(obj)
+        return data.seat_types if data else obj.seat_types
+
     def prepare_credit_backing_organizations(self, obj):
         return self._prepare_organizations(obj.credit_backing_organizations.all())
 
@@ -0,0 +1,348 @@
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.core.signals import request_finished
+from django.db import connection
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from elasticsearch.helpers import bulk
+from haystack.signals import BaseSignalProcessor
+from haystack.utils import get_identifier
+
+from course_discovery.apps.course_metadata.models import Course, CourseRun, Program, Seat
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeQueue(object):
+    """ Changes queued by a single thread. """
+
+    def __init__(self):
+        # Maps models to the primary keys of changed objects. Seat changes are recorded as course run changes.
+        self.changes = defaultdict(set)
+        # Primary keys of the courses of deleted course runs.
+        self.deleted_course_run_course_ids = set()
+        # Identifiers of the documents of deleted objects.
+        self.removals = set()
+
+    def __len__(self):
+        return (
+            sum(len(pks) for pks in self.changes.values()) + len(self.deleted_course_run_course_ids) +
+            len(self.removals)
+        )
+
+    def update(self, other):
+        """ Adds the changes held by another queue to this one. """
+        for model, pks in other.changes.items():
+            self.changes[model].update(pks)
+
+        self.deleted_course_run_course_ids.update(other.deleted_course_run_course_ids)
+        self.removals.update(other.removals)
+
+
+class QueuedSignalProcessor(BaseSignalProcessor):
+    """
+    Queues changes to courses, course runs, seats and programs, and writes the affected documents to the search
+    index in bulk.
+
+    A change to an object also affects the documents which include data about it. For example, a Seat change
+    affects its CourseRun's seat types, and those of any Program containing the course. These documents are
+    determined when the queue is flushed, so that repeated changes to related objects are coalesced.
+
+    Each thread queues its changes separately, so that a thread only writes the changes it made, once its own
+    transaction has completed. A thread's queue is flushed when it holds BATCH_SIZE changes (outside of a
+    transaction), and at the end of each request. The queues of all threads are flushed when the process exits.
+
+    Changes which fail to be written are requeued. Full queues, and those of requests, are not flushed again for
+    RETRY_DELAY seconds, so that an unavailable search index does not delay every save and request.
+
+    Changes are also held while the index is rebuilt (see `rebuilding`), since documents written to the current
+    index would be lost once the alias is pointed at the new one. They are written by the first flush after the
+    rebuild has finished.
+
+    This processor is not enabled by default. Set HAYSTACK_SIGNAL_PROCESSOR to
+    'course_discovery.apps.course_metadata.signal_processors.QueuedSignalProcessor' to enable it.
+    """
+    BATCH_SIZE = 500
+    MODELS = (Course, CourseRun, Program, Seat)
+    REBUILD_CACHE_KEY = 'search_index_rebuilds'
+    # Rebuilds which have not finished after this many seconds (e.g. because the process was killed) are ignored.
+    REBUILD_TIMEOUT = 60 * 60 * 6
+    RETRY_DELAY = 60
+
+    def __init__(self, connections, connection_router):
+        self.lock = threading.RLock()
+        # Maps thread identifiers to the changes queued by each thread.
+        self.queues = {}
+        # Time before which queues are only flushed explicitly, following a failure to write the changes.
+        self.retry_at = 0
+        super(QueuedSignalProcessor, self).__init__(connections, connection_router)
+
+    @classmethod
+    def get_through_models(cls):
+        """ Returns the intermediary models of the many-to-many relations of MODELS, from either side. """
+        through_models = set()
+
+        for model in cls.MODELS:
+            through_models.update(field.remote_field.through for field in model._meta.many_to_many)
+            through_models.update(
+                relation.through for relation in model._meta.related_objects if relation.many_to_many
+            )
+
+        return through_models
+
+    def setup(self):
+        for model in self.MODELS:
+            post_save.connect(self.handle_save, sender=model)
+            pre_delete.connect(self.handle_pre_delete, sender=model)
+            post_delete.connect(self.handle_delete, sender=model)
+
+        # Only relation changes sent by the intermediary models are received, so that models which are not
+        # indexed can still be deleted without sending signals.
+        for through_model in self.get_through_models():
+            m2m_changed.connect(self.handle_m2m_changed, sender=through_model)
+
+        request_finished.connect(self.handle_request_finished)
+        atexit.register(self.flush)
+
+    def teardown(self):
+        for model in self.MODELS:
+            post_save.disconnect(self.handle_save, sender=model)
+            pre_delete.disconnect(self.handle_pre_delete, sender=model)
+            post_delete.disconnect(self.handle_delete, sender=model)
+
+        for through_model in self.get_through_models():
+            m2m_changed.disconnect(self.handle_m2m_changed, sender=through_model)
+
+        request_finished.disconnect(self.handle_request_finished)
+        atexit.unregister(self.flush)
+
+    @classmethod
+    @contextmanager
+    def rebuilding(cls):
+        """
+        Marks the search index as being rebuilt within the block, so that processors hold their queued changes
+        until it has finished.
+
+        Rebuilds are recorded in the cache, so processors only see those of processes sharing the cache.
+        """
+        cache.add(cls.REBUILD_CACHE_KEY, 0, cls.REBUILD_TIMEOUT)
+
+        try:
+            cache.incr(cls.REBUILD_CACHE_KEY)
+        except ValueError:
+            # The rebuilds recorded by other processes expired in the meantime.
+            cache.set(cls.REBUILD_CACHE_KEY, 1, cls.REBUILD_TIMEOUT)
+
+        try:
+            yield
+        finally:
+            try:
+                cache.decr(cls.REBUILD_CACHE_KEY)
+            except ValueError:
+                pass
+
+    @classmethod
+    def is_rebuilding(cls):
+        """ Returns True if the search index is being rebuilt. """
+        return bool(cache.get(cls.REBUILD_CACHE_KEY))
+
+    @property
+    def queue(self):
+        """ Returns the changes queued by the calling thread. """
+        with self.lock:
+            return self.queues.setdefault(threading.get_ident(), ChangeQueue())
+
+    @property
+    def changes(self):
+        return self.queue.changes
+
+    @property
+    def deleted_course_run_course_ids(self):
+        return self.queue.deleted_course_run_course_ids
+
+    @property
+    def removals(self):
+        return self.queue.removals
+
+    def reset(self):
+        """ Discards the changes queued by the calling thread. """
+        with self.lock:
+            self.queues.pop(threading.get_ident(), None)
+
+    def queue_size(self):
+        """ Returns the number of changes queued by the calling thread. """
+        return len(self.queue)
+
+    def _enqueue(self, instance):
+        if isinstance(instance, Seat):
+            self.changes[CourseRun].add(instance.course_run_id)
+        else:
+            self.changes[type(instance)].add(instance.pk)
+
+    def _flush_if_full(self):
+        # Documents are not written during a transaction, since it may be rolled back.
+        if self.queue_size() >= self.BATCH_SIZE and not connection.in_atomic_block and time.time() >= self.retry_at:
+            self.flush_thread()
+
+    def handle_save(self, sender, instance, **kwargs):  # pylint: disable=unused-argument
+        with self.lock:
+            self._enqueue(instance)
+
+        self._flush_if_full()
+
+    def handle_pre_delete(self, sender, instance, **kwargs):  # pylint: disable=unused-argument
+        # The relations needed to find the affected documents are deleted along with the object.
+        with self.lock:
+            if isinstance(instance, Course):
+                self.changes[Program].update(instance.programs.values_list('pk', flat=True))
+            elif isinstance(instance, Program):
+                self.changes[Course].update(instance.courses.values_list('pk', flat=True))
+
+    def handle_delete(self, sender, instance, **kwargs):  # pylint: disable=unused-argument
+        with self.lock:
+            if isinstance(instance, Seat):
+                self._enqueue(instance)
+            else:
+                self.removals.add(get_identifier(instance))
+
+                if isinstance(instance, CourseRun):
+                    self.deleted_course_run_course_ids.add(instance.course_id)
+
+        self._flush_if_full()
+
+    def handle_m2m_changed(self, sender, instance, action, model, pk_set, **kwargs):  # pylint: disable=unused-argument
+        if action not in ('post_add', 'post_remove', 'post_clear'):
+            return
+
+        with self.lock:
+            if isinstance(instance, self.MODELS):
+                self._enqueue(instance)
+
+            if model in (Course, CourseRun, Program) and pk_set:
+                self.changes[model].update(pk_set)
+
+        self._flush_if_full()
+
+    def handle_request_finished(self, sender, **kwargs):  # pylint: disable=unused-argument
+        if time.time() >= self.retry_at:
+            self.flush_thread()
+
+    @staticmethod
+    def get_affected_objects(changes, deleted_course_run_course_ids):
+        """
+        Determines the documents affected by the queued changes.
+
+        Arguments:
+            changes (dict): Maps models to the primary keys of changed objects. Seat changes are recorded as
+                course run changes.
+            deleted_course_run_course_ids (set): Primary keys of the courses of deleted course runs.
+
+        Returns:
+            dict: Maps models to the primary keys of the objects whose documents should be updated.
+        """
+        # A program's courses include its title, and their course runs its type. Changes to a course
+        # affect all of its course runs.
+        course_ids = changes[Course] | set(
+            Program.courses.through.objects.filter(program_id__in=changes[Program]).values_list('course_id', flat=True)
+        )
+        course_run_ids = changes[CourseRun] | set(
+            CourseRun.objects.filter(course_id__in=course_ids).values_list('pk', flat=True)
+        )
+
+        # Changes to a course run only affect its course, and the programs containing the course.
+        course_ids |= deleted_course_run_course_ids | set(
+            CourseRun.objects.filter(pk__in=changes[CourseRun]).values_list('course_id', flat=True)
+        )
+        program_ids = changes[Program] | set(
+            Program.courses.through.objects.filter(course_id__in=course_ids).values_list('program_id', flat=True)
+        )
+
+        return {
+            Course: course_ids,
+            CourseRun: course_run_ids,
+            Program: program_ids,
+        }
+
+    def flush(self):
+        """ Writes the documents affected by the changes queued by all threads to the search index. """
+        with self.lock:
+            queues, self.queues = list(self.queues.values()), {}
+
+        self._write(queues)
+
+    def flush_thread(self):
+        """ Writes the documents affected by the changes queued by the calling thread to the search index. """
+        with self.lock:
+            queue = self.queues.pop(threading.get_ident(), None)
+
+        self._write([queue] if queue else [])
+
+    def _write(self, queues):
+        pending = ChangeQueue()
+        for queue in queues:
+            pending.update(queue)
+
+        count = len(pending)
+        if not count:
+            return
+
+        if self.is_rebuilding():
+            logger.info('The search index is being rebuilt. [%d] queued changes will be written once it has finished.',
+                        count)
+
+            with self.lock:
+                self.queue.update(pending)
+                self.retry_at = time.time() + self.RETRY_DELAY
+
+            return
+
+        try:
+            affected = self.get_affected_objects(pending.changes, pending.deleted_course_run_course_ids)
+
+            for using in self.connections.connections_info:
+                self.update_backend(using, affected, pending.removals)
+        except Exception:  # pylint: disable=broad-except
+            # Writing the documents again is idempotent, so the changes are requeued to be retried by the next flush.
+            logger.exception('Failed to update the search index with [%d] queued changes. They will be retried.', count)
+
+            with self.lock:
+                self.queue.update(pending)
+                self.retry_at = time.time() + self.RETRY_DELAY
+
+    def update_backend(self, using, affected, removals):
+        backend = self.connections[using].get_backend()
+        unified_index = self.connections[using].get_unified_index()
+
+        removals = set(removals)
+
+        for model, pks in affected.items():
+            index = unified_index.get_index(model)
+            pks = sorted(pks)
+
+            for start in range(0, len(pks), backend.batch_size):
+                batch = pks[start:start + backend.batch_size]
+                objects = list(index.index_queryset(using=using).filter(pk__in=batch))
+                backend.update(index, objects)
+
+                # Objects which are no longer indexed (e.g. because they no longer match the index's queryset) have
+                # their documents removed.
+                excluded = set(batch) - {obj.pk for obj in objects}
+                removals.update(get_identifier(model(pk=pk)) for pk in excluded)
+
+        if removals:
+            actions = [
+                {'_op_type': 'delete', '_index': backend.index_name, '_type': 'modelresult', '_id': identifier}
+                for identifier in removals
+            ]
+            # Documents which were never indexed cannot be deleted, and are ignored.
+            bulk(backend.conn, actions, raise_on_error=False)
+
+        logger.info(
+            'Updated [%d] documents and removed [%d] documents from the [%s] search index.',
+            sum(len(pks) for pks in affected.values()), len(removals), using
+        )
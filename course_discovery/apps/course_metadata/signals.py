@@ -1,8 +1,11 @@
 import waffle
-from django.db.models.signals import pre_delete
+from django.apps import apps
+from django.db import connection, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
 from django.dispatch import receiver
 
-from course_discovery.apps.course_metadata.models import Program
+from course_discovery.apps.api.cache import bump_catalog_generation, is_catalog_model
+from course_discovery.apps.course_metadata.models import AbstractMediaModel, Program
 from course_discovery.apps.course_metadata.publishers import ProgramMarketingSitePublisher
 
 
@@ -16,3 +19,41 @@ def delete_program(sender, instance, **kwargs):  # pylint: disable=unused-argume
     if is_publishable:
         publisher = ProgramMarketingSitePublisher(instance.partner)
         publisher.delete_obj(instance)
+
+
+def bump_catalog_generation_on_change(sender, **kwargs):  # pylint: disable=unused-argument
+    """ Bumps the catalog generation when a catalog model is saved or deleted, or its relations change. """
+    action = kwargs.get('action')
+    if action and not action.startswith('post_'):
+        return
+
+    bump_catalog_generation()
+
+    # Other processes may cache responses built from the data committed before the transaction. The generation
+    # is bumped again once the transaction is committed, so that those responses are not reused.
+    if connection.in_atomic_block:
+        transaction.on_commit(bump_catalog_generation)
+
+
+def connect_catalog_receivers():
+    """
+    Connects bump_catalog_generation_on_change to the signals of each catalog model.
+
+    Django cannot fast delete (i.e. delete without loading each row) instances of models with delete or m2m_changed
+    receivers, so receivers are connected to each model rather than to all senders. Deleting media does not
+    change the catalog, unless the deletion cascades to the models referencing them, which send their own
+    signals. Deletions of relations send m2m_changed, rather than post_delete.
+    """
+    for model in apps.get_models(include_auto_created=True):
+        if not is_catalog_model(model):
+            continue
+
+        post_save.connect(bump_catalog_generation_on_change, sender=model)
+
+        if model._meta.auto_created:
+            m2m_changed.connect(bump_catalog_generation_on_change, sender=model)
+        elif not issubclass(model, AbstractMediaModel):
+            post_delete.connect(bump_catalog_generation_on_change, sender=model)
+
+
+connect_catalog_receivers()
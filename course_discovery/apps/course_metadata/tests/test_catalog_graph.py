@@ -0,0 +1,146 @@
+import datetime
+import re
+import threading
+
+import mock
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from pytz import UTC
+
+from course_discovery.apps.course_metadata.catalog_graph import CatalogGraph
+from course_discovery.apps.course_metadata.choices import ProgramStatus
+from course_discovery.apps.course_metadata.models import SeatType
+from course_discovery.apps.course_metadata.search_indexes import CourseIndex, CourseRunIndex, ProgramIndex
+from course_discovery.apps.course_metadata.tests.factories import (
+    CourseFactory, CourseRunFactory, OrganizationFactory, PersonFactory, ProgramFactory, ProgramTypeFactory,
+    SeatFactory, SubjectFactory
+)
+
+
+class CatalogGraphTests(TestCase):
+    def setUp(self):
+        super(CatalogGraphTests, self).setUp()
+        verified, __ = SeatType.objects.get_or_create(name='Verified')
+        program_type = ProgramTypeFactory(applicable_seat_types=[verified])
+        self.programs = [
+            ProgramFactory(type=program_type),
+            ProgramFactory(type=program_type, status=ProgramStatus.Unpublished),
+            ProgramFactory(type=program_type),
+        ]
+        self.course_runs = []
+
+        for index in range(3):
+            course = CourseFactory(subjects=SubjectFactory.create_batch(2))
+            start = datetime.datetime(2017, 1, index + 1, tzinfo=UTC)
+
+            for course_run in CourseRunFactory.create_batch(2, course=course, start=start,
+                                                            staff=PersonFactory.create_batch(2)):
+                SeatFactory(course_run=course_run, type='verified')
+                SeatFactory(course_run=course_run, type='audit')
+                self.course_runs.append(course_run)
+
+            for program in self.programs[index:]:
+                program.courses.add(course)
+
+        self.programs[0].excluded_course_runs.add(self.course_runs[0])  # pylint: disable=no-member
+
+    def test_build(self):
+        """ Verify the denormalized data matches the data derived from the models. """
+        graph = CatalogGraph.build()
+
+        for program in self.programs:
+            data = graph.programs[program.pk]
+            self.assertEqual(
+                data.staff_uuids,
+                [str(staff.uuid) for course_run in program.course_runs for staff in course_run.staff.all()]
+            )
+            self.assertEqual(
+                data.subject_uuids,
+                [str(subject.uuid) for course in program.courses.all() for subject in course.subjects.all()]  # pylint: disable=no-member
+            )
+            self.assertEqual(data.seat_types, program.seat_types)
+            self.assertEqual(data.start, program.start)
+
+        for course_run in self.course_runs:
+            self.assertCountEqual(graph.course_run_program_types[course_run.pk], course_run.program_types)
+
+    def test_build_query_count(self):
+        """ Verify the graph is built with a fixed number of queries. """
+        with self.assertNumQueries(8):
+            CatalogGraph.build()
+
+    def test_activate(self):
+        """ Verify the graph is used by the search indexes, while active, to prepare identical documents. """
+        course_run_index = CourseRunIndex()
+        program_index = ProgramIndex()
+        expected_course_runs = [course_run_index.full_prepare(obj) for obj in course_run_index.index_queryset()]
+        expected_programs = [program_index.full_prepare(obj) for obj in program_index.index_queryset()]
+
+        with CatalogGraph.activate() as graph:
+            self.assertIs(CatalogGraph.get_current(), graph)
+            course_runs = [course_run_index.full_prepare(obj) for obj in course_run_index.index_queryset()]
+
+            with CaptureQueriesContext(connection) as context:
+                programs = [program_index.full_prepare(obj) for obj in program_index.index_queryset()]
+
+        self.assertIsNone(CatalogGraph.get_current())
+        self.assertEqual(course_runs, expected_course_runs)
+        self.assertEqual(programs, expected_programs)
+        # Seats and staff are read from the graph, rather than loaded for each program's course runs.
+        seat_queries = [
+            query for query in context.captured_queries if re.search(r'\bcourse_metadata_seat\b', query['sql'])
+        ]
+        self.assertEqual(seat_queries, [])
+
+    def test_activate_is_thread_local(self):
+        """ Verify the graph is not used by the search indexes of other threads. """
+        graphs = []
+        thread = threading.Thread(target=lambda: graphs.append(CatalogGraph.get_current()))
+
+        with CatalogGraph.activate():
+            thread.start()
+            thread.join()
+
+        self.assertEqual(graphs, [None])
+
+    def test_objects_created_after_build(self):
+        """ Verify objects which are not in the graph are prepared from their models. """
+        with CatalogGraph.activate():
+            program = ProgramFactory(courses=[self.course_runs[0].course])
+            course_run = CourseRunFactory(course=self.course_runs[0].course)
+
+            self.assertEqual(ProgramIndex().prepare_start(program), program.start)
+            self.assertEqual(CourseRunIndex().prepare_program_types(course_run), course_run.program_types)
+
+    def test_memoize_organization(self):
+        """ Verify data derived from an organization is computed once for each version of the organization. """
+        graph = CatalogGraph()
+        organization = OrganizationFactory()
+        func = mock.Mock(side_effect=lambda organization: organization.name)
+
+        self.assertEqual(graph.memoize_organization('name', organization, func), organization.name)
+        self.assertEqual(graph.memoize_organization('name', organization, func), organization.name)
+        self.assertEqual(func.call_count, 1)
+
+        organization.name = 'Renamed'
+        organization.save()
+        self.assertEqual(graph.memoize_organization('name', organization, func), 'Renamed')
+        self.assertEqual(func.call_count, 2)
+
+    def test_organization_bodies_are_memoized(self):
+        """ Verify organizations are serialized once per indexing run, regardless of how many documents use them. """
+        organization = OrganizationFactory()
+        for course_run in self.course_runs:
+            course_run.course.authoring_organizations.add(organization)
+
+        indexes = (CourseIndex(), CourseRunIndex(), ProgramIndex())
+        serializer_path = 'course_discovery.apps.api.serializers.OrganizationSerializer'
+
+        with CatalogGraph.activate():
+            with mock.patch(serializer_path, return_value=mock.Mock(data={})) as mock_serializer:
+                for index in indexes:
+                    for obj in index.index_queryset():
+                        index.prepare_authoring_organization_bodies(obj)
+
+        self.assertEqual(mock_serializer.call_count, 1)
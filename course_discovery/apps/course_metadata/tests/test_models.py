@@ -1,3 +1,4 @@
+import collections
 import datetime
 import itertools
 from decimal import Decimal
@@ -15,6 +16,7 @@ from course_discovery.apps.core.models import Currency
 from course_discovery.apps.core.tests.helpers import make_image_file
 from course_discovery.apps.core.tests.mixins import ElasticsearchTestMixin
 from course_discovery.apps.core.utils import SearchQuerySetWrapper
+from course_discovery.apps.course_metadata.catalog_graph import CatalogGraph
 from course_discovery.apps.course_metadata.choices import ProgramStatus
 from course_discovery.apps.course_metadata.models import (
     FAQ, AbstractMediaModel, AbstractNamedModel, AbstractValueModel, CorporateEndorsement, Course, CourseRun,
@@ -214,6 +216,7 @@ class CourseRunTests(TestCase):
         for seat_type, price in seat_config:
             factories.SeatFactory.create(course_run=course_run, type=seat_type, price=price)
         self.assertEqual(course_run.has_enrollable_paid_seats(), expected_result)
+        self.assert_paid_seat_availability_computed_in_bulk(course_run)
 
     @ddt.data(
         # Case 1: Return None when there are no enrollable paid Seats.
@@ -268,6 +271,13 @@ class CourseRunTests(TestCase):
 
         expected_result = parse(expected_result) if expected_result else None
         self.assertEqual(course_run.get_paid_seat_enrollment_end(), expected_result)
+        self.assert_paid_seat_availability_computed_in_bulk(course_run)
+
+    def assert_paid_seat_availability_computed_in_bulk(self, course_run):
+        """ Verify the availability computed from rows read in bulk matches the availability of the model. """
+        expected = (course_run.has_enrollable_paid_seats(), course_run.get_paid_seat_enrollment_end())
+        self.assertEqual(course_run.get_paid_seat_availability(), expected)
+        self.assertEqual(CatalogGraph.build().course_run_paid_seat_availability[course_run.pk], expected)
 
     def test_publication_disabled(self):
         """
@@ -667,6 +677,38 @@ class ProgramTests(TestCase):
         self.program.courses.add(course_run.course)
         self.assertIsNone(self.program.start)
 
+    def test_snapshot(self):
+        """ Verify derived fields are computed once while a snapshot is active, and on each access otherwise. """
+        program = self.create_program_with_seats()
+        fields = (
+            'course_runs', 'seats', 'seat_types', 'languages', 'transcript_languages', 'price_ranges', 'start',
+            'staff', 'is_program_eligible_for_one_click_purchase',
+        )
+
+        def get_values():
+            # Iterator properties are read as lists, so that they can be compared.
+            return {
+                field: list(value) if isinstance(value, collections.Iterator) else value
+                for field, value in ((field, getattr(program, field)) for field in fields)
+            }
+
+        expected = get_values()
+
+        with program.snapshot():
+            self.assertEqual(get_values(), expected)
+
+            # Nested snapshots share the memoized values of the outermost snapshot.
+            with program.snapshot():
+                with self.assertNumQueries(0):
+                    self.assertEqual(get_values(), expected)
+
+            with self.assertNumQueries(0):
+                self.assertEqual(get_values(), expected)
+
+        program.courses.clear()
+        self.assertEqual(list(program.course_runs), [])
+        self.assertEqual(program.price_ranges, [])
+
     def test_price_ranges(self):
         """ Verify the price_ranges property of the program is returning expected price values """
         program = self.create_program_with_seats()
@@ -0,0 +1,60 @@
+import ddt
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from course_discovery.apps.course_metadata.search_indexes import CourseIndex, CourseRunIndex, ProgramIndex
+from course_discovery.apps.course_metadata.tests.factories import (
+    CourseFactory, CourseRunFactory, OrganizationFactory, ProgramFactory, SeatFactory, SubjectFactory
+)
+
+
+@ddt.ddt
+class IndexQuerysetTests(TestCase):
+    def create_program(self):
+        organizations = OrganizationFactory.create_batch(2)
+        course = CourseFactory(
+            authoring_organizations=organizations[:1],
+            sponsoring_organizations=organizations[1:],
+            subjects=SubjectFactory.create_batch(2)
+        )
+        course_runs = CourseRunFactory.create_batch(2, course=course)
+
+        for course_run in course_runs:
+            SeatFactory(course_run=course_run, type='verified')
+            SeatFactory(course_run=course_run, type='credit')
+
+        return ProgramFactory(
+            courses=[course],
+            excluded_course_runs=course_runs[:1],
+            authoring_organizations=organizations[:1],
+            credit_backing_organizations=organizations[1:]
+        )
+
+    def count_queries(self, index):
+        with CaptureQueriesContext(connection) as context:
+            for obj in index.index_queryset():
+                index.full_prepare(obj)
+
+        return len(context)
+
+    @ddt.data(CourseIndex, CourseRunIndex, ProgramIndex)
+    def test_query_count_is_constant(self, index_class):
+        """ Verify the number of queries needed to prepare documents does not depend on the number of documents. """
+        index = index_class()
+        self.create_program()
+        expected = self.count_queries(index)
+
+        for __ in range(3):
+            self.create_program()
+
+        self.assertEqual(self.count_queries(index), expected)
+
+    def test_prepared_data_matches_unprefetched_data(self):
+        """ Verify the prefetched querysets produce the same documents as unprefetched model instances. """
+        self.create_program()
+
+        for index in (CourseIndex(), CourseRunIndex(), ProgramIndex()):
+            for obj in index.index_queryset():
+                unprefetched = index.model.objects.get(pk=obj.pk)
+                self.assertEqual(index.full_prepare(obj), index.full_prepare(unprefetched))
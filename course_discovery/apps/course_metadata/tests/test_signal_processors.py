@@ -0,0 +1,220 @@
+import threading
+
+import mock
+from django.core.signals import request_finished
+from django.db.models.signals import m2m_changed
+from django.test import TestCase
+from haystack import connection_router, connections
+
+from course_discovery.apps.course_metadata.models import Course, CourseRun, Program, Video
+from course_discovery.apps.course_metadata.signal_processors import QueuedSignalProcessor
+from course_discovery.apps.course_metadata.tests.factories import (
+    CourseFactory, CourseRunFactory, ProgramFactory, SeatFactory
+)
+
+SIGNAL_PROCESSORS_PATH = 'course_discovery.apps.course_metadata.signal_processors'
+
+
+class QueuedSignalProcessorTests(TestCase):
+    def setUp(self):
+        super(QueuedSignalProcessorTests, self).setUp()
+        self.course = CourseFactory()
+        self.course_runs = CourseRunFactory.create_batch(2, course=self.course)
+        self.program = ProgramFactory(courses=[self.course])
+        self.other_course_run = CourseRunFactory()
+
+        self.processor = QueuedSignalProcessor(connections, connection_router)
+        self.addCleanup(self.processor.teardown)
+
+    def get_affected_objects(self):
+        return self.processor.get_affected_objects(
+            self.processor.changes, self.processor.deleted_course_run_course_ids
+        )
+
+    def assert_affected_objects(self, courses=(), course_runs=(), programs=()):
+        expected = {
+            Course: {course.pk for course in courses},
+            CourseRun: {course_run.pk for course_run in course_runs},
+            Program: {program.pk for program in programs},
+        }
+        self.assertEqual(self.get_affected_objects(), expected)
+
+    def test_seat_change(self):
+        """ Verify a Seat change affects its CourseRun, the run's Course, and the Programs containing the Course. """
+        seat = SeatFactory(course_run=self.course_runs[0])
+        self.assert_affected_objects([self.course], self.course_runs[:1], [self.program])
+
+        self.processor.reset()
+        seat.delete()
+        self.assert_affected_objects([self.course], self.course_runs[:1], [self.program])
+
+    def test_course_change(self):
+        """ Verify a Course change affects all of its CourseRuns. """
+        self.course.save()
+        self.assert_affected_objects([self.course], self.course_runs, [self.program])
+
+    def test_program_change(self):
+        """ Verify a Program change affects its Courses and their CourseRuns. """
+        self.program.save()
+        self.assert_affected_objects([self.course], self.course_runs, [self.program])
+
+        self.processor.reset()
+        self.program.courses.remove(self.course)  # pylint: disable=no-member
+        self.assert_affected_objects([self.course], self.course_runs, [self.program])
+
+    def test_course_run_deletion(self):
+        """ Verify deleting a CourseRun removes its document, and affects its Course and the Course's Programs. """
+        course_run = self.course_runs[0]
+        identifier = 'course_metadata.courserun.{}'.format(course_run.pk)
+        course_run.delete()
+
+        self.assertEqual(self.processor.removals, {identifier})
+        self.assert_affected_objects([self.course], programs=[self.program])
+
+    def test_program_deletion(self):
+        """ Verify deleting a Program affects the documents of the Courses it contained. """
+        identifier = 'course_metadata.program.{}'.format(self.program.pk)
+        self.program.delete()
+
+        self.assertEqual(self.processor.removals, {identifier})
+        self.assert_affected_objects([self.course], self.course_runs)
+
+    def test_flush(self):
+        """ Verify flushing writes the affected documents, and empties the queue. """
+        self.other_course_run.save()
+
+        with mock.patch.object(QueuedSignalProcessor, 'update_backend') as mock_update_backend:
+            self.processor.flush()
+            self.processor.flush()
+
+        expected = {Course: {self.other_course_run.course.pk}, CourseRun: {self.other_course_run.pk}, Program: set()}
+        mock_update_backend.assert_called_once_with('default', expected, set())
+        self.assertEqual(self.processor.queue_size(), 0)
+
+    def test_flush_error(self):
+        """ Verify errors writing to the search index are logged, rather than raised, and the changes requeued. """
+        self.course.save()
+        expected = self.get_affected_objects()
+
+        with mock.patch.object(QueuedSignalProcessor, 'update_backend', side_effect=Exception):
+            with mock.patch(SIGNAL_PROCESSORS_PATH + '.logger') as mock_logger:
+                self.processor.flush()
+
+        self.assertTrue(mock_logger.exception.called)
+        self.assertEqual(self.get_affected_objects(), expected)
+
+        # Queues are only flushed explicitly until the retry delay has passed.
+        with mock.patch.object(QueuedSignalProcessor, 'update_backend') as mock_update_backend:
+            request_finished.send(sender=self.__class__)
+            self.assertFalse(mock_update_backend.called)
+
+            self.processor.flush()
+            mock_update_backend.assert_called_once_with('default', expected, set())
+
+        self.assertEqual(self.processor.queue_size(), 0)
+
+    def test_flush_while_rebuilding(self):
+        """ Verify changes are held while the search index is rebuilt, and written once it has finished. """
+        self.other_course_run.save()
+        expected = self.get_affected_objects()
+
+        with mock.patch.object(QueuedSignalProcessor, 'update_backend') as mock_update_backend:
+            with QueuedSignalProcessor.rebuilding():
+                with QueuedSignalProcessor.rebuilding():
+                    self.processor.flush()
+
+                # Changes are held until every rebuild has finished.
+                self.assertTrue(QueuedSignalProcessor.is_rebuilding())
+                self.processor.flush()
+                self.assertFalse(mock_update_backend.called)
+                self.assertEqual(self.get_affected_objects(), expected)
+
+            self.assertFalse(QueuedSignalProcessor.is_rebuilding())
+            self.processor.flush()
+            mock_update_backend.assert_called_once_with('default', expected, set())
+
+    def test_flush_when_full(self):
+        """ Verify the queue is flushed once it is full, unless a transaction is in progress. """
+        self.processor.BATCH_SIZE = 2
+
+        with mock.patch.object(QueuedSignalProcessor, 'flush_thread') as mock_flush_thread:
+            self.course.save()
+            self.program.save()
+            self.assertFalse(mock_flush_thread.called)
+
+            with mock.patch(SIGNAL_PROCESSORS_PATH + '.connection', in_atomic_block=False):
+                self.other_course_run.save()
+            self.assertTrue(mock_flush_thread.called)
+
+    def test_flush_on_request_finished(self):
+        """ Verify the queue is flushed at the end of each request. """
+        with mock.patch.object(QueuedSignalProcessor, 'flush_thread') as mock_flush_thread:
+            request_finished.send(sender=self.__class__)
+
+        self.assertTrue(mock_flush_thread.called)
+
+    def test_queues_are_thread_local(self):
+        """ Verify a thread only flushes the changes it queued, unless the changes of all threads are flushed. """
+        # The test database cannot be written to by other threads, so the save is only signalled.
+        thread = threading.Thread(
+            target=self.processor.handle_save, kwargs={'sender': CourseRun, 'instance': self.other_course_run}
+        )
+        thread.start()
+        thread.join()
+        self.course.save()
+
+        with mock.patch.object(QueuedSignalProcessor, 'update_backend') as mock_update_backend:
+            self.processor.flush_thread()
+            course_run_ids = {course_run.pk for course_run in self.course_runs}
+            mock_update_backend.assert_called_once_with(
+                'default', {Course: {self.course.pk}, CourseRun: course_run_ids, Program: {self.program.pk}}, set()
+            )
+
+            mock_update_backend.reset_mock()
+            self.processor.flush()
+            mock_update_backend.assert_called_once_with(
+                'default',
+                {Course: {self.other_course_run.course.pk}, CourseRun: {self.other_course_run.pk}, Program: set()},
+                set()
+            )
+
+    def test_update_backend(self):
+        """ Verify the affected documents are written, and removed documents deleted, in bulk. """
+        backend = mock.Mock(batch_size=1, index_name='catalog')
+        affected = {Course: {self.course.pk}, CourseRun: {course_run.pk for course_run in self.course_runs}}
+
+        with mock.patch.object(connections['default'], 'get_backend', return_value=backend):
+            with mock.patch(SIGNAL_PROCESSORS_PATH + '.bulk') as mock_bulk:
+                self.processor.update_backend('default', affected, {'course_metadata.courserun.0'})
+
+        updated = [list(call[0][1]) for call in backend.update.call_args_list]
+        self.assertCountEqual(updated, [[self.course]] + [[course_run] for course_run in self.course_runs])
+
+        actions = mock_bulk.call_args[0][1]
+        self.assertEqual(actions, [
+            {'_op_type': 'delete', '_index': 'catalog', '_type': 'modelresult', '_id': 'course_metadata.courserun.0'}
+        ])
+
+    def test_update_backend_with_excluded_objects(self):
+        """ Verify the documents of affected objects which are no longer in their index's queryset are removed. """
+        backend = mock.Mock(batch_size=10, index_name='catalog')
+        index = connections['default'].get_unified_index().get_index(CourseRun)
+        excluded, included = self.course_runs
+        queryset = CourseRun.objects.exclude(pk=excluded.pk)
+
+        with mock.patch.object(connections['default'], 'get_backend', return_value=backend):
+            with mock.patch.object(index, 'index_queryset', return_value=queryset):
+                with mock.patch(SIGNAL_PROCESSORS_PATH + '.bulk') as mock_bulk:
+                    self.processor.update_backend('default', {CourseRun: {excluded.pk, included.pk}}, set())
+
+        backend.update.assert_called_once_with(index, [included])
+        self.assertEqual(mock_bulk.call_args[0][1], [{
+            '_op_type': 'delete', '_index': 'catalog', '_type': 'modelresult',
+            '_id': 'course_metadata.courserun.{}'.format(excluded.pk),
+        }])
+
+    def test_m2m_changed_senders(self):
+        """ Verify relation changes are only received from the intermediary models of the indexed models. """
+        self.assertTrue(m2m_changed.has_listeners(Program.courses.through))
+        self.assertTrue(m2m_changed.has_listeners(Course.authoring_organizations.through))
+        self.assertFalse(m2m_changed.has_listeners(Video))
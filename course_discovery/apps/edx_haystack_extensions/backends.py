@@ -1,4 +1,13 @@
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from elasticsearch import TransportError
+from elasticsearch.helpers import BulkIndexError
 from haystack.backends.elasticsearch_backend import ElasticsearchSearchBackend, ElasticsearchSearchEngine
+from haystack.constants import ID
+from haystack.exceptions import SkipDocument
+from haystack.utils import get_identifier
 
 from course_discovery.apps.edx_haystack_extensions.elasticsearch_boost_config import get_elasticsearch_boost_config
 
@@ -72,6 +81,158 @@ class NonClearingSearchBackendMixin(object):
                       'for this search service.', self.__class__.__name__)
 
 
+class StreamingBulkSearchBackendMixin(object):
+    """
+    Mixin that streams documents to Elasticsearch in bulk requests, rather than preparing every document of a
+    batch before writing any of them.
+
+    Documents are prepared one at a time, and written in bulk requests limited by both the number of documents
+    (BATCH_SIZE) and their serialized size (BULK_MAX_CHUNK_BYTES). Up to BULK_THREAD_COUNT requests are sent
+    concurrently, unless the documents fit in a single request, which is sent by the calling thread. Documents
+    rejected because the cluster is overloaded (HTTP 429) are retried up to BULK_MAX_RETRIES times, waiting
+    BULK_RETRY_BACKOFF seconds before the first retry and twice as long before each subsequent one. All of these
+    are read from the connection options.
+    """
+
+    def __init__(self, connection_alias, **connection_options):
+        super(StreamingBulkSearchBackendMixin, self).__init__(connection_alias, **connection_options)
+        self.bulk_max_chunk_bytes = connection_options.get('BULK_MAX_CHUNK_BYTES', 10 * 1024 * 1024)
+        self.bulk_thread_count = connection_options.get('BULK_THREAD_COUNT', 2)
+        self.bulk_max_retries = connection_options.get('BULK_MAX_RETRIES', 5)
+        self.bulk_retry_backoff = connection_options.get('BULK_RETRY_BACKOFF', 2)
+
+    def update(self, index, iterable, commit=True):
+        if not self.setup_complete:
+            try:
+                self.setup()
+            except TransportError as e:
+                if not self.silently_fail:
+                    raise
+
+                self.log.error('Failed to add documents to Elasticsearch: %s', e, exc_info=True)
+                return
+
+        chunks = self.chunk_documents(self.prepare_documents(index, iterable))
+        first_chunks = list(itertools.islice(chunks, 2))
+
+        if len(first_chunks) < 2:
+            # Small updates (e.g. those made by the signal processor) are not worth starting a pool of threads for.
+            errors = [error for chunk in first_chunks for error in self.send_chunk(chunk)]
+        else:
+            errors = self.send_chunks(itertools.chain(first_chunks, chunks))
+
+        if errors:
+            raise BulkIndexError('{} document(s) failed to index.'.format(len(errors)), errors)
+
+        if commit:
+            self.conn.indices.refresh(index=self.index_name)
+
+    def send_chunks(self, chunks):
+        """
+        Sends a bulk request for each chunk, using a pool of BULK_THREAD_COUNT threads.
+
+        Returns:
+            list: Items of the documents which failed to index.
+        """
+        errors = []
+
+        with ThreadPoolExecutor(max_workers=self.bulk_thread_count) as executor:
+            # Only a bounded number of chunks is held in memory. Once that many requests are pending, the oldest
+            # must complete before another chunk is prepared.
+            pending = []
+            for chunk in chunks:
+                pending.append(executor.submit(self.send_chunk, chunk))
+
+                if len(pending) >= self.bulk_thread_count:
+                    errors.extend(pending.pop(0).result())
+
+            for future in pending:
+                errors.extend(future.result())
+
+        return errors
+
+    def prepare_documents(self, index, iterable):
+        """ Yields the prepared document of each object, converted to values Elasticsearch accepts. """
+        for obj in iterable:
+            try:
+                prepped_data = index.full_prepare(obj)
+                yield {key: self._from_python(value) for key, value in prepped_data.items()}
+            except SkipDocument:
+                self.log.debug('Indexing for object `%s` skipped', obj)
+            except TransportError as e:
+                if not self.silently_fail:
+                    raise
+
+                self.log.error('%s while preparing object for update', e.__class__.__name__, exc_info=True,
+                               extra={'data': {'index': index, 'object': get_identifier(obj)}})
+
+    def chunk_documents(self, documents):
+        """
+        Serializes documents into the lines of bulk requests.
+
+        Yields:
+            list: (action, source) line pairs for each document of a request, limited by BATCH_SIZE and
+                BULK_MAX_CHUNK_BYTES. A document larger than BULK_MAX_CHUNK_BYTES is sent in a request of its own.
+        """
+        serializer = self.conn.transport.serializer
+        chunk, size = [], 0
+
+        for document in documents:
+            action = serializer.dumps({'index': {'_id': document[ID]}})
+            source = serializer.dumps(document)
+            document_size = len(action) + len(source) + 2
+
+            if chunk and (len(chunk) >= self.batch_size or size + document_size > self.bulk_max_chunk_bytes):
+                yield chunk
+                chunk, size = [], 0
+
+            chunk.append((action, source))
+            size += document_size
+
+        if chunk:
+            yield chunk
+
+    def send_chunk(self, chunk):
+        """
+        Sends a bulk request, retrying the documents rejected because the cluster is overloaded.
+
+        Returns:
+            list: Items of the documents which failed to index.
+        """
+        errors = []
+
+        for attempt in range(self.bulk_max_retries + 1):
+            if attempt:
+                self.log.warning('Retrying [%d] documents rejected by Elasticsearch.', len(chunk))
+                time.sleep(self.bulk_retry_backoff * 2 ** (attempt - 1))
+
+            body = '\n'.join(line for lines in chunk for line in lines) + '\n'
+
+            try:
+                response = self.conn.bulk(body, index=self.index_name, doc_type='modelresult')
+            except TransportError as e:
+                if e.status_code == 429 and attempt < self.bulk_max_retries:
+                    continue
+
+                raise
+
+            rejected = []
+            for lines, item in zip(chunk, response['items']):
+                status = item['index'].get('status', 500)
+
+                if status == 429 and attempt < self.bulk_max_retries:
+                    rejected.append(lines)
+                elif not 200 <= status < 300:
+                    errors.append(item)
+
+            if not rejected:
+                break
+
+            chunk = rejected
+
+        return errors
+
+
 # pylint: disable=abstract-method
 class ConfigurableElasticBackend(ElasticsearchSearchBackend):
 
@@ -121,7 +282,7 @@ class ConfigurableElasticBackend(ElasticsearchSearchBackend):
 
 # pylint: disable=abstract-method
 class EdxElasticsearchSearchBackend(SimpleQuerySearchBackendMixin, NonClearingSearchBackendMixin,
-                                    ConfigurableElasticBackend):
+                                    StreamingBulkSearchBackendMixin, ConfigurableElasticBackend):
     pass
 
 
@@ -1,17 +1,82 @@
+import datetime
+import itertools
 import logging
+import multiprocessing
+from collections import defaultdict
 
+import pytz
 from django.conf import settings
 from django.core.management import CommandError
+from django.db import connections as db_connections
+from django.utils.encoding import force_text
+from elasticsearch.helpers import bulk, scan
 from haystack import connections as haystack_connections
+from haystack.constants import DJANGO_CT, DJANGO_ID, ID
+from haystack.exceptions import NotHandled
 from haystack.management.commands.update_index import Command as HaystackCommand
+from haystack.management.commands.update_index import do_update
+from haystack.utils import get_model_ct
+from haystack.utils.app_loading import haystack_get_models
 
 from course_discovery.apps.core.utils import ElasticsearchUtils
+from course_discovery.apps.course_metadata.catalog_graph import CatalogGraph
+from course_discovery.apps.course_metadata.models import Course, CourseRun, Seat
+from course_discovery.apps.course_metadata.signal_processors import QueuedSignalProcessor
 
 logger = logging.getLogger(__name__)
 
 
+def get_chunks(queryset, chunk_size):
+    """
+    Splits the primary key range of a queryset into chunks.
+
+    Args:
+        queryset (QuerySet): Queryset ordered by primary key.
+        chunk_size (int): Maximum number of objects in each chunk.
+
+    Returns:
+        list: (first, last) tuples of the inclusive primary key range of each chunk.
+    """
+    # Prefetching is only useful when loading model instances.
+    pks = list(queryset.prefetch_related(None).values_list('pk', flat=True))
+    return [(pks[start], pks[min(start + chunk_size, len(pks)) - 1]) for start in range(0, len(pks), chunk_size)]
+
+
+def update_chunk(args):
+    """
+    Indexes the objects of a model whose primary keys are within a range.
+
+    This is run by worker processes, each of which opens its own database and Elasticsearch connections.
+    """
+    model, first_pk, last_pk, using, index_name, start_date, end_date, verbosity, commit, max_retries = args
+
+    # Resetting the sessions creates a new backend, which defaults to the index named in settings.
+    haystack_connections[using].reset_sessions()
+    backend = haystack_connections[using].get_backend()
+    backend.index_name = index_name
+
+    index = haystack_connections[using].get_unified_index().get_index(model)
+    queryset = index.build_queryset(using=using, start_date=start_date, end_date=end_date)
+    queryset = queryset.filter(pk__gte=first_pk, pk__lte=last_pk)
+    total = queryset.count()
+
+    do_update(backend, index, queryset, 0, total, total, verbosity=verbosity, commit=commit, max_retries=max_retries)
+    return total
+
+
 class Command(HaystackCommand):
     backends = []
+    # Maps backend names to the names of the indexes their aliases pointed to before the update.
+    previous_indexes = {}
+    # Maps the names of backends updated incrementally to dicts mapping models to the primary keys of objects whose
+    # documents must be prepared.
+    changed_objects = {}
+
+    # Settings applied to new indexes while they are built. The index is not searched until the alias is pointed at
+    # it, so refreshing or replicating it as documents are written would only slow down the build.
+    BULK_INDEX_SETTINGS = {'refresh_interval': '-1', 'number_of_replicas': 0}
+    # Maximum number of documents requested by ID from the previous index at once, when copying documents.
+    COPY_BATCH_SIZE = 1000
 
     def add_arguments(self, parser):
         super().add_arguments(parser)
@@ -19,29 +84,271 @@ class Command(HaystackCommand):
             '--disable-change-limit', action='store_true', dest='disable_change_limit',
             help='Disables checks limiting the number of records modified.'
         )
+        parser.add_argument(
+            '--incremental', action='store_true', dest='incremental',
+            help='Copies the documents of objects which have not changed from the current index, rather than '
+                 'preparing every document. Worker processes are not used. The index is rebuilt in full if its '
+                 'fields have changed. Cannot be combined with --age, --start or --end, since the new index must '
+                 'include every object.'
+        )
+
+    def update_backend(self, label, using):
+        if using in self.changed_objects:
+            self.update_backend_incrementally(label, using)
+        elif self.workers > 0:
+            self.update_backend_in_parallel(label, using)
+        else:
+            super(Command, self).update_backend(label, using)
+
+    def update_backend_in_parallel(self, label, using):
+        """
+        Indexes the models of an app by splitting their primary key ranges into chunks, which are indexed by
+        a pool of worker processes.
+
+        Unlike Haystack's own worker mode, chunks are selected by primary key rather than by offset, and the
+        workers write to the new index rather than the one named in settings. Stale records are not removed,
+        since the new index only contains the records written by this command.
+        """
+        backend = haystack_connections[using].get_backend()
+        unified_index = haystack_connections[using].get_unified_index()
+        batch_size = self.batchsize or backend.batch_size
+
+        for model in haystack_get_models(label):
+            try:
+                index = unified_index.get_index(model)
+            except NotHandled:
+                if self.verbosity >= 2:
+                    self.stdout.write('Skipping [{}] - no index.'.format(model))
+                continue
+
+            queryset = index.build_queryset(using=using, start_date=self.start_date, end_date=self.end_date)
+            chunks = get_chunks(queryset, batch_size)
+
+            if self.verbosity >= 1:
+                self.stdout.write('Indexing {} {} in {} chunks'.format(
+                    queryset.count(), force_text(model._meta.verbose_name_plural), len(chunks)
+                ))
+
+            tasks = [
+                (model, first_pk, last_pk, using, backend.index_name, self.start_date, self.end_date,
+                 self.verbosity, self.commit, self.max_retries)
+                for first_pk, last_pk in chunks
+            ]
+
+            # The worker processes are forked, and must not share the parent's database connections.
+            db_connections.close_all()
+
+            # Exiting the context terminates the workers, so a failed chunk aborts the command before the alias is
+            # pointed at the incomplete index.
+            with multiprocessing.Pool(self.workers) as pool:
+                indexed = sum(pool.imap_unordered(update_chunk, tasks))
+
+            logger.info('Indexed [%d] %s using [%d] workers.', indexed, model._meta.verbose_name_plural, self.workers)
+
+    def update_backend_incrementally(self, label, using):
+        """
+        Indexes the models of an app, preparing the documents of changed objects and copying the rest from the
+        index the alias pointed to before the update.
+        """
+        backend = haystack_connections[using].get_backend()
+        unified_index = haystack_connections[using].get_unified_index()
+        batch_size = self.batchsize or backend.batch_size
+        changed_objects = self.changed_objects[using]
+
+        for model in haystack_get_models(label):
+            try:
+                index = unified_index.get_index(model)
+            except NotHandled:
+                if self.verbosity >= 2:
+                    self.stdout.write('Skipping [{}] - no index.'.format(model))
+                continue
+
+            queryset = index.build_queryset(using=using, start_date=self.start_date, end_date=self.end_date)
+            pks = set(queryset.prefetch_related(None).values_list('pk', flat=True))
+            # Models whose changes are not tracked are always prepared.
+            changed = sorted(pks & changed_objects[model] if model in changed_objects else pks)
+
+            copied = self.copy_documents(
+                backend.conn, self.previous_indexes[using], backend.index_name, get_model_ct(model), pks - set(changed)
+            )
+
+            for start in range(0, len(changed), batch_size):
+                backend.update(index, queryset.filter(pk__in=changed[start:start + batch_size]), commit=self.commit)
+
+            logger.info(
+                'Indexed [%d] changed and copied [%d] unchanged %s.',
+                len(changed), copied, model._meta.verbose_name_plural
+            )
+
+    def get_changed_objects(self, using, index):
+        """
+        Determines the objects whose documents differ from those in an index.
+
+        The document of an object is considered changed if the object's modified timestamp differs from the one
+        in the index, or if it is affected by such a change (as determined by QueuedSignalProcessor). The seats of a
+        course run are considered changed if any were modified after the index was created, or if their types
+        differ from the indexed ones (e.g. because a seat was deleted).
+
+        Changes to other related objects (e.g. organizations or subjects) are not detected. Their documents are
+        only updated by a full rebuild, or as they are queued by the signal processor.
+
+        Args:
+            using (str): Name of the backend.
+            index (str): Name of the index to compare against.
+
+        Returns:
+            dict: Maps models to the primary keys of objects whose documents must be prepared.
+        """
+        backend = haystack_connections[using].get_backend()
+        unified_index = haystack_connections[using].get_unified_index()
+        documents = defaultdict(dict)
+        changes = defaultdict(set)
+
+        query = {'_source': [DJANGO_CT, DJANGO_ID, 'modified', 'course_key', 'seat_types']}
+        for hit in scan(backend.conn, query=query, index=index):
+            documents[hit['_source'][DJANGO_CT]][hit['_source'][DJANGO_ID]] = hit['_source']
+
+        # Deleting a seat does not modify its course run, so the indexed seat types are compared with the current ones.
+        seat_types = defaultdict(list)
+        for course_run_id, seat_type in Seat.objects.values_list('course_run_id', 'type'):
+            seat_types[str(course_run_id)].append(seat_type)
+
+        for django_id, document in documents[get_model_ct(CourseRun)].items():
+            if sorted(document.get('seat_types') or []) != sorted(seat_types[django_id]):
+                changes[CourseRun].add(int(django_id))
+
+        for model in unified_index.get_indexed_models():
+            indexed = documents[get_model_ct(model)]
+            objects = unified_index.get_index(model).index_queryset(using=using).prefetch_related(None)
+
+            for pk, modified in objects.values_list('pk', 'modified'):
+                document = indexed.pop(str(pk), {})
+
+                if document.get('modified') != backend._from_python(modified):  # pylint: disable=protected-access
+                    changes[model].add(pk)
+
+        # The documents left over are those of deleted objects.
+        deleted_course_run_course_keys = {
+            document['course_key'] for document in documents[get_model_ct(CourseRun)].values()
+        }
+        deleted_course_run_course_ids = set(
+            Course.objects.filter(key__in=deleted_course_run_course_keys).values_list('pk', flat=True)
+        )
+
+        index_settings = list(backend.conn.indices.get_settings(index=index).values())[0]['settings']['index']
+        created = datetime.datetime.fromtimestamp(int(index_settings['creation_date']) / 1000, pytz.UTC)
+        changes[CourseRun].update(Seat.objects.filter(modified__gte=created).values_list('course_run_id', flat=True))
+
+        return QueuedSignalProcessor.get_affected_objects(changes, deleted_course_run_course_ids)
+
+    def index_fields_changed(self, using, index):
+        """
+        Determines whether the fields of the search indexes differ from those mapped by an index.
+
+        Documents copied from an index only have the fields it mapped, so an index whose fields have changed cannot
+        be updated incrementally.
+
+        Args:
+            using (str): Name of the backend.
+            index (str): Name of the index to compare against.
+
+        Returns:
+            bool
+        """
+        backend = haystack_connections[using].get_backend()
+        unified_index = haystack_connections[using].get_unified_index()
+
+        mappings = list(backend.conn.indices.get_mapping(index=index).values())[0]['mappings']
+        mapped = set(mappings.get('modelresult', {}).get('properties', {})) - {ID, DJANGO_CT, DJANGO_ID}
+
+        return mapped != set(unified_index.all_searchfields())
+
+    def copy_documents(self, conn, source_index, target_index, content_type, pks):
+        """
+        Copies the documents of objects from one index to another.
+
+        Args:
+            conn (Elasticsearch): Elasticsearch connection.
+            source_index (str): Name of the index to copy from.
+            target_index (str): Name of the index to copy to.
+            content_type (str): Content type of the objects, as returned by haystack.utils.get_model_ct.
+            pks (set): Primary keys of the objects whose documents should be copied.
+
+        Returns:
+            int: Number of documents copied.
+        """
+        if not pks:
+            return 0
+
+        # Only the documents to be copied are read, rather than every document of the content type.
+        identifiers = sorted('{}.{}'.format(content_type, pk) for pk in pks)
+        batch_size = self.COPY_BATCH_SIZE
+        batches = [identifiers[start:start + batch_size] for start in range(0, len(identifiers), batch_size)]
+        hits = itertools.chain.from_iterable(
+            scan(conn, query={'query': {'ids': {'type': 'modelresult', 'values': batch}}}, index=source_index)
+            for batch in batches
+        )
+        actions = (
+            {'_index': target_index, '_type': hit['_type'], '_id': hit['_id'], '_source': hit['_source']}
+            for hit in hits
+        )
+        copied, __ = bulk(conn, actions)
+        return copied
 
     def get_record_count(self, conn, index_name):
         return conn.count(index_name).get('count')
 
     def handle(self, *items, **options):
+        # Changes queued by signal processors are held until the alias points to the new index. Documents written to
+        # the current index in the meantime would otherwise be lost.
+        with QueuedSignalProcessor.rebuilding():
+            self.rebuild_indexes(*items, **options)
+
+    def rebuild_indexes(self, *items, **options):
         self.backends = options.get('using')
         if not self.backends:
             self.backends = list(haystack_connections.connections_info.keys())
 
         alias_mappings = []
+        incremental = options.get('incremental', False)
+        self.previous_indexes = {}
+
+        # Objects outside of the window would be neither copied nor prepared, so would be missing from the new index.
+        if incremental and any(options.get(option) is not None for option in ('age', 'start_date', 'end_date')):
+            raise CommandError('--incremental cannot be combined with --age, --start or --end.')
+
+        self.changed_objects = {}
 
         # Use a timestamped index instead of the default in settings.
         for backend_name in self.backends:
             connection = haystack_connections[backend_name]
             backend = connection.get_backend()
             record_count = self.get_record_count(backend.conn, backend.index_name)
+
+            if incremental and self.index_fields_changed(backend_name, backend.index_name):
+                logger.warning(
+                    'The fields of the [%s] index have changed. Its documents will be prepared, rather than copied.',
+                    backend_name
+                )
+            elif incremental:
+                self.previous_indexes[backend_name] = backend.index_name
+                self.changed_objects[backend_name] = self.get_changed_objects(backend_name, backend.index_name)
+
             alias, index_name = self.prepare_backend_index(backend)
-            alias_mappings.append((backend, index_name, alias))
+            index_settings = self.apply_bulk_index_settings(backend.conn, index_name)
+            alias_mappings.append((backend, index_name, alias, index_settings))
 
-        super(Command, self).handle(*items, **options)
+        # Refreshing is disabled while the new index is built. It is refreshed once, after all documents are written.
+        options['commit'] = False
+
+        # The graph is built before any worker processes are started, so that they share it.
+        with CatalogGraph.activate():
+            super(Command, self).handle(*items, **options)
 
         # Set the alias (from settings) to the timestamped catalog.
-        for backend, index, alias in alias_mappings:
+        for backend, index, alias, index_settings in alias_mappings:
+            self.restore_index_settings(backend.conn, index, index_settings)
+
             # Run a sanity check to ensure we aren't drastically changing the
             # index, which could be indicative of a bug.
             if not options.get('disable_change_limit', False):
@@ -74,6 +381,39 @@ class Command(HaystackCommand):
         )
         return record_count_is_sane, index_info_string
 
+    def apply_bulk_index_settings(self, conn, index):
+        """
+        Applies BULK_INDEX_SETTINGS to an index.
+
+        Args:
+            conn (Elasticsearch): Elasticsearch connection.
+            index (str): Name of the index to update.
+
+        Returns:
+            dict: The settings replaced by BULK_INDEX_SETTINGS, which should be restored once the index is built.
+        """
+        current_settings = conn.indices.get_settings(index=index)[index]['settings']['index']
+        index_settings = {
+            # Settings left at their defaults are not returned.
+            'refresh_interval': current_settings.get('refresh_interval', '1s'),
+            'number_of_replicas': current_settings.get('number_of_replicas', 1),
+        }
+        conn.indices.put_settings(index=index, body={'index': self.BULK_INDEX_SETTINGS})
+        return index_settings
+
+    def restore_index_settings(self, conn, index, index_settings):
+        """
+        Restores the settings replaced by apply_bulk_index_settings, and refreshes the index so that all of its
+        documents are searchable.
+
+        Args:
+            conn (Elasticsearch): Elasticsearch connection.
+            index (str): Name of the index to update.
+            index_settings (dict): Settings returned by apply_bulk_index_settings.
+        """
+        conn.indices.put_settings(index=index, body={'index': index_settings})
+        conn.indices.refresh(index=index)
+
     def set_alias(self, backend, alias, index):
         """
         Points the alias to the specified index.
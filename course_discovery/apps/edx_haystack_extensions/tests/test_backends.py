@@ -1,11 +1,19 @@
-import haystack
+import mock
+from django.conf import settings
 from django.test import TestCase
+from elasticsearch import TransportError
+from elasticsearch.helpers import BulkIndexError
+from elasticsearch.serializer import JSONSerializer
+from haystack import connections
+from haystack.exceptions import SkipDocument
 
 from course_discovery.apps.edx_haystack_extensions.backends import EdxElasticsearchSearchBackend
 from course_discovery.apps.edx_haystack_extensions.tests.mixins import (
     NonClearingSearchBackendMixinTestMixin, SimpleQuerySearchBackendMixinTestMixin
 )
 
+BACKENDS_PATH = 'course_discovery.apps.edx_haystack_extensions.backends'
+
 
 class EdxElasticsearchSearchBackendTests(NonClearingSearchBackendMixinTestMixin, SimpleQuerySearchBackendMixinTestMixin,
                                          TestCase):
@@ -15,9 +23,111 @@ class EdxElasticsearchSearchBackendTests(NonClearingSearchBackendMixinTestMixin,
     def test_build_schema_handles_aggregation_key(self):
         """Verify that build_schema marks the aggregation_key field as not_analyzed."""
         backend = self.get_backend()
-        index = haystack.connections[backend.connection_alias].get_unified_index()
+        index = connections[backend.connection_alias].get_unified_index()
         fields = index.all_searchfields()
         mapping = backend.build_schema(fields)[1]
         assert mapping.get('aggregation_key')
         assert mapping['aggregation_key']['index'] == 'not_analyzed'
         assert 'analyzer' not in mapping['aggregation_key']
+
+
+@mock.patch(BACKENDS_PATH + '.time.sleep')
+class StreamingBulkSearchBackendMixinTests(TestCase):
+    """ Tests for StreamingBulkSearchBackendMixin, using a mocked Elasticsearch connection. """
+
+    def setUp(self):
+        super(StreamingBulkSearchBackendMixinTests, self).setUp()
+        connection_options = dict(
+            settings.HAYSTACK_CONNECTIONS['default'], BATCH_SIZE=2, BULK_MAX_RETRIES=2, BULK_THREAD_COUNT=2
+        )
+        self.backend = EdxElasticsearchSearchBackend('default', **connection_options)
+        self.backend.setup_complete = True
+        self.backend.conn = mock.Mock()
+        self.backend.conn.transport.serializer = JSONSerializer()
+        self.backend.conn.bulk.side_effect = self.bulk_response
+
+        self.index = mock.Mock()
+        self.index.full_prepare.side_effect = lambda obj: {'id': 'test.{}'.format(obj), 'text': 'x' * 100}
+
+    def bulk_response(self, body, **kwargs):  # pylint: disable=unused-argument
+        lines = body.splitlines()
+        return {'items': [{'index': {'_id': 'test', 'status': 201}} for __ in range(0, len(lines), 2)]}
+
+    def get_bulk_ids(self):
+        """ Returns the IDs of the documents sent in each bulk request. """
+        return [
+            [JSONSerializer().loads(line)['index']['_id'] for line in call[0][0].splitlines()[::2]]
+            for call in self.backend.conn.bulk.call_args_list
+        ]
+
+    def test_update(self, mock_sleep):
+        """ Verify documents are written in requests of at most BATCH_SIZE documents, and the index refreshed. """
+        self.backend.update(self.index, range(5))
+
+        self.assertCountEqual(self.get_bulk_ids(), [['test.0', 'test.1'], ['test.2', 'test.3'], ['test.4']])
+        self.backend.conn.indices.refresh.assert_called_once_with(index=self.backend.index_name)
+        self.assertFalse(mock_sleep.called)
+
+    def test_update_single_request(self, mock_sleep):  # pylint: disable=unused-argument
+        """ Verify documents which fit in a single request are sent without starting a pool of threads. """
+        with mock.patch(BACKENDS_PATH + '.ThreadPoolExecutor') as mock_executor:
+            self.backend.update(self.index, range(2))
+
+        self.assertFalse(mock_executor.called)
+        self.assertEqual(self.get_bulk_ids(), [['test.0', 'test.1']])
+
+    def test_update_without_commit(self, mock_sleep):  # pylint: disable=unused-argument
+        """ Verify the index is not refreshed if commit is False. """
+        self.backend.update(self.index, range(2), commit=False)
+        self.assertFalse(self.backend.conn.indices.refresh.called)
+
+    def test_max_chunk_bytes(self, mock_sleep):  # pylint: disable=unused-argument
+        """ Verify requests are limited by the size of the serialized documents. """
+        self.backend.bulk_max_chunk_bytes = 200
+        self.backend.update(self.index, range(3))
+        self.assertCountEqual(self.get_bulk_ids(), [['test.0'], ['test.1'], ['test.2']])
+
+    def test_skipped_documents(self, mock_sleep):  # pylint: disable=unused-argument
+        """ Verify documents which raise SkipDocument are not written. """
+        self.index.full_prepare.side_effect = [SkipDocument(), {'id': 'test.1'}, SkipDocument()]
+        self.backend.update(self.index, range(3))
+        self.assertEqual(self.get_bulk_ids(), [['test.1']])
+
+    def test_rejected_request_retried(self, mock_sleep):
+        """ Verify requests rejected by an overloaded cluster are retried with an increasing backoff. """
+        self.backend.conn.bulk.side_effect = [
+            TransportError(429, 'rejected'), TransportError(429, 'rejected'), self.bulk_response('{}\n{}')
+        ]
+        self.backend.update(self.index, range(1))
+
+        self.assertEqual(self.get_bulk_ids(), [['test.0']] * 3)
+        self.assertEqual(mock_sleep.call_args_list, [mock.call(2), mock.call(4)])
+
+    def test_rejected_request_retries_exhausted(self, mock_sleep):  # pylint: disable=unused-argument
+        """ Verify the rejection is raised once all retries have been used. """
+        self.backend.conn.bulk.side_effect = TransportError(429, 'rejected')
+
+        with self.assertRaises(TransportError):
+            self.backend.update(self.index, range(1))
+
+        self.assertEqual(self.backend.conn.bulk.call_count, 3)
+
+    def test_rejected_documents_retried(self, mock_sleep):  # pylint: disable=unused-argument
+        """ Verify only the documents rejected by an overloaded cluster are retried. """
+        self.backend.conn.bulk.side_effect = [
+            {'items': [{'index': {'_id': 'test.0', 'status': 201}}, {'index': {'_id': 'test.1', 'status': 429}}]},
+            self.bulk_response('{}\n{}'),
+        ]
+        self.backend.update(self.index, range(2))
+        self.assertEqual(self.get_bulk_ids(), [['test.0', 'test.1'], ['test.1']])
+
+    def test_failed_documents(self, mock_sleep):  # pylint: disable=unused-argument
+        """ Verify documents which fail to index, for reasons other than rejection, are raised. """
+        item = {'index': {'_id': 'test.1', 'status': 400, 'error': 'MapperParsingException'}}
+        self.backend.conn.bulk.side_effect = [{'items': [{'index': {'_id': 'test.0', 'status': 201}}, item]}]
+
+        with self.assertRaises(BulkIndexError) as context:
+            self.backend.update(self.index, range(2))
+
+        self.assertEqual(context.exception.errors, [item])
+        self.assertEqual(self.backend.conn.bulk.call_count, 1)
@@ -1,3 +1,5 @@
+import datetime
+
 import mock
 import pytest
 from django.conf import settings
@@ -5,11 +7,21 @@ from django.core.management import CommandError, call_command
 from django.test import TestCase, override_settings
 from elasticsearch import Elasticsearch
 from freezegun import freeze_time
+from haystack import connections as haystack_connections
 
 from course_discovery.apps.core.tests.mixins import ElasticsearchTestMixin
-from course_discovery.apps.course_metadata.tests.factories import CourseRunFactory
+from course_discovery.apps.course_metadata.models import Course, CourseRun, Program
+from course_discovery.apps.course_metadata.signal_processors import QueuedSignalProcessor
+from course_discovery.apps.course_metadata.tests.factories import (
+    CourseFactory, CourseRunFactory, ProgramFactory, SeatFactory
+)
+from course_discovery.apps.edx_haystack_extensions.management.commands.update_index import (
+    Command, get_chunks, update_chunk
+)
 from course_discovery.apps.edx_haystack_extensions.tests.mixins import SearchIndexTestMixin
 
+COMMAND_PATH = 'course_discovery.apps.edx_haystack_extensions.management.commands.update_index'
+
 
 @override_settings(HAYSTACK_SIGNAL_PROCESSOR='haystack.signals.BaseSignalProcessor')
 class UpdateIndexTests(ElasticsearchTestMixin, SearchIndexTestMixin, TestCase):
@@ -71,3 +83,248 @@ class UpdateIndexTests(ElasticsearchTestMixin, SearchIndexTestMixin, TestCase):
                         'update_index.Command.sanity_check_new_index') as mock_sanity_check_new_index:
             call_command('update_index', disable_change_limit=True)
             self.assertFalse(mock_sanity_check_new_index.called)
+
+    def test_handle_with_workers(self):
+        """ Verify the command indexes every object into the new index when using worker processes. """
+        course_runs = CourseRunFactory.create_batch(5)
+
+        call_command('update_index', workers=2, batchsize=2, disable_change_limit=True)
+
+        alias = settings.HAYSTACK_CONNECTIONS['default']['INDEX_NAME']
+        self.backend.conn.indices.refresh(index=alias)
+        response = self.backend.conn.search(index=alias, body={'query': {'match_all': {}}}, size=100)
+        indexed = {hit['_id'] for hit in response['hits']['hits']}
+
+        expected = {'course_metadata.courserun.{}'.format(course_run.id) for course_run in course_runs}
+        self.assertTrue(expected <= indexed)
+        self.assertEqual(len(indexed), 2 * len(course_runs))
+
+    def test_handle_incremental(self):
+        """ Verify the documents of unchanged objects are copied, and those of changed objects prepared. """
+        course_runs = CourseRunFactory.create_batch(3)
+
+        with freeze_time('2016-06-21'):
+            call_command('update_index', disable_change_limit=True)
+
+        with freeze_time('2016-06-22'):
+            course_runs[0].save()
+
+            with mock.patch.object(Command, 'copy_documents', wraps=Command().copy_documents) as mock_copy:
+                call_command('update_index', incremental=True, disable_change_limit=True)
+
+        copied = {call[0][4] for call in mock_copy.call_args_list if call[0][3] == 'course_metadata.courserun'}
+        self.assertEqual(copied, {frozenset(course_run.pk for course_run in course_runs[1:])})
+
+        alias = settings.HAYSTACK_CONNECTIONS['default']['INDEX_NAME']
+        response = self.backend.conn.search(index=alias, body={'query': {'match_all': {}}}, size=100)
+        documents = {hit['_id']: hit['_source'] for hit in response['hits']['hits']}
+        self.assertEqual(len(documents), 2 * len(course_runs))
+        document = documents['course_metadata.courserun.{}'.format(course_runs[0].pk)]
+        self.assertEqual(document['modified'], course_runs[0].modified.isoformat())
+
+    def test_handle_incremental_with_changed_fields(self):
+        """ Verify every document is prepared if the fields of the index have changed. """
+        CourseRunFactory.create_batch(3)
+        call_command('update_index', disable_change_limit=True)
+
+        with mock.patch.object(Command, 'index_fields_changed', return_value=True):
+            with mock.patch.object(Command, 'copy_documents') as mock_copy:
+                call_command('update_index', incremental=True, disable_change_limit=True)
+
+        self.assertFalse(mock_copy.called)
+
+    def test_bulk_index_settings_restored(self):
+        """ Verify the settings disabled while the new index is built are restored before the alias is set. """
+        call_command('update_index', disable_change_limit=True)
+
+        alias = settings.HAYSTACK_CONNECTIONS['default']['INDEX_NAME']
+        response = self.backend.conn.indices.get_settings(index=alias)
+        index_settings = list(response.values())[0]['settings']['index']
+        self.assertEqual(index_settings['refresh_interval'], '1s')
+        self.assertNotEqual(index_settings['number_of_replicas'], '0')
+
+
+class RebuildingUpdateIndexTests(TestCase):
+    def test_handle_marks_rebuild(self):
+        """ Verify queued signal processors hold their changes until the alias points to the new index. """
+        def rebuild_indexes(*args, **kwargs):  # pylint: disable=unused-argument
+            self.assertTrue(QueuedSignalProcessor.is_rebuilding())
+
+        with mock.patch.object(Command, 'rebuild_indexes', side_effect=rebuild_indexes) as mock_rebuild_indexes:
+            call_command('update_index')
+
+        self.assertTrue(mock_rebuild_indexes.called)
+        self.assertFalse(QueuedSignalProcessor.is_rebuilding())
+
+        with mock.patch.object(Command, 'rebuild_indexes', side_effect=CommandError):
+            with self.assertRaises(CommandError):
+                call_command('update_index')
+
+        self.assertFalse(QueuedSignalProcessor.is_rebuilding())
+
+
+class ParallelUpdateIndexTests(TestCase):
+    def test_get_chunks(self):
+        """ Verify the primary key range is split into chunks of the given size. """
+        pks = [course_run.pk for course_run in CourseRunFactory.create_batch(5)]
+
+        chunks = get_chunks(CourseRun.objects.prefetch_related('seats').order_by('pk'), 2)
+
+        self.assertEqual(chunks, [(pks[0], pks[1]), (pks[2], pks[3]), (pks[4], pks[4])])
+        self.assertEqual(get_chunks(CourseRun.objects.none(), 2), [])
+
+    def test_update_chunk(self):
+        """ Verify the objects in the chunk are written to the given index, rather than the one in settings. """
+        course_runs = CourseRunFactory.create_batch(3)
+        self.addCleanup(haystack_connections['default'].reset_sessions)
+
+        with mock.patch(COMMAND_PATH + '.do_update') as mock_do_update:
+            total = update_chunk(
+                (CourseRun, course_runs[1].pk, course_runs[2].pk, 'default', 'new_index', None, None, 0, True, 1)
+            )
+
+        self.assertEqual(total, 2)
+        backend, __, queryset, start, end = mock_do_update.call_args[0][:5]
+        self.assertEqual(backend.index_name, 'new_index')
+        self.assertEqual(list(queryset), course_runs[1:])
+        self.assertEqual((start, end), (0, 2))
+
+
+class BulkIndexSettingsTests(TestCase):
+    def test_apply_and_restore(self):
+        """ Verify the bulk settings replace the new index's settings until restored, then the index is refreshed. """
+        conn = mock.Mock()
+        conn.indices.get_settings.return_value = {
+            'catalog_new': {'settings': {'index': {'number_of_replicas': '2', 'number_of_shards': '5'}}}
+        }
+        command = Command()
+
+        index_settings = command.apply_bulk_index_settings(conn, 'catalog_new')
+
+        self.assertEqual(index_settings, {'refresh_interval': '1s', 'number_of_replicas': '2'})
+        conn.indices.put_settings.assert_called_once_with(
+            index='catalog_new', body={'index': {'refresh_interval': '-1', 'number_of_replicas': 0}}
+        )
+        self.assertFalse(conn.indices.refresh.called)
+
+        command.restore_index_settings(conn, 'catalog_new', index_settings)
+
+        conn.indices.put_settings.assert_called_with(index='catalog_new', body={'index': index_settings})
+        conn.indices.refresh.assert_called_once_with(index='catalog_new')
+
+
+class IncrementalUpdateIndexTests(TestCase):
+    def setUp(self):
+        super(IncrementalUpdateIndexTests, self).setUp()
+        self.course = CourseFactory()
+        self.course_run = CourseRunFactory(course=self.course)
+        self.program = ProgramFactory(courses=[self.course])
+        self.other_course_run = CourseRunFactory()
+        self.backend = haystack_connections['default'].get_backend()
+
+    def get_hit(self, obj, modified=None):
+        source = {
+            'django_ct': '{}.{}'.format(obj._meta.app_label, obj._meta.model_name),
+            'django_id': str(obj.pk),
+            'modified': modified or obj.modified.isoformat(),
+        }
+        if isinstance(obj, CourseRun):
+            source['course_key'] = obj.course.key
+            source['seat_types'] = obj.seat_types
+        return {'_type': 'modelresult', '_id': '{django_ct}.{django_id}'.format(**source), '_source': source}
+
+    def get_changed_objects(self, hits, created=datetime.datetime(2016, 6, 21)):
+        index_settings = {'settings': {'index': {'creation_date': str(int(created.timestamp() * 1000))}}}
+        response = {'catalog_20160621_000000': index_settings}
+
+        with mock.patch(COMMAND_PATH + '.scan', return_value=hits):
+            with mock.patch.object(self.backend.conn.indices, 'get_settings', return_value=response):
+                return Command().get_changed_objects('default', 'catalog')
+
+    def test_get_changed_objects(self):
+        """ Verify objects whose modified timestamps differ from the indexed ones, and those affected, are changed. """
+        objects = [self.course, self.course_run, self.program, self.other_course_run.course]
+        hits = [self.get_hit(obj) for obj in objects] + [self.get_hit(self.other_course_run, modified='2016-06-21')]
+
+        expected = {
+            Course: {self.other_course_run.course.pk},
+            CourseRun: {self.other_course_run.pk},
+            Program: set(),
+        }
+        self.assertEqual(self.get_changed_objects(hits), expected)
+
+    def test_get_changed_objects_with_deleted_course_run(self):
+        """ Verify the documents of deleted course runs affect their courses, and the programs containing them. """
+        objects = [self.course, self.program, self.other_course_run, self.other_course_run.course]
+        deleted_course_run = CourseRunFactory(course=self.course)
+        hits = [self.get_hit(obj) for obj in objects + [self.course_run, deleted_course_run]]
+        deleted_course_run.delete()
+
+        expected = {Course: {self.course.pk}, CourseRun: set(), Program: {self.program.pk}}
+        self.assertEqual(self.get_changed_objects(hits), expected)
+
+    def test_get_changed_objects_with_seats(self):
+        """ Verify seats modified after the index was created affect their course runs. """
+        seat = SeatFactory(course_run=self.other_course_run)
+        objects = [self.course, self.course_run, self.program, self.other_course_run, self.other_course_run.course]
+        hits = [self.get_hit(obj) for obj in objects]
+
+        self.assertEqual(self.get_changed_objects(hits, created=seat.modified + datetime.timedelta(seconds=1)), {
+            Course: set(), CourseRun: set(), Program: set(),
+        })
+        self.assertEqual(self.get_changed_objects(hits, created=seat.modified - datetime.timedelta(seconds=1)), {
+            Course: {self.other_course_run.course.pk}, CourseRun: {self.other_course_run.pk}, Program: set(),
+        })
+
+    def test_get_changed_objects_with_deleted_seats(self):
+        """ Verify course runs whose indexed seat types differ from the current ones, e.g. because a seat was deleted,
+        are changed. """
+        seats = SeatFactory.create_batch(2, course_run=self.other_course_run, type='verified')
+        objects = [self.course, self.course_run, self.program, self.other_course_run, self.other_course_run.course]
+        hits = [self.get_hit(obj) for obj in objects]
+        created = seats[-1].modified + datetime.timedelta(seconds=1)
+        seats[0].delete()
+
+        self.assertEqual(self.get_changed_objects(hits, created=created), {
+            Course: {self.other_course_run.course.pk}, CourseRun: {self.other_course_run.pk}, Program: set(),
+        })
+
+    def test_index_fields_changed(self):
+        """ Verify the fields of the search indexes are compared with those mapped by the index. """
+        fields = set(haystack_connections['default'].get_unified_index().all_searchfields())
+        properties = {field: {'type': 'string'} for field in fields | {'id', 'django_ct', 'django_id'}}
+        mapping = {'catalog_20160621_000000': {'mappings': {'modelresult': {'properties': properties}}}}
+
+        with mock.patch.object(self.backend.conn.indices, 'get_mapping', return_value=mapping):
+            self.assertFalse(Command().index_fields_changed('default', 'catalog'))
+
+            properties.pop(sorted(fields)[0])
+            self.assertTrue(Command().index_fields_changed('default', 'catalog'))
+
+    def test_copy_documents(self):
+        """ Verify only the documents of the given objects are read, in batches, and copied to the target index. """
+        course_runs = [self.course_run, self.other_course_run]
+        hits = {hit['_id']: hit for hit in (self.get_hit(course_run) for course_run in course_runs)}
+
+        def scan(conn, query, index):  # pylint: disable=unused-argument
+            return [hits[identifier] for identifier in query['query']['ids']['values']]
+
+        command = Command()
+        command.COPY_BATCH_SIZE = 1
+
+        with mock.patch(COMMAND_PATH + '.scan', side_effect=scan) as mock_scan:
+            with mock.patch(COMMAND_PATH + '.bulk', side_effect=lambda conn, actions: (len(list(actions)), [])):
+                copied = command.copy_documents(
+                    self.backend.conn, 'catalog', 'catalog_new', 'course_metadata.courserun',
+                    {course_run.pk for course_run in course_runs}
+                )
+
+        self.assertEqual(copied, 2)
+        self.assertEqual(mock_scan.call_count, 2)
+        self.assertEqual(Command().copy_documents(self.backend.conn, 'catalog', 'catalog_new', 'test', set()), 0)
+
+    def test_handle_incremental_with_window(self):
+        """ Verify incremental updates are refused if limited to a window, which would drop the other documents. """
+        for options in ({'age': 1}, {'start_date': '2016-06-21'}, {'end_date': '2016-06-21'}):
+            with self.assertRaises(CommandError):
+                call_command('update_index', incremental=True, **options)
@@ -340,6 +340,10 @@ REST_FRAMEWORK_EXTENSIONS = {
     'DEFAULT_CACHE_RESPONSE_TIMEOUT': 60,
 }
 
+# API responses are cached until the catalog changes (see course_discovery.apps.api.cache), for at most this
+# many seconds. Some filters (e.g. active course runs) depend on the current time, as well as on the catalog.
+API_RESPONSE_CACHE_TIMEOUT = 60 * 5
+
 # NOTE (CCB): JWT_SECRET_KEY is intentionally not set here to avoid production releases with a public value.
 # Set a value in a downstream settings file.
 JWT_AUTH = {
@@ -436,10 +440,23 @@ HAYSTACK_CONNECTIONS = {
 }
 
 # We do not use the RealtimeSignalProcessor here to avoid overloading our
-# Elasticsearch instance when running the refresh_course_metadata command
+# Elasticsearch instance when running the refresh_course_metadata command.
+# Set this to course_discovery.apps.course_metadata.signal_processors.QueuedSignalProcessor to instead queue
+# changes, and write them to the index in bulk.
 HAYSTACK_SIGNAL_PROCESSOR = 'haystack.signals.BaseSignalProcessor'
 HAYSTACK_INDEX_RETENTION_LIMIT = 3
 
+# Metrics recorded by data loader runs older than this many days are deleted when the course metadata is refreshed.
+DATA_LOADER_RUN_RETENTION_DAYS = 90
+
+# Data loaders which support it only request records modified since their last successful run, less this many
+# seconds. The run's start time is read from the local clock, which may be ahead of the clocks of upstream APIs.
+DATA_LOADER_WATERMARK_MARGIN = 60 * 10
+
+# Maximum number of worker processes started by each data loader to clean HTML. Loaders run in parallel each start
+# their own. If 0, HTML is cleaned by the loaders themselves.
+DATA_LOADER_HTML_CLEANER_MAX_WORKERS = 2
+
 # Update Index Settings
 # Make sure the size of the new index does not change by more than this percentage
 INDEX_SIZE_CHANGE_THRESHOLD = .1
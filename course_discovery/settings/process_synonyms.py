@@ -1,7 +1,48 @@
+import bisect
+import hashlib
 import importlib
+import itertools
+import json
+from collections import defaultdict
 from functools import lru_cache
 
 from django.conf import settings
+from django.core.cache import cache
+
+SYNONYM_ANALYZER = 'snowball'
+# Number of synonyms analyzed by each request to Elasticsearch.
+ANALYZE_BATCH_SIZE = 500
+
+
+def analyze_terms(es, terms, analyzer=SYNONYM_ANALYZER):
+    """Analyze terms in batches, rather than making a request for each term.
+
+    Each batch is analyzed as a single text, with one term per line. Tokens are mapped back to the terms they
+    were produced from by their offsets.
+
+    Attributes:
+        es (client): client for making requests to es
+        terms (list): terms to analyze
+        analyzer (str): name of the analyzer to apply
+
+    Returns:
+        dict: maps each term to its analyzed form (its tokens, separated by spaces)
+    """
+    analyzed = {}
+    for start in range(0, len(terms), ANALYZE_BATCH_SIZE):
+        batch = terms[start:start + ANALYZE_BATCH_SIZE]
+        # Offsets of the end of each line, including its newline.
+        line_ends = list(itertools.accumulate(len(term) + 1 for term in batch))
+        response = es.indices.analyze(body='\n'.join(batch), analyzer=analyzer)
+
+        tokens = defaultdict(list)
+        for token in response['tokens']:
+            tokens[bisect.bisect_right(line_ends, token['start_offset'])].append(token['token'])
+
+        for line, term in enumerate(batch):
+            analyzed[term] = ' '.join(tokens[line])
+
+    return analyzed
 
 
 def process_synonyms(es, synonyms):
@@ -14,17 +55,8 @@ def process_synonyms(es, synonyms):
         es (client): client for making requests to es
         synonyms (list): list of synonyms (each synonym group is a comma separated string)
     """
-
-    processed_synonyms = []
-    for line in synonyms:
-        processed_line = []
-        for synonym in line:
-            response = es.indices.analyze(text=synonym, analyzer='snowball')
-            synonym_tokens = ' '.join([item['token'] for item in response['tokens']])
-            processed_line.append(synonym_tokens)
-        processed_line = ','.join(processed_line)
-        processed_synonyms.append(processed_line)
-    return processed_synonyms
+    analyzed = analyze_terms(es, sorted({synonym for line in synonyms for synonym in line}))
+    return [','.join(analyzed[synonym] for synonym in line) for line in synonyms]
 
 
 def get_synonym_lines_from_file():
@@ -32,8 +64,27 @@ def get_synonym_lines_from_file():
     return synonyms_module.SYNONYMS
 
 
+def get_synonyms_cache_key(es, synonyms):
+    """Return a cache key identifying the analyzed form of the synonyms.
+
+    The analyzed form changes if the synonyms, the analyzer, or the version of Elasticsearch
+    (which implements the analyzer) change.
+    """
+    version = es.info()['version']['number']
+    content = json.dumps([synonyms, SYNONYM_ANALYZER, version], sort_keys=True).encode('utf-8')
+    return 'synonyms.{}'.format(hashlib.md5(content).hexdigest())
+
+
 @lru_cache()
 def get_synonyms(es):
     synonyms = get_synonym_lines_from_file()
-    synonyms = process_synonyms(es, synonyms)
-    return synonyms
+    cache_key = get_synonyms_cache_key(es, synonyms)
+    processed_synonyms = cache.get(cache_key)
+
+    # The analyzed synonyms are shared by all processes, so that they are only computed once for each version
+    # of the synonyms.
+    if processed_synonyms is None:
+        processed_synonyms = process_synonyms(es, synonyms)
+        cache.set(cache_key, processed_synonyms, None)
+
+    return processed_synonyms